@@ -0,0 +1,391 @@
+# app/archive.py
+"""Time-based retention for the `calculations` table.
+
+Rows older than the retention window are rolled out of the live table into
+compressed per-month archive files under `CALCULATION_ARCHIVE_DIR`:
+
+    calculations-YYYY-MM-<run>.ndjson.gz    (or .parquet when pyarrow is installed
+                                             and CALCULATION_ARCHIVE_FORMAT=parquet)
+    calculations-YYYY-MM-<run>.summary.json per-user aggregates for stats
+
+On PostgreSQL the table can additionally be converted to declarative range
+partitioning by month, in which case archived months are detached and dropped
+instead of deleted row by row. On SQLite the archive files themselves are the
+rolling month tables.
+
+Exports and stats merge archived data back in through `iter_archived_rows`
+and `archived_user_summary`. They only read a month file whose summary is in
+place, and summaries are written as `.pending` until the rows' DELETE has
+committed, so a failed run never counts rows twice; a run interrupted in
+between is finished by the next one.
+
+    python -m app.archive run [--retention-months N]
+    python -m app.archive partition          # PostgreSQL only, one-off
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import delete, func, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.database import notify_user_write
+from app.logger_config import logger
+from app.migrations import ensure_calculation_indexes
+from app.models import Calculation
+
+
+CALCULATION_ARCHIVE_DIR = os.getenv("CALCULATION_ARCHIVE_DIR", "./archive")
+CALCULATION_RETENTION_MONTHS = int(os.getenv("CALCULATION_RETENTION_MONTHS", "12"))
+CALCULATION_ARCHIVE_FORMAT = os.getenv("CALCULATION_ARCHIVE_FORMAT", "ndjson")
+PARTITIONS_AHEAD = int(os.getenv("CALCULATION_PARTITIONS_AHEAD", "3"))
+
+ARCHIVE_COLUMNS = (
+    "id", "a", "b", "type", "result", "timestamp", "user_id",
+    "precision", "a_exact", "b_exact", "result_exact",
+)
+
+
+# ---------- Month arithmetic ----------
+
+def month_start(value: datetime | date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_cutoff(now: datetime, retention_months: int) -> datetime:
+    """Rows with a timestamp before this are archived."""
+    cutoff = add_months(month_start(now), -retention_months)
+    return datetime(cutoff.year, cutoff.month, 1)
+
+
+# ---------- PostgreSQL declarative partitioning ----------
+
+def month_partition_name(month: date) -> str:
+    return f"calculations_y{month.year}m{month.month:02d}"
+
+
+def create_month_partition_sql(month: date) -> str:
+    upper = add_months(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {month_partition_name(month)} PARTITION OF calculations "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'calculations'"
+    )).first())
+
+
+def ensure_month_partitions(engine: Engine, months_ahead: int = PARTITIONS_AHEAD, now: Optional[datetime] = None) -> None:
+    """Create partitions for the current month and `months_ahead` future months."""
+    now = now or datetime.utcnow()
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        for offset in range(months_ahead + 1):
+            conn.execute(text(create_month_partition_sql(add_months(month_start(now), offset))))
+
+
+def partitioned_table_sql(with_user_fk: bool = True) -> List[str]:
+    """Statements replacing `calculations` by an empty partitioned copy; the
+    old rows stay in `calculations_unpartitioned`."""
+    statements = [
+        "ALTER TABLE calculations RENAME TO calculations_unpartitioned",
+        "CREATE TABLE calculations (LIKE calculations_unpartitioned INCLUDING DEFAULTS) "
+        'PARTITION BY RANGE ("timestamp")',
+        'ALTER TABLE calculations ADD PRIMARY KEY (id, "timestamp")',
+    ]
+    if with_user_fk:
+        statements.append("ALTER TABLE calculations ADD FOREIGN KEY (user_id) REFERENCES users (id)")
+    statements.append("ALTER SEQUENCE calculations_id_seq OWNED BY calculations.id")
+    return statements
+
+
+def convert_to_partitioned(engine: Engine, months_ahead: int = PARTITIONS_AHEAD) -> None:
+    """One-off migration of a plain PostgreSQL `calculations` table to monthly
+    range partitions. The primary key becomes (id, timestamp) because a
+    partitioned table's unique constraints must include the partition key.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql":
+            raise RuntimeError("Declarative partitioning requires PostgreSQL")
+        if is_partitioned(conn):
+            return
+        oldest = conn.execute(select(func.min(Calculation.timestamp))).scalar() or datetime.utcnow()
+        # shards keep calculations without the users table (see app.sharding)
+        for statement in partitioned_table_sql(with_user_fk=inspect(conn).has_table("users")):
+            conn.execute(text(statement))
+        month = month_start(oldest)
+        last = add_months(month_start(datetime.utcnow()), months_ahead)
+        while month <= last:
+            conn.execute(text(create_month_partition_sql(month)))
+            month = add_months(month, 1)
+        conn.execute(text("CREATE TABLE IF NOT EXISTS calculations_default PARTITION OF calculations DEFAULT"))
+        conn.execute(text("INSERT INTO calculations SELECT * FROM calculations_unpartitioned"))
+        conn.execute(text("DROP TABLE calculations_unpartitioned"))
+    # LIKE cannot copy the old indexes (unique ones would have to include the
+    # partition key), so recreate the declared ones on the new table
+    ensure_calculation_indexes(engine)
+
+
+# ---------- Archive files ----------
+
+def _archive_row(row) -> dict:
+    data = dict(row._mapping)
+    data["timestamp"] = data["timestamp"].isoformat()
+    data["type"] = getattr(data["type"], "value", data["type"])
+    for name in ("a_exact", "b_exact", "result_exact"):
+        if data[name] is not None:
+            data[name] = str(data[name])
+    return data
+
+
+def _write_ndjson(path: Path, rows: List[dict]) -> None:
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for row in rows:
+            fh.write(json.dumps(row, separators=(",", ":")))
+            fh.write("\n")
+
+
+def _write_parquet(path: Path, rows: List[dict]) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pylist(rows)
+    pq.write_table(table, path, compression="zstd")
+
+
+def _summarize(rows: List[dict]) -> Dict[str, dict]:
+    summary: Dict[str, dict] = {}
+    for row in rows:
+        entry = summary.setdefault(str(row["user_id"]), {"count": 0, "sum_a": 0.0, "sum_b": 0.0, "counts": {}})
+        entry["count"] += 1
+        entry["sum_a"] += row["a"]
+        entry["sum_b"] += row["b"]
+        entry["counts"][row["type"]] = entry["counts"].get(row["type"], 0) + 1
+    return summary
+
+
+PENDING_SUFFIX = ".pending"
+
+
+def _write_month(archive_dir: Path, month: date, run_id: str, rows: List[dict], fmt: str) -> Path:
+    """Write a month's data file and its summary as `<summary>.pending`;
+    returns the pending summary path. Readers only see a month file once its
+    summary is in place (`_promote`), after the rows left the live table."""
+    stem = f"calculations-{month.year}-{month.month:02d}-{run_id}"
+    if fmt == "parquet":
+        _write_parquet(archive_dir / f"{stem}.parquet", rows)
+    else:
+        _write_ndjson(archive_dir / f"{stem}.ndjson.gz", rows)
+    pending = archive_dir / f"{stem}.summary.json{PENDING_SUFFIX}"
+    ids = [row["id"] for row in rows]
+    pending.write_text(json.dumps({
+        "month": month.isoformat(), "rows": len(rows), "min_id": min(ids), "max_id": max(ids),
+        "users": _summarize(rows),
+    }))
+    return pending
+
+
+def _promote(pending: Path) -> None:
+    pending.replace(pending.with_name(pending.name[: -len(PENDING_SUFFIX)]))
+
+
+def _discard(pending: Path) -> None:
+    stem = pending.name[: -len(".summary.json" + PENDING_SUFFIX)]
+    for suffix in (".ndjson.gz", ".parquet"):
+        pending.with_name(stem + suffix).unlink(missing_ok=True)
+    pending.unlink(missing_ok=True)
+
+
+def _recover_pending(engine: Engine, archive_dir: Path) -> None:
+    """Finish month files left pending by a run that stopped around its
+    commit: promote them if their rows are gone from the live table, else
+    discard them (the delete did not commit and the rows will be archived
+    again)."""
+    for pending in sorted(archive_dir.rglob(f"calculations-*.summary.json{PENDING_SUFFIX}")):
+        meta = json.loads(pending.read_text())
+        month = date.fromisoformat(meta["month"])
+        lower, upper = datetime(month.year, month.month, 1), add_months(month, 1)
+        with engine.connect() as conn:
+            still_live = conn.execute(select(Calculation.id).where(
+                Calculation.id.between(meta["min_id"], meta["max_id"]),
+                Calculation.timestamp >= lower,
+                Calculation.timestamp < datetime(upper.year, upper.month, 1),
+            ).limit(1)).first()
+        if still_live:
+            _discard(pending)
+        else:
+            _promote(pending)
+
+
+def archive_old_calculations(
+    engine: Engine,
+    archive_dir: str | Path = CALCULATION_ARCHIVE_DIR,
+    retention_months: int = CALCULATION_RETENTION_MONTHS,
+    now: Optional[datetime] = None,
+    fmt: str = CALCULATION_ARCHIVE_FORMAT,
+) -> Dict[str, int]:
+    """Move rows older than the retention window into archive files.
+
+    Returns the number of archived rows per month (`YYYY-MM`).
+    """
+    now = now or datetime.utcnow()
+    cutoff = retention_cutoff(now, retention_months)
+    archive_dir = Path(archive_dir)
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    run_id = now.strftime("%Y%m%d%H%M%S")
+    columns = [Calculation.__table__.c[name] for name in ARCHIVE_COLUMNS]
+    archived: Dict[str, int] = {}
+    _recover_pending(engine, archive_dir)
+    pending: List[Path] = []
+
+    try:
+        with engine.begin() as conn:
+            partitioned = is_partitioned(conn)
+            result = conn.execute(
+                select(*columns).where(Calculation.timestamp < cutoff).order_by(Calculation.timestamp, Calculation.id)
+            )
+            by_month: Dict[date, List[dict]] = {}
+            max_id = None
+            for row in result:
+                by_month.setdefault(month_start(row.timestamp), []).append(_archive_row(row))
+                max_id = row.id if max_id is None else max(max_id, row.id)
+            for month, rows in sorted(by_month.items()):
+                pending.append(_write_month(archive_dir, month, run_id, rows, fmt))
+                archived[f"{month.year}-{month.month:02d}"] = len(rows)
+
+            if partitioned:
+                for month in by_month:
+                    name = month_partition_name(month)
+                    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                        conn.execute(text(f"ALTER TABLE calculations DETACH PARTITION {name}"))
+                        conn.execute(text(f"DROP TABLE {name}"))
+            if max_id is not None:
+                # Plain tables, plus any leftovers in a partitioned table's default partition.
+                conn.execute(delete(Calculation).where(Calculation.timestamp < cutoff, Calculation.id <= max_id))
+    except BaseException:
+        # nothing was deleted, so the files would only duplicate live rows
+        for path in pending:
+            _discard(path)
+        raise
+    for path in pending:
+        _promote(path)
+
+    if partitioned:
+        ensure_month_partitions(engine, now=now)
+    _summary_cache.clear()
+    # Core deletes bypass the ORM flush, so report the affected users explicitly.
+    for user_id in {row["user_id"] for rows in by_month.values() for row in rows} - {None}:
+        notify_user_write(user_id)
+    for month, count in archived.items():
+        logger.info(f"Archived {count} calculations from {month} to {archive_dir}")
+    return archived
+
+
+# ---------- Reading archived data ----------
+
+def _complete_data_files(archive_dir: Path) -> List[Path]:
+    files = []
+    for summary in sorted(archive_dir.rglob("calculations-*.summary.json")):
+        stem = summary.name[: -len(".summary.json")]
+        for suffix in (".ndjson.gz", ".parquet"):
+            data = summary.with_name(stem + suffix)
+            if data.exists():
+                files.append(data)
+    return files
+
+
+def iter_archived_rows(user_id: int, archive_dir: str | Path | None = None) -> Iterator[dict]:
+    """Yield a user's archived calculations, oldest month first."""
+    archive_dir = Path(archive_dir or CALCULATION_ARCHIVE_DIR)
+    if not archive_dir.exists():
+        return
+    for path in _complete_data_files(archive_dir):
+        if path.suffix == ".parquet":
+            import pyarrow.parquet as pq
+
+            rows = pq.read_table(path, filters=[("user_id", "=", user_id)]).to_pylist()
+            yield from rows
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                row = json.loads(line)
+                if row["user_id"] == user_id:
+                    yield row
+
+
+_summary_cache: Dict[Path, tuple] = {}
+_summary_lock = threading.Lock()
+
+
+def _load_summary(path: Path) -> dict:
+    mtime = path.stat().st_mtime
+    with _summary_lock:
+        cached = _summary_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    data = json.loads(path.read_text())
+    with _summary_lock:
+        _summary_cache[path] = (mtime, data)
+    return data
+
+
+def archived_user_summary(user_id: int, archive_dir: str | Path | None = None) -> dict:
+    """Aggregates over a user's archived rows: count, sum_a, sum_b, counts per type."""
+    total = {"count": 0, "sum_a": 0.0, "sum_b": 0.0, "counts": {}}
+    archive_dir = Path(archive_dir or CALCULATION_ARCHIVE_DIR)
+    if not archive_dir.exists():
+        return total
+    for path in archive_dir.rglob("calculations-*.summary.json"):
+        entry = _load_summary(path)["users"].get(str(user_id))
+        if not entry:
+            continue
+        total["count"] += entry["count"]
+        total["sum_a"] += entry["sum_a"]
+        total["sum_b"] += entry["sum_b"]
+        for op, n in entry["counts"].items():
+            total["counts"][op] = total["counts"].get(op, 0) + n
+    return total
+
+
+def main(argv=None):
+    from app.database import engine
+    from app.sharding import shard_router
+
+    parser = argparse.ArgumentParser(description="Calculation retention and archival")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="archive rows older than the retention window")
+    run.add_argument("--retention-months", type=int, default=CALCULATION_RETENTION_MONTHS)
+    run.add_argument("--archive-dir", default=CALCULATION_ARCHIVE_DIR)
+    sub.add_parser("partition", help="convert calculations to monthly partitions (PostgreSQL)")
+    args = parser.parse_args(argv)
+
+    engines = {"primary": engine} if shard_router is None else shard_router.engines
+    for name, eng in engines.items():
+        if args.command == "partition":
+            convert_to_partitioned(eng)
+            print(f"{name}: partitioned")
+            continue
+        target = Path(args.archive_dir) if shard_router is None else Path(args.archive_dir) / name
+        archived = archive_old_calculations(eng, target, retention_months=args.retention_months)
+        print(f"{name}: archived {sum(archived.values())} rows")
+
+
+if __name__ == "__main__":
+    main()
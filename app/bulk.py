@@ -0,0 +1,75 @@
+# app/bulk.py
+"""Set-based bulk operations on a user's calculations.
+
+Each operation runs in one transaction on the session that owns the user's
+calculations. ORM-enabled bulk statements do not go through the unit of
+work, so the session's write listeners do not see them: callers must report
+the write with `notify_user_write` after committing.
+"""
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, delete, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Calculation
+from app.numeric import decimal_context
+from app.workers import run_calculation
+from app.schemas import CalculationFilter, OperationType
+
+
+def filter_clause(user_id: int, filters: CalculationFilter):
+    clauses = [Calculation.user_id == user_id]
+    if filters.ids is not None:
+        clauses.append(Calculation.id.in_(filters.ids))
+    if filters.type is not None:
+        clauses.append(Calculation.type == filters.type)
+    if filters.before is not None:
+        clauses.append(Calculation.timestamp < filters.before)
+    return and_(*clauses)
+
+
+def bulk_delete(db: Session, user_id: int, filters: CalculationFilter) -> int:
+    """Delete every matching calculation with a single DELETE statement."""
+    result = db.execute(delete(Calculation).where(filter_clause(user_id, filters)), execution_options={"synchronize_session": False})
+    db.commit()
+    return result.rowcount
+
+
+def bulk_recompute(
+    db: Session, user_id: int, filters: CalculationFilter, new_type: Optional[OperationType] = None
+) -> Tuple[int, List[int]]:
+    """Recompute matching calculations, optionally with a new operation.
+
+    Results are computed with run_calculation (so every operation behaves
+    exactly as in single updates, on every database) and written with one
+    executemany UPDATE. If any row cannot be computed nothing is changed and
+    the failing ids are returned.
+    """
+    rows = db.execute(
+        select(
+            Calculation.id, Calculation.a, Calculation.b, Calculation.type,
+            Calculation.precision, Calculation.a_exact, Calculation.b_exact,
+        ).where(filter_clause(user_id, filters))
+    ).all()
+    params, failed = [], []
+    for row in rows:
+        op = new_type or row.type
+        try:
+            if row.precision is not None:
+                # decimal-mode rows are recomputed from their exact operands
+                exact = run_calculation(row.a_exact, row.b_exact, op, decimal_context(row.precision))
+                result = float(exact)
+            else:
+                exact = None
+                result = run_calculation(row.a, row.b, op)
+        except (ArithmeticError, ValueError):
+            failed.append(row.id)
+            continue
+        params.append({"id": row.id, "type": op, "result": result, "result_exact": exact})
+    if failed:
+        db.rollback()
+        return 0, failed
+    if params:
+        db.execute(update(Calculation), params)
+    db.commit()
+    return len(params), []
@@ -0,0 +1,121 @@
+# app/cache.py
+"""Per-user read caching for hot dashboard endpoints.
+
+`SingleFlight` lets concurrent identical calls share one execution: the
+first caller runs the function, later callers with the same key wait for its
+result (or exception). `UserReadCache` puts a short-TTL result cache in front
+of it, keyed by (user_id, endpoint, params).
+
+Every write to a user's data bumps that user's generation through
+`database.user_write_listeners`; cached results and in-flight computations
+from an older generation are never served after the write, so a user always
+reads their own writes. Other workers' writes do not reach this worker's
+generation; callers that pair a result with a validator (the ETag handlers)
+put the data version they read into `params`, so a result is only reused for
+the version it was computed at.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from app import metrics
+from app.database import user_write_listeners
+
+
+READ_CACHE_TTL_SECONDS = float(os.getenv("READ_CACHE_TTL_SECONDS", "2"))
+READ_CACHE_SIZE = int(os.getenv("READ_CACHE_SIZE", "10000"))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            metrics.inc("read_cache_requests_total", result="coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class UserReadCache:
+    def __init__(self, ttl_seconds: float = READ_CACHE_TTL_SECONDS, maxsize: int = READ_CACHE_SIZE, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (user_id, endpoint, params) -> (expires_at, generation, value)
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._flight = SingleFlight()
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_compute(self, user_id: int, endpoint: str, params: tuple, fn: Callable[[], Any]) -> Any:
+        key = (user_id, endpoint, params)
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock() and entry[1] == generation:
+                self._entries.move_to_end(key)
+                metrics.inc("read_cache_requests_total", result="hit")
+                return entry[2]
+
+        def load():
+            metrics.inc("read_cache_requests_total", result="miss")
+            value = fn()
+            if self.ttl_seconds > 0:
+                with self._lock:
+                    # a write during the computation makes the result stale
+                    if self._generations.get(user_id, 0) == generation:
+                        self._entries[key] = (self._clock() + self.ttl_seconds, generation, value)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.maxsize:
+                            self._entries.popitem(last=False)
+            return value
+
+        # the generation is part of the flight key so a request that follows
+        # a write never joins a computation that started before it
+        return self._flight.do((key, generation), load)
+
+
+metrics.describe("read_cache_requests_total", "Cached per-user reads by result (hit, miss, coalesced)")
+
+read_cache = UserReadCache()
+user_write_listeners.append(read_cache.invalidate_user)
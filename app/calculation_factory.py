@@ -1,18 +1,65 @@
 # app/calculation_factory.py
+from decimal import Context, Decimal, InvalidOperation, Overflow, localcontext
+from typing import Optional
+
+from app.limits import CalculationError
+from app.numeric import check_decimal_exponent
 from app.operations import add, subtract, multiply, divide, modulus, exponent
 from app.schemas import OperationType
 
+# Operation registry: stable small-integer codes used to store
+# `Calculation.type` compactly. Codes are persisted, so never renumber them;
+# new operations get the next free code.
+OPERATION_CODES = {
+    OperationType.ADD: 1,
+    OperationType.SUBTRACT: 2,
+    OperationType.MULTIPLY: 3,
+    OperationType.DIVIDE: 4,
+    OperationType.MODULUS: 5,
+    OperationType.EXPONENT: 6,
+}
+CODE_OPERATIONS = {code: op for op, code in OPERATION_CODES.items()}
+
+OPERATION_FUNCTIONS = {
+    OperationType.ADD: add,
+    OperationType.SUBTRACT: subtract,
+    OperationType.MULTIPLY: multiply,
+    OperationType.DIVIDE: divide,
+    OperationType.MODULUS: modulus,
+    OperationType.EXPONENT: exponent,
+}
+
+
+def parse_operation(value) -> OperationType:
+    """Normalize a stored or legacy operation value to an OperationType.
+
+    Accepts enum members, registry codes (int or digit string), enum values
+    ("add") and the `str(enum)` form older rows were written with
+    ("OperationType.ADD").
+    """
+    if isinstance(value, OperationType):
+        return value
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        return CODE_OPERATIONS[int(value)]
+    if isinstance(value, str) and value.startswith("OperationType."):
+        return OperationType[value.split(".", 1)[1]]
+    return OperationType(value)
+
 class CalculationFactory:
     """
     Factory to instantiate the correct calculation logic based on operation type.
     """
     
     @staticmethod
-    def calculate(a: float, b: float, operation: OperationType) -> float:
+    def calculate(a: float, b: float, operation: OperationType, context: Optional[Context] = None) -> float:
         """
         Executes the math operation and returns the result.
         Validates input logic (like division by zero) via the underlying operations.
+        With a decimal `context` (see app.numeric), `a` and `b` are Decimals and
+        the result is a Decimal rounded to the context's precision.
         """
+        if context is not None:
+            return CalculationFactory.calculate_decimal(a, b, operation, context)
         if operation == OperationType.ADD:
             return add(a, b)
         elif operation == OperationType.SUBTRACT:
@@ -26,4 +73,21 @@ class CalculationFactory:
         elif operation == OperationType.EXPONENT:
             return exponent(a, b)
         else:
-            raise ValueError(f"Unknown operation type: {operation}")
\ No newline at end of file
+            raise ValueError(f"Unknown operation type: {operation}")
+
+    @staticmethod
+    def calculate_decimal(a: Decimal, b: Decimal, operation: OperationType, context: Context) -> Decimal:
+        if operation == OperationType.EXPONENT:
+            check_decimal_exponent(a, b, context)
+        try:
+            with localcontext(context):
+                result = +OPERATION_FUNCTIONS[operation](a, b)
+                # Decimal % takes the dividend's sign; match float modulus,
+                # which takes the divisor's
+                if operation == OperationType.MODULUS and result and (result < 0) != (b < 0):
+                    result = result + b
+        except Overflow:
+            raise CalculationError("overflow", f"{operation.value} of {a} and {b} overflows", operation=operation.value)
+        except InvalidOperation:
+            raise CalculationError("not_a_number", f"{operation.value} is undefined for {a} and {b}", operation=operation.value)
+        return result
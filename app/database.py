@@ -1,7 +1,10 @@
+import itertools
 import os
 from pathlib import Path
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+
+from app.replicas import ReplicaRouter
 
 # Use DATABASE_URL from environment (GitHub Actions sets this)
 # Default to in-memory SQLite for local test runs unless DATABASE_URL is set
@@ -43,6 +46,89 @@ engine = create_engine(DATABASE_URL, connect_args=connect_args)
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+class ReadOnlySession(Session):
+    """Session for read-only request handlers.
+
+    Refuses to flush pending changes so a read path can never write by
+    accident; handlers are expected to run column-projected selects that
+    bypass the identity map and unit-of-work entirely.
+    """
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            raise RuntimeError("ReadOnlySession cannot flush changes")
+
+
+def _read_only(bind):
+    # On PostgreSQL (psycopg2) also ask the server for a read-only transaction.
+    if bind.dialect.name == "postgresql":
+        return bind.execution_options(postgresql_readonly=True)
+    return bind
+
+
+read_engine = _read_only(engine)
+
+ReadSessionLocal = sessionmaker(
+    class_=ReadOnlySession,
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=read_engine,
+)
+
+# Optional read replicas: comma-separated URLs. Read-only handlers are routed
+# to them round-robin; writes always go to the primary `engine`.
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+replica_engines = [
+    _read_only(create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {}))
+    for url in DATABASE_REPLICA_URLS
+]
+replica_router = ReplicaRouter(
+    read_engine,
+    replica_engines,
+    health_check_interval=REPLICA_HEALTH_CHECK_SECONDS,
+    sticky_seconds=REPLICA_STICKY_SECONDS,
+)
+
+
+# ---------- User write notifications ----------
+# Callbacks invoked with a user id after a primary session commits changes to
+# that user's rows (users, sessions, calculations). Used for read-your-writes
+# pinning and by anything else that caches per-user reads.
+user_write_listeners = [replica_router.mark_written]
+
+
+def notify_user_write(user_id: int) -> None:
+    for listener in list(user_write_listeners):
+        listener(user_id)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_written_users(session, flush_context):
+    written = session.info.setdefault("written_user_ids", set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if getattr(obj, "__tablename__", None) == "users":
+            user_id = obj.id
+        else:
+            user_id = getattr(obj, "user_id", None)
+        if user_id is not None:
+            written.add(user_id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _notify_written_users(session):
+    for user_id in session.info.pop("written_user_ids", ()):
+        notify_user_write(user_id)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_written_users(session):
+    session.info.pop("written_user_ids", None)
+
 # Base class for models
 Base = declarative_base()
 
@@ -56,6 +142,23 @@ def get_db():
         db.close()
 
 
+def open_read_session(user_id: int | None = None) -> ReadOnlySession:
+    """Open a read-only session on a replica, or on the primary when no replica
+    is configured/healthy or `user_id` recently wrote."""
+    return ReadSessionLocal(bind=replica_router.engine_for_read(user_id))
+
+
+# Dependency for read-only FastAPI routes
+def get_read_db():
+    db = open_read_session()
+    try:
+        yield db
+    finally:
+        # Nothing to persist: end the transaction without a commit.
+        db.rollback()
+        db.close()
+
+
 # Ensure models are imported and tables are created when the module is imported.
 # This helps tests and simple script runs where tables need to exist without
 # requiring an external migration step. We import inside a try/except to avoid
@@ -0,0 +1,201 @@
+# app/events.py
+"""Calculation change events for `GET /calculations/stream` (server-sent events).
+
+Handlers publish `created`, `updated` and `deleted` events after committing.
+The default `InProcessBroker` fans them out to the subscribers connected to
+this worker; set EVENT_BROKER_URL=redis://... to use `RedisBroker`, which
+keeps each user's events in a Redis stream so every worker sees them
+(requires the `redis` package).
+
+Each subscriber has a bounded queue. A subscriber that falls more than
+EVENT_QUEUE_SIZE events behind is sent a `reset` event and disconnected
+rather than buffering without limit. Clients resume by reconnecting with
+`Last-Event-ID`: events still in the per-user replay buffer
+(EVENT_REPLAY_SIZE) are sent again, and when the gap cannot be filled the
+client gets `reset` and should reload the list.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+
+from app import metrics
+
+
+EVENT_BROKER_URL = os.getenv("EVENT_BROKER_URL", "")
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+EVENT_REPLAY_SIZE = int(os.getenv("EVENT_REPLAY_SIZE", "100"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+
+@dataclass(frozen=True)
+class Event:
+    id: str
+    type: str
+    data: str  # JSON text
+
+    def encode(self) -> bytes:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.data}\n\n".encode("utf-8")
+
+
+def reset_event(event_id: str = "") -> Event:
+    return Event(event_id, "reset", "{}")
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def deliver(self, event: Event) -> None:
+        # runs on the subscriber's event loop
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            metrics.inc("sse_subscribers_dropped_total")
+
+
+class InProcessBroker:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE, replay_size: int = EVENT_REPLAY_SIZE):
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        # ids from another process (or before a restart) cannot be replayed
+        self.epoch = uuid.uuid4().hex[:8]
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._buffers: Dict[int, Deque[tuple]] = {}
+        self._subscribers: Dict[int, Set[_Subscriber]] = {}
+        # user_id -> newest seq pushed out of that user's replay buffer
+        self._evicted: Dict[int, int] = {}
+
+    def publish(self, user_id: int, event_type: str, data: str) -> None:
+        """Safe to call from request threads and from the event loop."""
+        with self._lock:
+            seq = next(self._seq)
+            event = Event(f"{self.epoch}-{seq}", event_type, data)
+            buffer = self._buffers.setdefault(user_id, deque(maxlen=self.replay_size))
+            if len(buffer) == buffer.maxlen:
+                self._evicted[user_id] = buffer[0][0]
+            buffer.append((seq, event))
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.deliver, event)
+            except RuntimeError:
+                pass  # loop already closed; the subscriber is going away
+
+    def _backlog(self, user_id: int, last_event_id: Optional[str]) -> list:
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return [reset_event()]
+        seq = int(seq)
+        if seq < self._evicted.get(user_id, 0):
+            return [reset_event()]  # some events after seq are no longer buffered
+        return [event for event_seq, event in self._buffers.get(user_id, ()) if event_seq > seq]
+
+    async def listen(self, user_id: int, last_event_id: Optional[str] = None,
+                     heartbeat: float = SSE_HEARTBEAT_SECONDS) -> AsyncIterator[Optional[Event]]:
+        """Yield events for `user_id`, or None after `heartbeat` idle seconds."""
+        sub = _Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            backlog = self._backlog(user_id, last_event_id)
+            self._subscribers.setdefault(user_id, set()).add(sub)
+        try:
+            for event in backlog:
+                yield event
+                if event.type == "reset":
+                    return
+            while True:
+                if sub.lagged and sub.queue.empty():
+                    yield reset_event()
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+        finally:
+            with self._lock:
+                subs = self._subscribers.get(user_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[user_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+
+class RedisBroker:
+    """One Redis stream per user; readers block on XREAD, so a slow client
+    only delays its own reads and never buffers on the server."""
+
+    def __init__(self, url: str, replay_size: int = EVENT_REPLAY_SIZE, prefix: str = "calc-events:"):
+        import redis
+        import redis.asyncio as aioredis
+
+        self._sync = redis.from_url(url)
+        self._async = aioredis.from_url(url)
+        self.replay_size = replay_size
+        self.prefix = prefix
+
+    def publish(self, user_id: int, event_type: str, data: str) -> None:
+        self._sync.xadd(f"{self.prefix}{user_id}", {"type": event_type, "data": data},
+                        maxlen=self.replay_size, approximate=True)
+
+    async def listen(self, user_id: int, last_event_id: Optional[str] = None,
+                     heartbeat: float = SSE_HEARTBEAT_SECONDS) -> AsyncIterator[Optional[Event]]:
+        key = f"{self.prefix}{user_id}"
+        cursor = last_event_id or "$"
+        while True:
+            result = await self._async.xread({key: cursor}, count=EVENT_QUEUE_SIZE, block=int(heartbeat * 1000))
+            if not result:
+                yield None
+                continue
+            for entry_id, fields in result[0][1]:
+                cursor = entry_id.decode()
+                yield Event(cursor, fields[b"type"].decode(), fields[b"data"].decode())
+
+
+def create_broker(url: str = EVENT_BROKER_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    return InProcessBroker()
+
+
+event_broker = create_broker()
+if isinstance(event_broker, InProcessBroker):
+    metrics.register_gauge("sse_subscribers", event_broker.subscriber_count, "Open calculation event streams")
+metrics.describe("sse_subscribers_dropped_total", "Event streams closed because the client fell behind")
+
+
+def publish_calculation_event(user_id: int, event_type: str, data: bytes | str | dict) -> None:
+    """Publish a change to one of `user_id`'s calculations.
+
+    `data` is the serialized calculation (see serialization.dump_calculation)
+    or, for deletes, a dict with its id.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    elif isinstance(data, dict):
+        data = json.dumps(data, separators=(",", ":"))
+    event_broker.publish(user_id, event_type, data)
+
+
+async def sse_stream(user_id: int, last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+    # tell EventSource-style clients how long to wait before reconnecting
+    yield b"retry: 3000\n\n"
+    async for event in event_broker.listen(user_id, last_event_id):
+        yield b": keepalive\n\n" if event is None else event.encode()
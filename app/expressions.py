@@ -0,0 +1,389 @@
+# app/expressions.py
+"""Multi-step arithmetic expressions over the OperationType operations.
+
+An expression is given either as infix text, e.g. `(2 + 3) * 4 ** 2 % 7`,
+or as a JSON AST where a node is a number, `{"var": "x"}` or
+`{"op": "<operation>", "left": <node>, "right": <node>}`. Operators map to
+operations as `+ add`, `- subtract`, `* multiply`, `/ divide`, `% modulus`
+and `** exponent`, with Python's precedence and associativity (`**` binds
+tightest and is right-associative; `-x` is `0 - x`).
+
+Both forms parse to the same tuple AST, whose fully parenthesized rendering
+is the expression's normalized text. `compile_expression` turns it into a
+tree of closures and caches the result by normalized text, so a repeated
+expression is parsed at most once per distinct spelling and compiled once.
+
+`CompiledExpression.evaluate_columns` evaluates the same tree over columns of
+variable bindings (as used by formula templates): each operation runs once
+over whole columns, and a row that fails (e.g. divides by zero) yields None
+and an error for that row instead of failing the batch.
+"""
+import math
+import operator
+import os
+import re
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.calculation_factory import OPERATION_FUNCTIONS, parse_operation
+from app.limits import check_result
+from app.schemas import OperationType
+
+
+EXPRESSION_CACHE_SIZE = int(os.getenv("EXPRESSION_CACHE_SIZE", "1024"))
+EXPRESSION_MAX_LENGTH = int(os.getenv("EXPRESSION_MAX_LENGTH", "4096"))
+EXPRESSION_MAX_OPERATIONS = int(os.getenv("EXPRESSION_MAX_OPERATIONS", "256"))
+EXPRESSION_MAX_DEPTH = int(os.getenv("EXPRESSION_MAX_DEPTH", "64"))
+
+SYMBOLS = {
+    OperationType.ADD: "+",
+    OperationType.SUBTRACT: "-",
+    OperationType.MULTIPLY: "*",
+    OperationType.DIVIDE: "/",
+    OperationType.MODULUS: "%",
+    OperationType.EXPONENT: "**",
+}
+OPERATORS = {symbol: op for op, symbol in SYMBOLS.items()}
+
+# ("num", value) | ("var", name) | ("op", OperationType, left, right)
+Node = Tuple[Any, ...]
+Step = Tuple[OperationType, float, float, float]
+
+
+class ExpressionError(ValueError):
+    def __init__(self, message: str, position: Optional[int] = None):
+        super().__init__(message if position is None else f"{message} at position {position}")
+        self.position = position
+
+
+_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|(\*\*|[-+*/%()]))")
+
+
+def _tokenize(text: str) -> List[Tuple[str, str, int]]:
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match:
+            raise ExpressionError(f"Unexpected character {text[pos:].lstrip()[:1]!r}", pos)
+        number, name, symbol = match.groups()
+        start = match.start(match.lastindex)
+        if number is not None:
+            tokens.append(("num", number, start))
+        elif name is not None:
+            tokens.append(("var", name, start))
+        else:
+            tokens.append(("sym", symbol, start))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive descent over the precedence levels:
+
+        sum     := product (("+" | "-") product)*
+        product := unary (("*" | "/" | "%") unary)*
+        unary   := ("-" | "+")* power
+        power   := atom ("**" unary)?
+        atom    := number | name | "(" sum ")"
+    """
+
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.index = 0
+        self.depth = 0
+        self.operations = 0
+
+    def _peek(self) -> Optional[str]:
+        if self.index < len(self.tokens) and self.tokens[self.index][0] == "sym":
+            return self.tokens[self.index][1]
+        return None
+
+    def _position(self) -> int:
+        return self.tokens[self.index][2] if self.index < len(self.tokens) else -1
+
+    def _op(self, op: OperationType, left: Node, right: Node) -> Node:
+        self.operations += 1
+        if self.operations > EXPRESSION_MAX_OPERATIONS:
+            raise ExpressionError(f"Expression has more than {EXPRESSION_MAX_OPERATIONS} operations")
+        return ("op", op, left, right)
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise ExpressionError("Empty expression")
+        node = self._sum()
+        if self.index < len(self.tokens):
+            raise ExpressionError(f"Unexpected {self.tokens[self.index][1]!r}", self._position())
+        return node
+
+    def _sum(self) -> Node:
+        node = self._product()
+        while self._peek() in ("+", "-"):
+            symbol = self.tokens[self.index][1]
+            self.index += 1
+            node = self._op(OPERATORS[symbol], node, self._product())
+        return node
+
+    def _product(self) -> Node:
+        node = self._unary()
+        while self._peek() in ("*", "/", "%"):
+            symbol = self.tokens[self.index][1]
+            self.index += 1
+            node = self._op(OPERATORS[symbol], node, self._unary())
+        return node
+
+    def _unary(self) -> Node:
+        # a run of signs is read in a loop, not by recursion, so "----1" costs
+        # no stack depth; only the parity of its minuses matters
+        negate = False
+        while self._peek() in ("-", "+"):
+            negate ^= self.tokens[self.index][1] == "-"
+            self.index += 1
+        operand = self._power()
+        if not negate:
+            return operand
+        if operand[0] == "num":
+            return ("num", -operand[1])
+        return self._op(OperationType.SUBTRACT, ("num", 0.0), operand)
+
+    def _power(self) -> Node:
+        node = self._atom()
+        if self._peek() == "**":
+            self.index += 1
+            node = self._op(OperationType.EXPONENT, node, self._unary())
+        return node
+
+    def _atom(self) -> Node:
+        if self.index >= len(self.tokens):
+            raise ExpressionError("Unexpected end of expression")
+        kind, value, position = self.tokens[self.index]
+        self.index += 1
+        if kind == "num":
+            return ("num", float(value))
+        if kind == "var":
+            return ("var", value)
+        if value == "(":
+            self.depth += 1
+            if self.depth > EXPRESSION_MAX_DEPTH:
+                raise ExpressionError(f"Expression nests deeper than {EXPRESSION_MAX_DEPTH} levels", position)
+            node = self._sum()
+            if self._peek() != ")":
+                raise ExpressionError("Missing ')'", self._position())
+            self.index += 1
+            self.depth -= 1
+            return node
+        raise ExpressionError(f"Unexpected {value!r}", position)
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def parse_infix(text: str) -> Node:
+    if len(text) > EXPRESSION_MAX_LENGTH:
+        raise ExpressionError(f"Expression is longer than {EXPRESSION_MAX_LENGTH} characters")
+    return _Parser(text).parse()
+
+
+def parse_json_ast(node: Any, _depth: int = 0, _count: Optional[List[int]] = None) -> Node:
+    _count = _count if _count is not None else [0]
+    if _depth > EXPRESSION_MAX_DEPTH:
+        raise ExpressionError(f"Expression nests deeper than {EXPRESSION_MAX_DEPTH} levels")
+    if isinstance(node, bool):
+        raise ExpressionError("Booleans are not numbers")
+    if isinstance(node, (int, float)):
+        return ("num", float(node))
+    if isinstance(node, dict) and set(node) == {"var"} and isinstance(node["var"], str) and node["var"].isidentifier():
+        return ("var", node["var"])
+    if isinstance(node, dict) and set(node) == {"op", "left", "right"}:
+        try:
+            op = parse_operation(node["op"])
+        except (KeyError, ValueError):
+            raise ExpressionError(f"Unknown operation {node['op']!r}")
+        _count[0] += 1
+        if _count[0] > EXPRESSION_MAX_OPERATIONS:
+            raise ExpressionError(f"Expression has more than {EXPRESSION_MAX_OPERATIONS} operations")
+        return ("op", op, parse_json_ast(node["left"], _depth + 1, _count), parse_json_ast(node["right"], _depth + 1, _count))
+    raise ExpressionError(f"Invalid expression node: {node!r}")
+
+
+def normalize(node: Node) -> str:
+    """Fully parenthesized text; equal for every spelling of the same AST."""
+    if node[0] == "num":
+        return repr(node[1])
+    if node[0] == "var":
+        return node[1]
+    return f"({normalize(node[2])} {SYMBOLS[node[1]]} {normalize(node[3])})"
+
+
+def variables(node: Node) -> Tuple[str, ...]:
+    names = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current[0] == "var":
+            names.add(current[1])
+        elif current[0] == "op":
+            stack.extend(current[2:])
+    return tuple(sorted(names))
+
+
+Evaluator = Callable[[Dict[str, float], Optional[List[Step]]], float]
+
+
+def _compile(node: Node) -> Evaluator:
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda env, steps: value
+    if kind == "var":
+        name = node[1]
+        return lambda env, steps: env[name]
+    op, left, right = node[1], _compile(node[2]), _compile(node[3])
+    fn = OPERATION_FUNCTIONS[op]
+
+    def evaluate(env, steps):
+        a = left(env, steps)
+        b = right(env, steps)
+        result = check_result(fn(a, b), op, a, b)
+        if steps is not None:
+            steps.append((op, a, b, result))
+        return result
+
+    return evaluate
+
+
+class CompiledExpression:
+    def __init__(self, ast: Node):
+        self.ast = ast
+        self.text = normalize(ast)
+        self.variables = variables(ast)
+        self._evaluate = _compile(ast)
+        self._evaluate_columns = _compile_columns(ast)
+
+    def evaluate(self, env: Optional[Dict[str, float]] = None, steps: Optional[List[Step]] = None) -> float:
+        """Evaluate with variable bindings `env`; when `steps` is a list, every
+        operation is appended to it as (operation, a, b, result) in order."""
+        env = env or {}
+        missing = [name for name in self.variables if name not in env]
+        if missing:
+            raise ExpressionError(f"Missing value for {', '.join(missing)}")
+        return self._evaluate(env, steps)
+
+    def evaluate_columns(self, columns: Dict[str, List[float]]) -> Tuple[List[Optional[float]], Dict[int, str]]:
+        """Evaluate every row of equal-length binding columns.
+
+        Returns (results, errors): results[i] is None when row i failed, and
+        errors maps such row indexes to a message.
+        """
+        missing = [name for name in self.variables if name not in columns]
+        if missing:
+            raise ExpressionError(f"Missing values for {', '.join(missing)}")
+        unknown = sorted(set(columns) - set(self.variables))
+        if unknown:
+            raise ExpressionError(f"Unknown variables {', '.join(unknown)}")
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ExpressionError("Binding columns must have the same length")
+        rows = lengths.pop() if lengths else 1
+
+        errors: Dict[int, str] = {}
+        results = self._evaluate_columns(columns, errors)
+        if not isinstance(results, list):
+            results = [results] * rows
+        # filter(None, ...) skips failed rows (and zeros, which are finite)
+        if not all(map(math.isfinite, filter(None, results))):
+            results = list(results)
+            for index, value in enumerate(results):
+                if value is not None and not math.isfinite(value):
+                    errors.setdefault(index, "Result is too large")
+                    results[index] = None
+        return results, errors
+
+
+# Column-wise counterparts of app.operations; these skip the per-call logging,
+# which would dominate the cost of a million-row evaluation.
+COLUMN_FUNCTIONS = {
+    OperationType.ADD: operator.add,
+    OperationType.SUBTRACT: operator.sub,
+    OperationType.MULTIPLY: operator.mul,
+    OperationType.DIVIDE: operator.truediv,
+    OperationType.MODULUS: operator.mod,
+    OperationType.EXPONENT: operator.pow,
+}
+
+# a float for constant subexpressions, otherwise one value (or None) per row
+Column = Union[float, List[Optional[float]]]
+ColumnEvaluator = Callable[[Dict[str, List[float]], Dict[int, str]], Column]
+
+
+def _row_error(exc: ArithmeticError) -> str:
+    if isinstance(exc, ZeroDivisionError):
+        return "Cannot divide by zero"
+    if isinstance(exc, OverflowError):
+        return "Result is too large"
+    return str(exc)
+
+
+def _apply_rows(op: OperationType, fn: Callable, left, right, errors: Dict[int, str]) -> List[Optional[float]]:
+    # slow path, taken only when some row fails or an earlier step failed
+    out: List[Optional[float]] = []
+    for index, (a, b) in enumerate(zip(left, right)):
+        result = None
+        if a is not None and b is not None:
+            try:
+                result = fn(a, b)
+            except ArithmeticError as exc:
+                errors.setdefault(index, _row_error(exc))
+            else:
+                if isinstance(result, complex):
+                    errors.setdefault(index, f"{a!r} {SYMBOLS[op]} {b!r} is not a real number")
+                    result = None
+        out.append(result)
+    return out
+
+
+def _compile_columns(node: Node) -> ColumnEvaluator:
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda columns, errors: value
+    if kind == "var":
+        name = node[1]
+        return lambda columns, errors: columns[name]
+    op, left, right = node[1], _compile_columns(node[2]), _compile_columns(node[3])
+    fn = COLUMN_FUNCTIONS[op]
+
+    def evaluate(columns, errors):
+        a = left(columns, errors)
+        b = right(columns, errors)
+        if not isinstance(a, list) and not isinstance(b, list):
+            # constant subexpression: the same for every row
+            result = fn(a, b)
+            if isinstance(result, complex):
+                raise ExpressionError(f"{a!r} {SYMBOLS[op]} {b!r} is not a real number")
+            return result
+        a_column = a if isinstance(a, list) else repeat(a)
+        b_column = b if isinstance(b, list) else repeat(b)
+        try:
+            result = list(map(fn, a_column, b_column))
+        except (ArithmeticError, TypeError):
+            result = None
+        if result is None or (op is OperationType.EXPONENT and complex in set(map(type, result))):
+            a_column = a if isinstance(a, list) else repeat(a)
+            b_column = b if isinstance(b, list) else repeat(b)
+            result = _apply_rows(op, fn, a_column, b_column, errors)
+        return result
+
+    return evaluate
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _compile_cached(text: str) -> CompiledExpression:
+    return CompiledExpression(parse_infix(text))
+
+
+def compile_expression(source: Union[str, dict, int, float]) -> CompiledExpression:
+    """Compile infix text or a JSON AST, reusing the cached compilation of an
+    expression with the same normalized text."""
+    ast = parse_infix(source) if isinstance(source, str) else parse_json_ast(source)
+    # normalized text parses back to the same AST, so it is the cache key
+    return _compile_cached(normalize(ast))
@@ -0,0 +1,261 @@
+# app/idempotency.py
+"""Idempotency-Key support for calculation-creating endpoints.
+
+A successful response is stored under (user_id, key) for
+IDEMPOTENCY_TTL_SECONDS: in a bounded in-memory LRU for this worker and in
+the `idempotency_keys` table so other workers and restarts see it too. A
+retry with the same key replays the stored body without recomputing or
+inserting. Reusing a key with a different request body is rejected with 422.
+
+Concurrent requests with the same key are coalesced, across workers too:
+before running, a request claims the key by inserting a pending row
+(status_code 0), and a duplicate that finds the claim waits for the stored
+response, within a worker on an event and from another worker by polling the
+table. Only 2xx responses are stored; otherwise the claim is released, so if
+the first request fails a waiting duplicate runs instead. A claim older than
+IDEMPOTENCY_WAIT_SECONDS is treated as abandoned (its worker died) and may be
+taken over.
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Header, HTTPException
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import Response
+
+from app.database import engine
+from app.models import IdempotencyRecord
+from app.serialization import FastJSONResponse
+
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# how long a duplicate waits for the original request before giving up
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+# how often a duplicate checks for another worker's response
+IDEMPOTENCY_POLL_SECONDS = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.05"))
+# the `key` column's length
+IDEMPOTENCY_KEY_MAX_LENGTH = IdempotencyRecord.__table__.c.key.type.length
+# status_code of a row claimed by a request that is still running
+PENDING = 0
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: bytes
+    expires_at: float
+
+
+def request_fingerprint(endpoint: str, payload) -> str:
+    """Hash of the endpoint and validated request body."""
+    body = payload.model_dump_json()
+    # operands sent as decimal strings are kept outside the float fields
+    exact = getattr(payload, "_decimal_operands", None)
+    if exact is not None:
+        body += repr(exact)
+    return hashlib.sha256(endpoint.encode("utf-8") + b"\0" + body.encode("utf-8")).hexdigest()
+
+
+def idempotency_key_header(idempotency_key: Optional[str] = Header(None)) -> Optional[str]:
+    """The Idempotency-Key header, rejected with 400 before the handler runs
+    when it is too long to store (storing it would fail after the work is done)."""
+    if idempotency_key is not None and len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    return idempotency_key
+
+
+def _replay(stored: StoredResponse, request_hash: str) -> Response:
+    if stored.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return FastJSONResponse(stored.body, status_code=stored.status_code, headers={"Idempotent-Replayed": "true"})
+
+
+class IdempotencyStore:
+    def __init__(
+        self,
+        engine: Optional[Engine],
+        ttl_seconds: int = IDEMPOTENCY_TTL_SECONDS,
+        maxsize: int = IDEMPOTENCY_CACHE_SIZE,
+        wait_seconds: float = IDEMPOTENCY_WAIT_SECONDS,
+        poll_seconds: float = IDEMPOTENCY_POLL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        # Rows are written with Core statements on the engine, not through
+        # SessionLocal, so storing a response does not count as a user write.
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, str], StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[Tuple[int, str], threading.Event] = {}
+
+    def _remember(self, cache_key, stored: StoredResponse) -> None:
+        with self._lock:
+            self._entries[cache_key] = stored
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id: int, key: str) -> Optional[StoredResponse]:
+        cache_key = (user_id, key)
+        now = self._clock()
+        with self._lock:
+            stored = self._entries.get(cache_key)
+            if stored is not None:
+                if stored.expires_at > now:
+                    self._entries.move_to_end(cache_key)
+                    return stored
+                del self._entries[cache_key]
+        if self.engine is None:
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(IdempotencyRecord.request_hash, IdempotencyRecord.status_code,
+                       IdempotencyRecord.body, IdempotencyRecord.created_at)
+                .where(IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key)
+            ).first()
+        if row is None or row.status_code == PENDING:
+            return None
+        expires_at = row.created_at.timestamp() + self.ttl_seconds
+        if expires_at <= now:
+            return None
+        stored = StoredResponse(row.request_hash, row.status_code, bytes(row.body), expires_at)
+        self._remember(cache_key, stored)
+        return stored
+
+    def _where(self, user_id: int, key: str):
+        return and_(IdempotencyRecord.user_id == user_id, IdempotencyRecord.key == key)
+
+    def _claim(self, user_id: int, key: str, request_hash: str) -> bool:
+        """Insert a pending row for `key`; False if another request holds it
+        or its response is already stored."""
+        if self.engine is None:
+            return True
+        now = self._clock()
+        with self.engine.begin() as conn:
+            # an expired response, or a claim abandoned by a worker that died, is replaced
+            conn.execute(delete(IdempotencyRecord).where(self._where(user_id, key), or_(
+                IdempotencyRecord.created_at <= datetime.fromtimestamp(now - self.ttl_seconds),
+                and_(
+                    IdempotencyRecord.status_code == PENDING,
+                    IdempotencyRecord.created_at <= datetime.fromtimestamp(now - self.wait_seconds),
+                ),
+            )))
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(IdempotencyRecord).values(
+                        user_id=user_id, key=key, request_hash=request_hash,
+                        status_code=PENDING, body=b"", created_at=datetime.fromtimestamp(now),
+                    ))
+            except IntegrityError:
+                return False
+        return True
+
+    def _release(self, user_id: int, key: str) -> None:
+        if self.engine is None:
+            return
+        with self.engine.begin() as conn:
+            conn.execute(delete(IdempotencyRecord).where(self._where(user_id, key), IdempotencyRecord.status_code == PENDING))
+
+    def put(self, user_id: int, key: str, request_hash: str, status_code: int, body: bytes) -> None:
+        now = self._clock()
+        self._remember((user_id, key), StoredResponse(request_hash, status_code, body, now + self.ttl_seconds))
+        if self.engine is None:
+            return
+        values = dict(request_hash=request_hash, status_code=status_code, body=body, created_at=datetime.fromtimestamp(now))
+        with self.engine.begin() as conn:
+            # normally completes this request's claim
+            if conn.execute(update(IdempotencyRecord).where(
+                self._where(user_id, key), IdempotencyRecord.status_code == PENDING
+            ).values(**values)).rowcount:
+                return
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(IdempotencyRecord).values(user_id=user_id, key=key, **values))
+            except IntegrityError:
+                pass  # another request stored it first
+
+    def purge_expired(self) -> int:
+        """Delete expired rows; run periodically with `python -m app.idempotency purge`."""
+        if self.engine is None:
+            return 0
+        cutoff = datetime.fromtimestamp(self._clock() - self.ttl_seconds)
+        with self.engine.begin() as conn:
+            return conn.execute(delete(IdempotencyRecord).where(IdempotencyRecord.created_at <= cutoff)).rowcount
+
+    def run(self, user_id: int, key: str, request_hash: str, handler: Callable[[], Response]) -> Response:
+        """Return the stored response for `key`, or run `handler` once and store it."""
+        cache_key = (user_id, key)
+        deadline = self._clock() + self.wait_seconds
+        while True:
+            stored = self.get(user_id, key)
+            if stored is not None:
+                return _replay(stored, request_hash)
+
+            with self._lock:
+                event = self._in_flight.get(cache_key)
+                leader = event is None
+                if leader:
+                    event = self._in_flight[cache_key] = threading.Event()
+            if leader:
+                break
+            # wait for the original, then look again; if it failed we take over
+            if not event.wait(max(0.0, deadline - self._clock())):
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+        try:
+            while True:
+                # the previous leader may have finished between our lookup and now
+                stored = self.get(user_id, key)
+                if stored is not None:
+                    return _replay(stored, request_hash)
+                if self._claim(user_id, key, request_hash):
+                    break
+                # another worker is running it
+                if self._clock() >= deadline:
+                    raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+                time.sleep(self.poll_seconds)
+            try:
+                response = handler()
+            except BaseException:
+                self._release(user_id, key)
+                raise
+            if 200 <= response.status_code < 300:
+                self.put(user_id, key, request_hash, response.status_code, bytes(response.body))
+            else:
+                self._release(user_id, key)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[cache_key]
+            event.set()
+
+
+idempotency_store = IdempotencyStore(engine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Idempotency key maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("purge", help="delete stored responses older than IDEMPOTENCY_TTL_SECONDS")
+    args = parser.parse_args(argv)
+    if args.command == "purge":
+        print(f"Done. {idempotency_store.purge_expired()} expired keys deleted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# app/launcher.py
+"""Production launcher: `python -m app.launcher`.
+
+Runs the app in WEB_CONCURRENCY worker processes behind gunicorn with
+uvicorn workers. Without WEB_CONCURRENCY it starts one worker per CPU this
+container may use (from its cgroup CPU quota and affinity mask, since bcrypt
+and the calculation paths are CPU-bound), but only when the state workers
+must share lives outside the process: EVENT_BROKER_URL (live calculation
+events) and RATE_LIMIT_BACKEND_URL (rate limits) are set, and there are no
+read replicas, whose read-your-writes pins are kept per worker. Otherwise it
+logs what is missing and starts a single worker. An explicit WEB_CONCURRENCY
+is always used, with the same warning.
+
+- the app is imported once in the master (`preload_app`) before forking,
+  so imported code and startup migrations are not repeated per worker and
+  memory is shared copy-on-write;
+- each worker disposes the inherited SQLAlchemy pools right after the fork
+  (`after_fork`), so no database connection is ever shared between
+  processes; every worker opens its own;
+- workers use uvloop and httptools when installed;
+- a worker is recycled after MAX_REQUESTS requests (plus up to
+  MAX_REQUESTS_JITTER, so workers do not restart together);
+- on SIGTERM, or when recycled, a worker stops accepting connections and runs
+  the app's shutdown, which drains the batch writer and stops the
+  calculation workers, within GRACEFUL_TIMEOUT seconds.
+
+Without gunicorn installed it falls back to `uvicorn --workers`, which
+imports the app in each worker (no preloading) but otherwise behaves the same.
+"""
+import math
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from app.logger_config import logger
+
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "10000"))
+MAX_REQUESTS_JITTER = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+PRELOAD_APP = os.getenv("PRELOAD_APP", "1").lower() not in ("0", "false", "no")
+APP = "app.main:app"
+
+
+def _installed(module: str) -> bool:
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+UVICORN_LOOP = "uvloop" if _installed("uvloop") else "asyncio"
+UVICORN_HTTP = "httptools" if _installed("httptools") else "h11"
+
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """CPUs allowed by the cgroup CPU quota (v2 or v1), or None if unlimited."""
+    base = Path(root)
+    try:
+        quota, period = (base / "cpu.max").read_text().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int((base / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((base / "cpu" / "cpu.cfs_period_us").read_text())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus(root: str = "/sys/fs/cgroup") -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+# settings that move per-process state to a backend every worker shares
+SHARED_BACKEND_SETTINGS = ("EVENT_BROKER_URL", "RATE_LIMIT_BACKEND_URL")
+
+
+def unshared_state() -> List[str]:
+    """Why workers would not see each other's state; empty when they would."""
+    reasons = [f"{name} is not set" for name in SHARED_BACKEND_SETTINGS if not os.getenv(name)]
+    if os.getenv("DATABASE_REPLICA_URLS", "").strip():
+        reasons.append("DATABASE_REPLICA_URLS is set (read-your-writes pins are per worker)")
+    return reasons
+
+
+def default_workers() -> int:
+    requested = int(os.getenv("WEB_CONCURRENCY", "0"))
+    workers = requested or available_cpus()
+    reasons = unshared_state() if workers > 1 else []
+    if not reasons:
+        return workers
+    if requested:
+        logger.warning(f"Running {workers} workers although {'; '.join(reasons)}")
+        return workers
+    logger.warning(f"Running a single worker because {'; '.join(reasons)}; set WEB_CONCURRENCY to override")
+    return 1
+
+
+def after_fork() -> None:
+    """Give this process its own connection pools. The pools inherited from
+    the master are dropped without closing their connections, which still
+    belong to the master."""
+    from app.database import engine, replica_engines
+    from app.sharding import shard_router
+
+    engines = [engine, *replica_engines]
+    if shard_router is not None:
+        engines.extend(shard_router.engines.values())
+    for eng in engines:
+        eng.dispose(close=False)
+
+
+def gunicorn_options(workers: int) -> dict:
+    return {
+        "bind": f"{HOST}:{PORT}",
+        "workers": workers,
+        "worker_class": "app.launcher.UvicornWorker",
+        "preload_app": PRELOAD_APP,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "post_fork": lambda server, worker: after_fork(),
+        "accesslog": "-",
+    }
+
+
+try:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker as _UvicornWorker
+except ImportError:  # optional: falls back to uvicorn's own process manager
+    BaseApplication = None
+else:
+    class UvicornWorker(_UvicornWorker):
+        CONFIG_KWARGS = {"loop": UVICORN_LOOP, "http": UVICORN_HTTP, "lifespan": "on"}
+
+    class GunicornLauncher(BaseApplication):
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app.main import app
+
+            return app
+
+
+def main() -> None:
+    workers = default_workers()
+    logger.info(f"Starting {workers} workers (loop={UVICORN_LOOP}, http={UVICORN_HTTP})")
+    if BaseApplication is not None:
+        GunicornLauncher(gunicorn_options(workers)).run()
+        return
+
+    import uvicorn
+
+    logger.warning("gunicorn is not installed; running uvicorn workers without preloading")
+    uvicorn.run(
+        APP,
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        loop=UVICORN_LOOP,
+        http=UVICORN_HTTP,
+        lifespan="on",
+        limit_max_requests=MAX_REQUESTS or None,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
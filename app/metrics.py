@@ -0,0 +1,63 @@
+# app/metrics.py
+"""In-process metrics, exposed in Prometheus text format at GET /metrics.
+
+Counters are incremented in place; gauges are callables sampled at scrape
+time. Values are per worker process.
+"""
+import threading
+from typing import Callable, Dict, Tuple
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, tuple], float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+_help: Dict[str, str] = {}
+
+
+def _key(name: str, labels: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name: str, help_text: str) -> None:
+    _help[name] = help_text
+
+
+def inc(name: str, amount: float = 1.0, **labels) -> None:
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def counter_value(name: str, **labels) -> float:
+    return _counters.get(_key(name, labels), 0.0)
+
+
+def register_gauge(name: str, fn: Callable[[], float], help_text: str = "") -> None:
+    _gauges[name] = fn
+    if help_text:
+        describe(name, help_text)
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for name, fn in sorted(_gauges.items()):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {fn():g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,349 @@
+# app/middleware.py
+"""Pure ASGI middlewares that only touch the paths they are for.
+
+Starlette's `@app.middleware("http")` (BaseHTTPMiddleware) runs every request
+through an extra task and copies the response stream, even when the
+middleware has nothing to do for that path. The middlewares here are plain
+ASGI callables built on `PathPrefixMiddleware`: a request whose path does not
+start with one of `prefixes` is handed straight to the wrapped app, so the
+cost for unrelated routes is one `str.startswith`. Matching requests go to
+`handle`, which typically wraps `send` to adjust the response headers.
+
+- `TimingMiddleware` adds a `Server-Timing: app;dur=<ms>` header.
+- `MetricsMiddleware` counts requests by method and status and sums their
+  durations (`http_requests_total`, `http_request_duration_seconds_total`).
+- `CacheControlMiddleware` sets `Cache-Control` by path suffix, e.g.
+  `no-store` for `/static/*.html`.
+- `CompressionMiddleware` compresses text and JSON responses of at least
+  COMPRESSION_MIN_SIZE bytes with zstd, brotli or gzip, whichever the client
+  accepts first in COMPRESSION_ENCODINGS order (zstd and brotli need the
+  `zstandard` / `brotli` packages). Streamed bodies are flushed to the client
+  once COMPRESSION_FLUSH_SIZE bytes are pending or COMPRESSION_FLUSH_INTERVAL
+  seconds have passed since the last flush, rather than per chunk, which
+  would cost most of the compression on one-row-per-chunk streams. Sizes and
+  CPU time per encoding are reported at /metrics.
+"""
+import os
+import time
+import zlib
+from typing import Iterable, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: "br" is not offered without it
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional: "zstd" is not offered without it
+    zstandard = None
+
+
+class PathPrefixMiddleware:
+    def __init__(self, app, prefixes: Iterable[str] = ("/",)):
+        self.app = app
+        self.prefixes = tuple(prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefixes):
+            await self.app(scope, receive, send)
+            return
+        await self.handle(scope, receive, send)
+
+    async def handle(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+
+class TimingMiddleware(PathPrefixMiddleware):
+    async def handle(self, scope, receive, send):
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = (time.perf_counter() - start) * 1000
+                MutableHeaders(scope=message).append("Server-Timing", f"app;dur={elapsed:.2f}")
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+metrics.describe("http_requests_total", "HTTP requests by method and status")
+metrics.describe("http_request_duration_seconds_total", "Total time spent serving HTTP requests")
+
+
+class MetricsMiddleware(PathPrefixMiddleware):
+    async def handle(self, scope, receive, send):
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.inc("http_requests_total", method=scope["method"], status=str(status_code))
+            metrics.inc("http_request_duration_seconds_total", time.perf_counter() - start)
+
+
+class CacheControlMiddleware(PathPrefixMiddleware):
+    """`rules` are (path suffix, Cache-Control value) pairs; the first match wins."""
+
+    def __init__(self, app, prefixes: Iterable[str] = ("/",), rules: Sequence[Tuple[str, str]] = ()):
+        super().__init__(app, prefixes)
+        self.rules = tuple(rules)
+
+    async def handle(self, scope, receive, send):
+        path = scope["path"]
+        value = next((v for suffix, v in self.rules if path.endswith(suffix)), None)
+        if value is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cache_control(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["Cache-Control"] = value
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_control)
+
+
+def parse_accept_encoding(header: str) -> Tuple[set, set]:
+    """(allowed, refused) codings of an Accept-Encoding header; `q=0` refuses."""
+    accepted, refused = set(), set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    refused.add(coding)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted, refused
+
+
+def accepted_encodings(header: str) -> set:
+    """Codings allowed by an Accept-Encoding header (q=0 excluded)."""
+    return parse_accept_encoding(header)[0]
+
+
+class _ZlibCompressor:
+    def __init__(self, level: int):
+        # wbits 31: gzip container
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+# encoding -> (compressor class, level); levels favour speed, since API
+# responses are compressed on every request
+COMPRESSORS = {"gzip": (_ZlibCompressor, 6)}
+if brotli is not None:
+    COMPRESSORS["br"] = (_BrotliCompressor, 4)
+if zstandard is not None:
+    COMPRESSORS["zstd"] = (_ZstdCompressor, 3)
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_FLUSH_SIZE = int(os.getenv("COMPRESSION_FLUSH_SIZE", "65536"))
+COMPRESSION_FLUSH_INTERVAL = float(os.getenv("COMPRESSION_FLUSH_INTERVAL", "0.1"))
+# server preference among the codings a client accepts; unavailable ones are skipped
+COMPRESSION_ENCODINGS = tuple(
+    e.strip() for e in os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",") if e.strip() in COMPRESSORS
+)
+_COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+
+def compressible(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    if media_type == "text/event-stream":
+        # events must reach the client as they are sent
+        return False
+    return media_type.startswith("text/") or media_type.endswith("+json") or media_type in _COMPRESSIBLE_TYPES
+
+
+metrics.describe("http_compressed_responses_total", "Responses compressed, by encoding")
+metrics.describe("http_compression_input_bytes_total", "Bytes before compression, by encoding")
+metrics.describe("http_compression_output_bytes_total", "Bytes after compression, by encoding")
+metrics.describe("http_compression_cpu_seconds_total", "CPU time spent compressing, by encoding")
+metrics.register_gauge(
+    "http_compression_ratio",
+    lambda: (
+        sum(metrics.counter_value("http_compression_output_bytes_total", encoding=e) for e in COMPRESSORS)
+        / (sum(metrics.counter_value("http_compression_input_bytes_total", encoding=e) for e in COMPRESSORS) or 1)
+    ),
+    "Compressed / uncompressed size over all compressed responses",
+)
+
+
+class _CompressingSend:
+    """`send` wrapper for one response: decides at the first body message
+    whether to compress, then compresses every chunk. Streamed bodies are
+    flushed on the first chunk, then whenever `flush_size` bytes are pending
+    or `flush_interval` seconds have passed, so a slow stream still reaches
+    the client chunk by chunk while a fast one compresses as a whole."""
+
+    def __init__(self, send, encoding: str, minimum_size: int, flush_size: int, flush_interval: float):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+        self.unflushed = 0
+        self.flushed_at = float("-inf")
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu = 0.0
+
+    async def __call__(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if "content-encoding" in headers or not compressible(headers.get("content-type", "")):
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if self.passthrough or kind != "http.response.body":
+            # e.g. http.response.pathsend: the file goes out as is
+            if self.start is not None:
+                await self.send(self.start)
+                self.start = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            cls, level = COMPRESSORS[self.encoding]
+            self.compressor = cls(level)
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers and not headers["etag"].startswith("W/"):
+                # a different byte sequence than the uncompressed representation
+                headers["ETag"] = "W/" + headers["etag"]
+            body = self._compress(body, more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(start)
+        else:
+            body = self._compress(body, more_body)
+            if more_body and not body:
+                return  # still buffered in the compressor
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+        if not more_body:
+            self._record()
+
+    def _compress(self, data: bytes, more_body: bool) -> bytes:
+        started = time.thread_time()
+        out = self.compressor.compress(data)
+        if not more_body:
+            out += self.compressor.finish()
+        else:
+            self.unflushed += len(data)
+            now = time.monotonic()
+            if self.unflushed >= self.flush_size or now - self.flushed_at >= self.flush_interval:
+                out += self.compressor.flush()
+                self.unflushed = 0
+                self.flushed_at = now
+        self.cpu += time.thread_time() - started
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def _record(self):
+        metrics.inc("http_compressed_responses_total", encoding=self.encoding)
+        metrics.inc("http_compression_input_bytes_total", self.bytes_in, encoding=self.encoding)
+        metrics.inc("http_compression_output_bytes_total", self.bytes_out, encoding=self.encoding)
+        metrics.inc("http_compression_cpu_seconds_total", self.cpu, encoding=self.encoding)
+
+
+class CompressionMiddleware(PathPrefixMiddleware):
+    """Compresses text and JSON responses with the first of `encodings` the
+    client accepts. Bodies under `minimum_size` bytes are sent as they are;
+    streamed bodies are always compressed (see `_CompressingSend` for when
+    they are flushed). Responses that are already encoded (precompressed
+    static files) or are event streams are left alone."""
+
+    def __init__(
+        self,
+        app,
+        prefixes: Iterable[str] = ("/",),
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        encodings: Sequence[str] = COMPRESSION_ENCODINGS,
+        flush_size: int = COMPRESSION_FLUSH_SIZE,
+        flush_interval: float = COMPRESSION_FLUSH_INTERVAL,
+    ):
+        super().__init__(app, prefixes)
+        self.minimum_size = minimum_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.encodings = tuple(e for e in encodings if e in COMPRESSORS)
+
+    async def handle(self, scope, receive, send):
+        accepted, refused = parse_accept_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        # "*" stands for any coding not named explicitly
+        encoding = next((e for e in self.encodings if e in accepted or ("*" in accepted and e not in refused)), None)
+        if encoding is None or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size, self.flush_size, self.flush_interval))
@@ -0,0 +1,119 @@
+# app/migrations.py
+"""Small idempotent schema migrations applied at startup.
+
+`Base.metadata.create_all` only creates missing tables; these steps bring
+existing tables up to date. Every step checks the live schema first, so
+running them repeatedly is safe. Set AUTO_MIGRATE=0 to skip them at
+startup and run `python -m app.migrations` explicitly instead.
+"""
+import os
+from typing import Iterable
+
+from sqlalchemy import Integer, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable
+
+from app.calculation_factory import OPERATION_CODES
+from app.logger_config import logger
+from app.models import Calculation, User
+
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1").lower() not in ("0", "false", "no")
+
+
+def _operation_code_case() -> str:
+    """SQL CASE mapping every legacy spelling of an operation to its code."""
+    branches = []
+    for op, code in OPERATION_CODES.items():
+        spellings = ", ".join(f"'{s}'" for s in (op.value, f"OperationType.{op.name}", str(code)))
+        branches.append(f"WHEN type IN ({spellings}) THEN {code}")
+    return "CASE " + " ".join(branches) + " END"
+
+
+def migrate_operation_type_codes(engine: Engine) -> bool:
+    """Convert a string `calculations.type` column to SMALLINT registry codes.
+
+    Returns True when a migration ran.
+    """
+    insp = inspect(engine)
+    if "calculations" not in insp.get_table_names():
+        return False
+    column = next(c for c in insp.get_columns("calculations") if c["name"] == "type")
+    if isinstance(column["type"], Integer):
+        return False
+
+    case = _operation_code_case()
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE calculations ALTER COLUMN type TYPE SMALLINT USING ({case})"))
+        elif conn.dialect.name == "sqlite":
+            # SQLite cannot change a column type in place: rebuild the table.
+            ddl = str(CreateTable(Calculation.__table__).compile(conn))
+            conn.execute(text(ddl.replace("CREATE TABLE calculations ", "CREATE TABLE calculations__migrating ", 1)))
+            existing = {c["name"] for c in insp.get_columns("calculations")}
+            copied = [c for c in Calculation.__table__.columns if c.name in existing]
+            columns = ", ".join(c.name for c in copied)
+            selected = ", ".join(case if c.name == "type" else c.name for c in copied)
+            conn.execute(text(f"INSERT INTO calculations__migrating ({columns}) SELECT {selected} FROM calculations"))
+            conn.execute(text("DROP TABLE calculations"))
+            conn.execute(text("ALTER TABLE calculations__migrating RENAME TO calculations"))
+            for index in Calculation.__table__.indexes:
+                index.create(conn, checkfirst=True)
+        else:
+            logger.warning(f"No operation type migration for dialect {conn.dialect.name}")
+            return False
+    logger.info("Migrated calculations.type to SMALLINT operation codes")
+    return True
+
+
+def add_missing_columns(engine: Engine) -> list:
+    """Add nullable columns declared on the models but missing from existing
+    `users` / `calculations` tables. Returns the added `table.column` names."""
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    added = []
+    for table in (User.__table__, Calculation.__table__):
+        if table.name not in tables:
+            continue
+        existing = {c["name"] for c in insp.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in existing and c.nullable]
+        if not missing:
+            continue
+        with engine.begin() as conn:
+            for column in missing:
+                ddl_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}"))
+                added.append(f"{table.name}.{column.name}")
+    for name in added:
+        logger.info(f"Added column {name}")
+    return added
+
+
+def ensure_calculation_indexes(engine: Engine) -> None:
+    """Create indexes declared on Calculation that an existing table lacks."""
+    if "calculations" not in inspect(engine).get_table_names():
+        return
+    with engine.begin() as conn:
+        for index in Calculation.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def run_migrations(engines: Iterable[Engine]) -> None:
+    for engine in engines:
+        # first, so a table rebuilt below already has every column
+        add_missing_columns(engine)
+        migrate_operation_type_codes(engine)
+        ensure_calculation_indexes(engine)
+
+
+def main():
+    from app.database import engine
+    from app.sharding import shard_router
+
+    engines = [engine] + (list(shard_router.engines.values()) if shard_router else [])
+    run_migrations(engines)
+    print("Done. Schema is up to date.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,61 @@
 # app/models.py
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from decimal import Decimal
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, SmallInteger, Index, LargeBinary, JSON, UniqueConstraint, Numeric
 from sqlalchemy.orm import relationship
+from sqlalchemy.types import TypeDecorator
 from app.database import Base
+from app.calculation_factory import OPERATION_CODES, parse_operation
 from datetime import timedelta
 
 
+class OperationTypeCode(TypeDecorator):
+    """Stores an OperationType as its registry code in a SMALLINT column.
+
+    Results come back as OperationType members. Legacy string values (rows
+    not yet migrated by app.migrations) are still understood on read.
+    """
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return OPERATION_CODES[parse_operation(value)]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return parse_operation(value)
+        except (KeyError, ValueError):
+            return value
+
+
+class ExactDecimal(TypeDecorator):
+    """Exact decimal values: NUMERIC where the database stores it exactly,
+    text on SQLite, whose NUMERIC affinity rounds to a double."""
+
+    impl = Numeric
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(Numeric(asdecimal=True))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "sqlite":
+            return value
+        return str(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, Decimal):
+            return value
+        return Decimal(value)
+
+
 class SessionToken(Base):
     __tablename__ = "sessions"
 
@@ -17,6 +67,76 @@ class SessionToken(Base):
 
     user = relationship("User")
 
+class RevokedToken(Base):
+    """JWT ids revoked by logout; kept until the token would have expired."""
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class IdempotencyRecord(Base):
+    """Response stored for an Idempotency-Key, replayed on retries."""
+    __tablename__ = "idempotency_keys"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class UserVersion(Base):
+    """Counter bumped on every write to a user's data; see app.versions."""
+    __tablename__ = "user_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class Expression(Base):
+    """An evaluated expression with its intermediate results; see app.expressions."""
+    __tablename__ = "expressions"
+    __table_args__ = (Index("ix_expressions_user_id_id", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    expression = Column(String, nullable=False)  # normalized text
+    result = Column(Float, nullable=False)
+    # [{"op": "add", "a": 1.0, "b": 2.0, "result": 3.0}, ...] in evaluation order
+    steps = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FormulaTemplate(Base):
+    """A named expression over variables, evaluated over columns of bindings; see app.formulas."""
+    __tablename__ = "formula_templates"
+    __table_args__ = (UniqueConstraint("user_id", "name", name="uq_formula_templates_user_id_name"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(64), nullable=False)
+    expression = Column(String, nullable=False)  # normalized text
+    variables = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FormulaRun(Base):
+    """One persisted evaluation of a formula: its binding columns and results."""
+    __tablename__ = "formula_runs"
+
+    id = Column(Integer, primary_key=True)
+    formula_id = Column(Integer, ForeignKey("formula_templates.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    rows = Column(Integer, nullable=False)
+    bindings = Column(JSON, nullable=False)
+    results = Column(JSON, nullable=False)
+    errors = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -25,6 +145,9 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # default for calculations that do not name a mode (NULL means float)
+    numeric_mode = Column(String(16), nullable=True)
+    decimal_precision = Column(Integer, nullable=True)
 
     # One-to-many: User -> Calculations
     calculations = relationship("Calculation", back_populates="user")
@@ -32,16 +155,34 @@ class User(Base):
 
 class Calculation(Base):
     __tablename__ = "calculations"
+    # Indexes follow the queries app/main.py and app/stats.py run; every one
+    # of them filters on user_id first.
+    __table_args__ = (
+        # list/export (ORDER BY id), recent rows (ORDER BY id DESC), get by (id, user_id)
+        Index("ix_calculations_user_id_id", "user_id", "id"),
+        # time-range reads per user
+        Index("ix_calculations_user_id_timestamp", "user_id", "timestamp"),
+        # stats: COUNT/AVG(a)/AVG(b) and GROUP BY type answered from the index
+        # alone; the (user_id, type) prefix serves type filters as well
+        Index("ix_calculations_user_id_type_cover", "user_id", "type", "a", "b"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     # Renamed fields per instructions: a, b, type
     a = Column(Float, nullable=False)
     b = Column(Float, nullable=False)
-    type = Column(String, nullable=False)  # Add, Subtract, Multiply, Divide
+    type = Column(OperationTypeCode, nullable=False)  # registry code, see calculation_factory.OPERATION_CODES
     
     result = Column(Float, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    # Decimal-mode calculations (see app.numeric) keep the exact values here;
+    # a, b and result then hold their float approximations. NULL for floats.
+    precision = Column(SmallInteger, nullable=True)
+    a_exact = Column(ExactDecimal, nullable=True)
+    b_exact = Column(ExactDecimal, nullable=True)
+    result_exact = Column(ExactDecimal, nullable=True)
+
     # Foreign Key to User
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
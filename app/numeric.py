@@ -0,0 +1,143 @@
+# app/numeric.py
+"""Numeric modes for calculations: IEEE floats (the default) or exact decimals.
+
+A calculation request may set `mode` ("float" or "decimal") and, for
+decimal, `precision` (significant digits). Without them the user's saved
+preference applies (`numeric_mode` / `decimal_precision` on the profile),
+and without that, floats. The float path is unchanged: `numeric_context`
+returns None and callers go straight to `CalculationFactory.calculate`.
+
+In decimal mode operands are converted to `Decimal` from the text the client
+sent (send numbers as JSON strings to keep more than ~15 significant digits),
+every operation rounds to the requested precision, and the exact operands and
+result are stored next to their float approximations. The exponent range is
+limited to what a float can hold, so the float columns used for stats and
+ordering stay meaningful.
+"""
+import os
+import threading
+import time
+from decimal import (
+    Context,
+    Decimal,
+    DivisionByZero,
+    InvalidOperation,
+    Overflow,
+    ROUND_HALF_EVEN,
+)
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple
+
+from app.database import user_write_listeners
+from app.limits import CalculationError
+
+
+DECIMAL_PRECISION = int(os.getenv("DECIMAL_PRECISION", "28"))
+DECIMAL_MAX_PRECISION = int(os.getenv("DECIMAL_MAX_PRECISION", "100"))
+# largest |b| accepted by `exponent` in decimal mode
+DECIMAL_MAX_EXPONENT = int(os.getenv("DECIMAL_MAX_EXPONENT", "10000"))
+NUMERIC_MODE_CACHE_TTL_SECONDS = float(os.getenv("NUMERIC_MODE_CACHE_TTL_SECONDS", "30"))
+
+# adjusted exponents a float can represent
+DECIMAL_EMAX = 308
+DECIMAL_EMIN = -324
+
+
+@lru_cache(maxsize=None)
+def decimal_context(precision: int) -> Context:
+    return Context(
+        prec=precision,
+        rounding=ROUND_HALF_EVEN,
+        Emax=DECIMAL_EMAX,
+        Emin=DECIMAL_EMIN,
+        traps=[InvalidOperation, DivisionByZero, Overflow],
+    )
+
+
+def to_decimal(value, context: Context) -> Decimal:
+    """Operand as a Decimal. Floats go through repr(), i.e. the shortest text
+    that round-trips, so 0.1 becomes Decimal("0.1") rather than its binary
+    expansion."""
+    number = value if isinstance(value, Decimal) else Decimal(repr(float(value)))
+    if not number.is_finite():
+        raise ValueError("Operands must be finite numbers")
+    if len(number.as_tuple().digits) > context.prec:
+        raise ValueError(f"Operand has more than {context.prec} significant digits")
+    if number and not DECIMAL_EMIN <= number.adjusted() <= DECIMAL_EMAX:
+        raise ValueError("Operand is out of range")
+    return number
+
+
+_ESTIMATE_CONTEXT = Context(prec=8)
+
+
+def check_decimal_exponent(x: Decimal, y: Decimal, context: Context) -> None:
+    """Reject `x ** y` before computing it when it would overflow or when |y|
+    is large enough to make the computation expensive."""
+    if abs(y) > DECIMAL_MAX_EXPONENT:
+        raise CalculationError(
+            "too_expensive", f"Exponent must be between -{DECIMAL_MAX_EXPONENT} and {DECIMAL_MAX_EXPONENT} in decimal mode"
+        )
+    if not x or x.copy_abs() == 1:
+        return
+    # log10 |x ** y| = y * log10 |x|; a few digits are enough for the estimate
+    magnitude = float(y) * float(x.copy_abs().log10(_ESTIMATE_CONTEXT))
+    if magnitude > DECIMAL_EMAX + 1:
+        raise CalculationError("overflow", f"exponent of {x} and {y} overflows", operation="exponent")
+
+
+def resolve_precision(precision: Optional[int]) -> int:
+    precision = precision or DECIMAL_PRECISION
+    if not 1 <= precision <= DECIMAL_MAX_PRECISION:
+        raise ValueError(f"precision must be between 1 and {DECIMAL_MAX_PRECISION}")
+    return precision
+
+
+class UserNumericModes:
+    """Short-TTL cache of users' saved (mode, precision), so requests that do
+    not name a mode do not query the users table every time. A user's own
+    profile update invalidates their entry immediately."""
+
+    def __init__(self, ttl: float = NUMERIC_MODE_CACHE_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, Optional[str], Optional[int]]] = {}
+
+    def get(self, user_id: int, load: Callable[[], Tuple[Optional[str], Optional[int]]]) -> Tuple[Optional[str], Optional[int]]:
+        now = self._clock()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1], entry[2]
+        mode, precision = load()
+        with self._lock:
+            if len(self._entries) > 100_000:
+                self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, mode, precision)
+        return mode, precision
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_numeric_modes = UserNumericModes()
+user_write_listeners.append(user_numeric_modes.invalidate)
+
+
+def numeric_context(
+    mode: Optional[str],
+    precision: Optional[int],
+    user_mode: Callable[[], Tuple[Optional[str], Optional[int]]],
+) -> Optional[Context]:
+    """Decimal context for a calculation, or None for the float path.
+
+    `mode`/`precision` come from the request; `user_mode` loads the user's
+    saved preference and is only called when the request names no mode.
+    """
+    if mode is None:
+        mode, saved_precision = user_mode()
+        precision = precision or saved_precision
+    if mode != "decimal":
+        return None
+    return decimal_context(resolve_precision(precision))
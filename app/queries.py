@@ -0,0 +1,69 @@
+# app/queries.py
+"""Column-projected read queries for calculations.
+
+Read endpoints only serialize a handful of columns, so these helpers select
+exactly those columns. The results are lightweight `Row` tuples (attribute
+access by column name) instead of full ORM entities, which skips identity-map
+bookkeeping, attribute instrumentation and unit-of-work tracking.
+"""
+from typing import Iterator, List, Optional
+
+from sqlalchemy import Row, select
+from sqlalchemy.orm import Session
+
+from app.models import Calculation
+
+
+CALCULATION_COLUMNS = (
+    Calculation.id,
+    Calculation.a,
+    Calculation.b,
+    Calculation.type,
+    Calculation.result,
+    Calculation.timestamp,
+    Calculation.user_id,
+    Calculation.precision,
+    Calculation.a_exact,
+    Calculation.b_exact,
+    Calculation.result_exact,
+)
+
+
+def fetch_calculation_rows(db: Session, user_id: int) -> List[Row]:
+    """All calculations owned by `user_id`, oldest first."""
+    stmt = (
+        select(*CALCULATION_COLUMNS)
+        .where(Calculation.user_id == user_id)
+        .order_by(Calculation.id.asc())
+    )
+    return db.execute(stmt).all()
+
+
+def fetch_calculation_row(db: Session, user_id: int, calculation_id: int) -> Optional[Row]:
+    """A single calculation owned by `user_id`, or None."""
+    stmt = select(*CALCULATION_COLUMNS).where(
+        Calculation.id == calculation_id, Calculation.user_id == user_id
+    )
+    return db.execute(stmt).first()
+
+
+def fetch_recent_rows(db: Session, user_id: int, limit: int) -> List[Row]:
+    """The `limit` most recent calculations owned by `user_id`, newest first."""
+    stmt = (
+        select(*CALCULATION_COLUMNS)
+        .where(Calculation.user_id == user_id)
+        .order_by(Calculation.id.desc())
+        .limit(limit)
+    )
+    return db.execute(stmt).all()
+
+
+def iter_calculation_rows(db: Session, user_id: int, batch_size: int = 1000) -> Iterator[Row]:
+    """Stream all calculations owned by `user_id`, oldest first, `batch_size` rows at a time."""
+    stmt = (
+        select(*CALCULATION_COLUMNS)
+        .where(Calculation.user_id == user_id)
+        .order_by(Calculation.id.asc())
+        .execution_options(yield_per=batch_size)
+    )
+    yield from db.execute(stmt)
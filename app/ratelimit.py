@@ -0,0 +1,315 @@
+# app/ratelimit.py
+"""Token-bucket rate limiting and per-user concurrency caps.
+
+`RateLimitMiddleware` is a pure ASGI middleware. Every HTTP request takes a
+token from its client IP's bucket and, when it carries a valid bearer token,
+from its user's bucket. Requests that match a route rule also take a token
+from that route's bucket, keyed by user (or IP when anonymous), which is how
+`/users/login` is kept away from brute forcing. Tokens are taken from all of
+a request's buckets at once or from none, so rejected requests cost nothing. Authenticated users may have
+at most MAX_CONCURRENT_PER_USER requests in flight. A rejected request gets
+`429 Too Many Requests` with a `Retry-After` header and is counted in the
+`rate_limit_rejected_total` metric.
+
+Limits are written `<requests>/<seconds>`: "10/60" allows a burst of 10 and
+refills at 10 per minute. Bucket state lives in a backend: the in-memory one
+is per process; set RATE_LIMIT_BACKEND_URL=redis://... to share limits
+between workers (requires the `redis` package).
+"""
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from app import metrics
+from app.logger_config import logger
+from app.security import decode_access_token
+
+
+@dataclass(frozen=True)
+class Rate:
+    capacity: int
+    per_second: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Rate":
+        count, _, seconds = value.strip().partition("/")
+        capacity, period = int(count), float(seconds or 1)
+        if capacity <= 0 or period <= 0:
+            raise ValueError(f"Rate limit must be a positive <requests>/<seconds>, got {value!r}")
+        return cls(capacity, capacity / period)
+
+
+def parse_route_rates(value: str) -> List[Tuple[str, str, Rate]]:
+    """Parse "POST /users/login=10/60,POST /calculate=60/60".
+
+    A path ending in `*` matches any path with that prefix.
+    """
+    rules = []
+    for entry in (e.strip() for e in value.split(",")):
+        if not entry:
+            continue
+        route, _, rate = entry.rpartition("=")
+        method, _, path = route.strip().partition(" ")
+        rules.append((method.upper(), path.strip(), Rate.parse(rate)))
+    return rules
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no")
+RATE_LIMIT_BACKEND_URL = os.getenv("RATE_LIMIT_BACKEND_URL", "")
+RATE_LIMIT_PER_IP = os.getenv("RATE_LIMIT_PER_IP", "600/60")
+RATE_LIMIT_PER_USER = os.getenv("RATE_LIMIT_PER_USER", "300/60")
+RATE_LIMIT_ROUTES = os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "POST /users/login=10/60,POST /users/register=10/60,POST /calculate=120/60",
+)
+MAX_CONCURRENT_PER_USER = int(os.getenv("MAX_CONCURRENT_PER_USER", "8"))
+# long-lived streams would hold a concurrency slot for as long as they are open
+CONCURRENCY_EXEMPT_PATHS = {"/calculations/stream"}
+
+
+class InMemoryBackend:
+    """Per-process bucket and concurrency state."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, max_keys: int = 100_000):
+        self._clock = clock
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> (tokens, updated_at, full_at)
+        self._buckets: Dict[str, tuple] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    async def take(self, key: str, rate: Rate) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+        return (await self.take_all([(key, rate)]))[0]
+
+    async def take_all(self, buckets: List[Tuple[str, Rate]]) -> Tuple[float, int]:
+        """Take one token from every bucket, but only if each has one.
+
+        Returns (0, -1) if allowed, else the seconds until every bucket has a
+        token and the index of the bucket that is furthest from having one.
+        """
+        now = self._clock()
+        with self._lock:
+            levels = []
+            wait, index = 0.0, -1
+            for i, (key, rate) in enumerate(buckets):
+                tokens, updated_at, _ = self._buckets.get(key, (rate.capacity, now, now))
+                tokens = min(rate.capacity, tokens + (now - updated_at) * rate.per_second)
+                levels.append(tokens)
+                if tokens < 1 and (1 - tokens) / rate.per_second > wait:
+                    wait, index = (1 - tokens) / rate.per_second, i
+            for (key, rate), tokens in zip(buckets, levels):
+                if index < 0:
+                    tokens -= 1
+                self._buckets[key] = (tokens, now, now + (rate.capacity - tokens) / rate.per_second)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait, index
+
+    def _prune(self, now: float) -> None:
+        # a bucket that has refilled completely is the same as no bucket
+        for key in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+            del self._buckets[key]
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        with self._lock:
+            current = self._in_flight.get(key, 0)
+            if current >= limit:
+                return False
+            self._in_flight[key] = current + 1
+            return True
+
+    async def release(self, key: str) -> None:
+        with self._lock:
+            current = self._in_flight.get(key, 0) - 1
+            if current > 0:
+                self._in_flight[key] = current
+            else:
+                self._in_flight.pop(key, None)
+
+
+# KEYS are the buckets, ARGV their capacity and rate in pairs; tokens are
+# only taken when every bucket has one
+_TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local levels = {}
+local wait, index = 0, 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or capacity
+  local ts = tonumber(state[2]) or now
+  tokens = math.min(capacity, tokens + (now - ts) * rate)
+  levels[i] = tokens
+  if tokens < 1 and (1 - tokens) / rate > wait then
+    wait = (1 - tokens) / rate
+    index = i
+  end
+end
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[2 * i - 1])
+  local rate = tonumber(ARGV[2 * i])
+  local tokens = levels[i]
+  if index == 0 then tokens = tokens - 1 end
+  redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return {tostring(wait), index}
+"""
+
+
+class RedisBackend:
+    """Bucket and concurrency state shared by every worker through Redis."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:", in_flight_ttl: int = 300):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._take = self._redis.register_script(_TOKEN_BUCKET_LUA)
+        self.prefix = prefix
+        # in-flight counters expire so a crashed worker cannot hold slots forever
+        self.in_flight_ttl = in_flight_ttl
+
+    async def take(self, key: str, rate: Rate) -> float:
+        return (await self.take_all([(key, rate)]))[0]
+
+    async def take_all(self, buckets: List[Tuple[str, Rate]]) -> Tuple[float, int]:
+        args = [value for _, rate in buckets for value in (rate.capacity, rate.per_second)]
+        wait, index = await self._take(keys=[self.prefix + key for key, _ in buckets], args=args)
+        return float(wait), int(index) - 1
+
+    async def acquire(self, key: str, limit: int) -> bool:
+        key = f"{self.prefix}inflight:{key}"
+        current = await self._redis.incr(key)
+        await self._redis.expire(key, self.in_flight_ttl)
+        if current > limit:
+            await self._redis.decr(key)
+            return False
+        return True
+
+    async def release(self, key: str) -> None:
+        await self._redis.decr(f"{self.prefix}inflight:{key}")
+
+
+def create_backend(url: str = RATE_LIMIT_BACKEND_URL):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    return InMemoryBackend()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        backend,
+        per_ip: Optional[Rate] = None,
+        per_user: Optional[Rate] = None,
+        routes: Optional[List[Tuple[str, str, Rate]]] = None,
+        max_concurrent_per_user: int = 0,
+    ):
+        self.backend = backend
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self.routes = routes or []
+        self.max_concurrent_per_user = max_concurrent_per_user
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        return cls(
+            create_backend(),
+            per_ip=Rate.parse(RATE_LIMIT_PER_IP) if RATE_LIMIT_PER_IP else None,
+            per_user=Rate.parse(RATE_LIMIT_PER_USER) if RATE_LIMIT_PER_USER else None,
+            routes=parse_route_rates(RATE_LIMIT_ROUTES),
+            max_concurrent_per_user=MAX_CONCURRENT_PER_USER,
+        )
+
+    def route_rate(self, method: str, path: str) -> Optional[Tuple[str, Rate]]:
+        for rule_method, rule_path, rate in self.routes:
+            if rule_method != method:
+                continue
+            if path == rule_path or (rule_path.endswith("*") and path.startswith(rule_path[:-1])):
+                return f"{rule_method} {rule_path}", rate
+        return None
+
+    async def check(self, method: str, path: str, ip: str, user_id: Optional[int]) -> Tuple[float, str]:
+        """Return (retry_after, limit name); retry_after is 0 when allowed."""
+        identity = f"user:{user_id}" if user_id is not None else f"ip:{ip}"
+        route = self.route_rate(method, path)
+        checks = []
+        if route is not None:
+            checks.append(("route", f"route:{route[0]}:{identity}", route[1]))
+        if self.per_ip is not None:
+            checks.append(("ip", f"ip:{ip}", self.per_ip))
+        if user_id is not None and self.per_user is not None:
+            checks.append(("user", f"user:{user_id}", self.per_user))
+        if not checks:
+            return 0.0, ""
+        # a request rejected by one bucket must not drain the others
+        wait, index = await self.backend.take_all([(key, rate) for _, key, rate in checks])
+        if index < 0:
+            return 0.0, ""
+        return wait, checks[index][0]
+
+
+def _user_id_from_scope(scope) -> Optional[int]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            auth = value.decode("latin-1")
+            if not auth.startswith("Bearer "):
+                return None
+            try:
+                return decode_access_token(auth.split(" ", 1)[1]).get("user_id")
+            except Exception:
+                return None
+    return None
+
+
+def _too_many_requests(retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+metrics.describe("rate_limit_rejected_total", "Requests rejected with 429, by limit")
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+        user_id = _user_id_from_scope(scope)
+        retry_after, limit = await self.limiter.check(scope["method"], scope["path"], ip, user_id)
+        if retry_after > 0:
+            metrics.inc("rate_limit_rejected_total", limit=limit)
+            logger.warning(f"Rate limited {scope['method']} {scope['path']} ({limit}) ip={ip} user={user_id}")
+            await _too_many_requests(retry_after, "Too many requests")(scope, receive, send)
+            return
+
+        if user_id is None or self.limiter.max_concurrent_per_user <= 0 or scope["path"] in CONCURRENCY_EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        key = f"user:{user_id}"
+        if not await self.limiter.backend.acquire(key, self.limiter.max_concurrent_per_user):
+            metrics.inc("rate_limit_rejected_total", limit="concurrency")
+            await _too_many_requests(1, "Too many concurrent requests")(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await self.limiter.backend.release(key)
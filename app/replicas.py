@@ -0,0 +1,89 @@
+# app/replicas.py
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.logger_config import logger
+
+
+class ReplicaRouter:
+    """Pick an engine for read-only work.
+
+    Reads go to the replicas round-robin, skipping any replica whose last
+    health check failed. Writes always use the primary. After a user's data is
+    written, that user's reads are pinned to the primary for `sticky_seconds`
+    so they observe their own writes despite replication lag.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: List[Engine],
+        health_check_interval: float = 5.0,
+        sticky_seconds: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.health_check_interval = health_check_interval
+        self.sticky_seconds = sticky_seconds
+        self._clock = clock
+        self._cycle = itertools.cycle(range(len(self.replicas))) if self.replicas else None
+        self._lock = threading.Lock()
+        # replica index -> (healthy, checked_at)
+        self._health: Dict[int, tuple] = {}
+        # user_id -> pinned-until timestamp
+        self._pinned: Dict[int, float] = {}
+
+    def mark_written(self, user_id: int) -> None:
+        """Pin `user_id`'s reads to the primary for the sticky window."""
+        if not self.replicas or user_id is None:
+            return
+        with self._lock:
+            self._pinned[user_id] = self._clock() + self.sticky_seconds
+
+    def is_pinned(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            until = self._pinned.get(user_id)
+            if until is None:
+                return False
+            if until <= self._clock():
+                del self._pinned[user_id]
+                return False
+            return True
+
+    def engine_for_read(self, user_id: Optional[int] = None) -> Engine:
+        if not self.replicas or self.is_pinned(user_id):
+            return self.primary
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                index = next(self._cycle)
+            if self._is_healthy(index):
+                return self.replicas[index]
+        logger.warning("No healthy read replica available, reading from primary")
+        return self.primary
+
+    def _is_healthy(self, index: int) -> bool:
+        now = self._clock()
+        healthy, checked_at = self._health.get(index, (True, None))
+        if checked_at is not None and now - checked_at < self.health_check_interval:
+            return healthy
+        healthy = self._ping(self.replicas[index])
+        self._health[index] = (healthy, now)
+        return healthy
+
+    @staticmethod
+    def _ping(engine: Engine) -> bool:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return True
+        except Exception as exc:
+            logger.error(f"Read replica health check failed: {exc}")
+            return False
@@ -0,0 +1,181 @@
+# app/revocation.py
+"""Token revocation for stateless authentication.
+
+With AUTH_MODE=stateless, an access token's signature and expiry are trusted
+and the only per-request revocation check is an in-memory bloom filter of
+revoked JWT ids (`jti`). A negative answer is definitive, so the common case
+needs no database round trip. A positive answer may be a false positive
+(bounded by REVOCATION_FALSE_POSITIVE_RATE) and is confirmed against the
+`revoked_tokens` table.
+
+Each process rebuilds its filter from `revoked_tokens` every
+REVOCATION_REFRESH_SECONDS, and logout adds to the local filter immediately,
+so a logout handled by another worker takes effect here within one refresh
+interval. A revocation is only needed until the token expires; delete the
+rows past that with `python -m app.revocation purge`.
+"""
+import argparse
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.models import RevokedToken
+
+
+AUTH_MODE = os.getenv("AUTH_MODE", "session")
+STATELESS_AUTH = AUTH_MODE == "stateless"
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+REVOCATION_CAPACITY = int(os.getenv("REVOCATION_CAPACITY", "100000"))
+REVOCATION_FALSE_POSITIVE_RATE = float(os.getenv("REVOCATION_FALSE_POSITIVE_RATE", "0.001"))
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationFilter:
+    """Bloom filter of revoked jtis, periodically rebuilt from the database."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        refresh_seconds: float = REVOCATION_REFRESH_SECONDS,
+        capacity: int = REVOCATION_CAPACITY,
+        false_positive_rate: float = REVOCATION_FALSE_POSITIVE_RATE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._session_factory = session_factory
+        self.refresh_seconds = refresh_seconds
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self._clock = clock
+        self._lock = threading.Lock()
+        # one rebuild at a time; other requests keep using the current filter
+        self._rebuild_lock = threading.Lock()
+        self._filter = BloomFilter(capacity, false_positive_rate)
+        self._built_at = None
+        # jtis added locally while a rebuild runs, merged into its result
+        self._added_during_rebuild = None
+
+    def rebuild(self) -> None:
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        with self._lock:
+            self._added_during_rebuild = set()
+        try:
+            db = self._session_factory()
+            try:
+                jtis = db.execute(
+                    select(RevokedToken.jti).where(RevokedToken.expires_at > datetime.utcnow())
+                ).scalars().all()
+            finally:
+                db.close()
+        except BaseException:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        self._replace(jtis)
+
+    def _replace(self, jtis: Iterable[str]) -> None:
+        jtis = list(jtis)
+        fresh = BloomFilter(max(self.capacity, 2 * len(jtis)), self.false_positive_rate)
+        for jti in jtis:
+            fresh.add(jti)
+        with self._lock:
+            for jti in self._added_during_rebuild or ():
+                fresh.add(jti)
+            self._added_during_rebuild = None
+            self._filter = fresh
+            self._built_at = self._clock()
+
+    def _refresh_if_stale(self) -> None:
+        built_at = self._built_at
+        if built_at is not None and self._clock() - built_at < self.refresh_seconds:
+            return
+        # until the first build completes every caller waits for it; after
+        # that a stale filter is still valid for local adds, so callers that
+        # find a rebuild in progress do not wait
+        if not self._rebuild_lock.acquire(blocking=built_at is None):
+            return
+        try:
+            built_at = self._built_at
+            if built_at is None or self._clock() - built_at >= self.refresh_seconds:
+                self._rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def add(self, jti: str) -> None:
+        with self._lock:
+            self._filter.add(jti)
+            if self._added_during_rebuild is not None:
+                self._added_during_rebuild.add(jti)
+
+    def might_be_revoked(self, jti: str) -> bool:
+        self._refresh_if_stale()
+        return jti in self._filter
+
+
+def _default_session_factory() -> Session:
+    from app.database import open_read_session
+
+    return open_read_session()
+
+
+revocation_filter = RevocationFilter(_default_session_factory)
+
+
+def is_revoked(db: Session, jti: str) -> bool:
+    """Authoritative check, used to confirm a bloom filter hit."""
+    return db.get(RevokedToken, jti) is not None
+
+
+def purge_expired(db: Session) -> int:
+    """Delete revocations of tokens that have expired anyway."""
+    deleted = db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= datetime.utcnow())).rowcount
+    db.commit()
+    return deleted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Token revocation maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("purge", help="delete revocations of expired tokens")
+    args = parser.parse_args(argv)
+    if args.command == "purge":
+        from app.database import SessionLocal
+
+        with SessionLocal() as db:
+            print(f"Done. {purge_expired(db)} expired revocations deleted.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 # app/schemas.py
 from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
 from enum import Enum
-from pydantic import BaseModel, EmailStr, constr, ConfigDict, field_validator, Field, model_validator
+from pydantic import BaseModel, EmailStr, constr, ConfigDict, field_validator, Field, model_validator, PrivateAttr
 
 # --- Enums for strict typing ---
 class OperationType(str, Enum):
@@ -12,6 +14,11 @@ class OperationType(str, Enum):
     MODULUS = "modulus"
     EXPONENT = "exponent"
 
+
+class NumericMode(str, Enum):
+    FLOAT = "float"
+    DECIMAL = "decimal"
+
 # --- User Schemas ---
 class UserCreate(BaseModel):
     username: constr(min_length=3, max_length=50)
@@ -22,6 +29,9 @@ class UserCreate(BaseModel):
 class UserUpdate(BaseModel):
     username: constr(min_length=3, max_length=50) | None = None
     email: EmailStr | None = None
+    # default numeric mode for calculations that do not name one; see app.numeric
+    numeric_mode: NumericMode | None = None
+    decimal_precision: int | None = Field(None, ge=1)
 
 
 class PasswordChange(BaseModel):
@@ -33,15 +43,23 @@ class UserRead(BaseModel):
     username: str
     email: EmailStr
     created_at: datetime
+    numeric_mode: NumericMode | None = None
+    decimal_precision: int | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
 
 # --- Calculation Schemas ---
 class CalculationCreate(BaseModel):
-    a: float
-    b: float
+    # JSON strings parse as Decimal so decimal mode keeps every digit; the
+    # fields themselves are always floats after validation
+    a: Decimal | float
+    b: Decimal | float
     type: OperationType
+    mode: NumericMode | None = None
+    precision: int | None = Field(None, ge=1)
+
+    _decimal_operands: Tuple[Decimal | float, Decimal | float] | None = PrivateAttr(None)
 
     @field_validator('type')
     @classmethod
@@ -53,10 +71,17 @@ class CalculationCreate(BaseModel):
         """Instance-level validator run after model creation to perform
         cross-field checks (e.g., division by zero).
         """
+        if isinstance(self.a, Decimal) or isinstance(self.b, Decimal):
+            self._decimal_operands = (self.a, self.b)
+            self.a, self.b = float(self.a), float(self.b)
         if self.type == OperationType.DIVIDE and self.b == 0:
             raise ValueError("Cannot divide by zero")
         return self
 
+    def decimal_operands(self) -> Tuple[Decimal | float, Decimal | float]:
+        """Operands for decimal mode: the exact text when sent as strings."""
+        return self._decimal_operands or (self.a, self.b)
+
 class CalculationRead(BaseModel):
     id: int
     a: float
@@ -65,5 +90,84 @@ class CalculationRead(BaseModel):
     result: float
     timestamp: datetime
     user_id: int | None = None
+    # decimal-mode calculations only; omitted from JSON for float ones
+    precision: int | None = None
+    a_exact: Decimal | None = None
+    b_exact: Decimal | None = None
+    result_exact: Decimal | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class CalculationFilter(BaseModel):
+    """Selects a user's calculations for bulk operations.
+
+    Filters combine with AND; `all=True` is required to match everything.
+    """
+    ids: List[int] | None = None
+    type: OperationType | None = None
+    before: datetime | None = None
+    all: bool = False
+
+    @model_validator(mode="after")
+    def require_filter(self):
+        if not self.all and self.ids is None and self.type is None and self.before is None:
+            raise ValueError("Give ids, type or before, or set all=true")
+        return self
+
+
+class CalculationBulkUpdate(CalculationFilter):
+    """Recompute matching calculations, optionally switching their operation."""
+    new_type: OperationType | None = None
+
+
+# --- Expression Schemas ---
+class ExpressionCreate(BaseModel):
+    """Either infix text, e.g. "(2 + 3) * 4", or a JSON AST; see app.expressions."""
+    expression: str | None = None
+    ast: Any = None
+
+    @model_validator(mode="after")
+    def require_one_form(self):
+        if (self.expression is None) == (self.ast is None):
+            raise ValueError("Give exactly one of expression or ast")
+        return self
+
+
+class ExpressionStep(BaseModel):
+    op: OperationType
+    a: float
+    b: float
+    result: float
+
+
+class ExpressionRead(BaseModel):
+    id: int
+    expression: str
+    result: float
+    steps: List[ExpressionStep]
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+# --- Formula Template Schemas ---
+class FormulaCreate(BaseModel):
+    name: constr(pattern=r"^[A-Za-z0-9_.-]+$", min_length=1, max_length=64)
+    expression: str
+
+
+class FormulaRead(BaseModel):
+    id: int
+    name: str
+    expression: str
+    variables: List[str]
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+class FormulaEvaluate(BaseModel):
+    """Columnar bindings: `{"x": [1, 2], "y": [3, 4]}` evaluates two rows."""
+    bindings: Dict[str, List[float]]
+    persist: bool = False
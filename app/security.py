@@ -1,13 +1,21 @@
 # app/security.py
 import bcrypt
+import hashlib
 import os
+import threading
+import time
+import uuid
 import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
+from app import metrics
+
 # JWT settings
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 MAX_BCRYPT_BYTES = 72
 
@@ -44,15 +52,83 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
+    # unique token id, used for revocation in stateless auth mode
+    to_encode.setdefault("jti", uuid.uuid4().hex)
     token = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return token
 
 
+class TokenCache:
+    """
+    Bounded LRU of verified token claims, keyed by the token's SHA-256 digest.
+    An entry lives until the token's `exp`; expired entries are dropped when
+    they are next looked up, or pushed out by newer tokens.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, clock=time.time):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> dict | None:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.inc("token_cache_requests_total", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.inc("token_cache_requests_total", result="hit")
+        return dict(entry[1])
+
+    def put(self, token: str, payload: dict) -> None:
+        exp = payload.get("exp")
+        if self.maxsize <= 0 or not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            self._entries[self._key(token)] = (exp, dict(payload))
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+metrics.describe("token_cache_requests_total", "Decoded-token cache lookups by result")
+metrics.register_gauge("token_cache_size", lambda: len(token_cache), "Entries in the decoded-token cache")
+metrics.register_gauge("token_cache_hit_ratio", token_cache.hit_ratio, "Decoded-token cache hit ratio")
+
+
 def decode_access_token(token: str) -> dict:
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    """
+    Verify and decode a token, reusing the claims of a token seen before.
+    """
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
-    except jwt.ExpiredSignatureError:
-        raise
-    except Exception:
-        raise
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    token_cache.put(token, payload)
+    return payload
@@ -0,0 +1,64 @@
+# app/serialization.py
+from functools import lru_cache
+from typing import Any, List
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from app.schemas import CalculationRead
+
+
+@lru_cache(maxsize=None)
+def get_adapter(tp: Any) -> TypeAdapter:
+    """Return a cached TypeAdapter for `tp`.
+
+    Building a TypeAdapter compiles a pydantic-core validator and serializer,
+    so it should happen once per type rather than once per request.
+    """
+    return TypeAdapter(tp)
+
+
+calculation_adapter = get_adapter(CalculationRead)
+calculation_list_adapter = get_adapter(List[CalculationRead])
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by pydantic-core instead of the stdlib `json` module.
+
+    Accepts either plain Python content (dicts, lists, datetimes, enums) or
+    bytes that were already serialized, e.g. by `TypeAdapter.dump_json`.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return pydantic_core.to_json(content)
+
+
+def dump_calculation(row: Any) -> bytes:
+    """Validate a single ORM row and serialize it straight to JSON bytes.
+
+    Unset optional fields (the decimal-mode ones, for float calculations) are
+    left out rather than written as null.
+    """
+    model = calculation_adapter.validate_python(row, from_attributes=True)
+    return calculation_adapter.dump_json(model, exclude_none=True)
+
+
+def dump_calculations(rows: List[Any]) -> bytes:
+    """Validate a list of ORM rows and serialize them straight to JSON bytes.
+
+    Unlike FastAPI's `response_model` path this never materializes the
+    intermediate list of JSON-compatible dicts nor runs `json.dumps` over it.
+    """
+    models = calculation_list_adapter.validate_python(rows, from_attributes=True)
+    return calculation_list_adapter.dump_json(models, exclude_none=True)
+
+
+def calculation_response(row: Any, status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(dump_calculation(row), status_code=status_code)
+
+
+def calculations_response(rows: List[Any], status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(dump_calculations(rows), status_code=status_code)
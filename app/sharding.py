@@ -0,0 +1,244 @@
+# app/sharding.py
+"""Optional horizontal sharding of the `calculations` table by user_id.
+
+Configure with `DATABASE_SHARD_URLS`, a comma-separated list of `name=url`
+entries (a bare `url` gets the name `shard<index>`). Shard names, not list
+positions, are placed on the hash ring, so adding a shard only moves the
+users that land on the new shard's arc. Users and sessions stay on the
+primary database; only calculations live on the shards.
+
+Rebalance after changing the shard list with:
+
+    python -m app.sharding rebalance [--dry-run]
+"""
+import argparse
+import bisect
+import hashlib
+import os
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, delete, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database import ReadSessionLocal, SessionLocal, _read_only, notify_user_write
+from app.logger_config import logger
+from app.models import Calculation
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with `vnodes` virtual points per node."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str) -> None:
+        for i in range(self.vnodes):
+            point = _hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def node_for(self, key) -> str:
+        if not self._points:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(str(key))) % len(self._points)
+        return self._owners[index]
+
+
+def _shard_table_metadata() -> MetaData:
+    """A copy of the calculations table (with its indexes) minus the foreign
+    key to `users`, which lives on the primary database."""
+    source = Calculation.__table__
+    metadata = MetaData()
+    table = Table(
+        source.name,
+        metadata,
+        *[Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in source.columns],
+    )
+    for index in source.indexes:
+        Index(index.name, *[table.c[c.name] for c in index.columns], unique=index.unique, **index.dialect_kwargs)
+    return metadata
+
+
+def parse_shard_urls(value: str) -> Dict[str, str]:
+    shards = {}
+    for index, entry in enumerate(u.strip() for u in value.split(",")):
+        if not entry:
+            continue
+        name, sep, url = entry.partition("=")
+        if not sep or "://" in name:
+            name, url = f"shard{index}", entry
+        shards[name.strip()] = url.strip()
+    return shards
+
+
+def _insert_returning_ids(conn, rows: List[dict]) -> List[int]:
+    stmt = insert(Calculation).returning(Calculation.id, sort_by_parameter_order=True)
+    return conn.execute(stmt, rows).scalars().all()
+
+
+def _set_ids(rows: List[dict], ids: List[int]) -> None:
+    # only once committed, so a row with an `id` is known to be stored
+    for row, calc_id in zip(rows, ids):
+        row["id"] = calc_id
+
+
+class ShardRouter:
+    def __init__(self, shards: Dict[str, Engine], vnodes: int = 64):
+        if not shards:
+            raise ValueError("ShardRouter needs at least one shard")
+        self.engines = dict(shards)
+        self.ring = HashRing(self.engines, vnodes=vnodes)
+        self.metadata = _shard_table_metadata()
+
+    @classmethod
+    def from_urls(cls, urls: Dict[str, str], vnodes: int = 64) -> "ShardRouter":
+        engines = {
+            name: create_engine(url, connect_args={"check_same_thread": False} if url.startswith("sqlite") else {})
+            for name, url in urls.items()
+        }
+        return cls(engines, vnodes=vnodes)
+
+    def create_tables(self) -> None:
+        for engine in self.engines.values():
+            self.metadata.create_all(bind=engine)
+
+    def shard_for_user(self, user_id: int) -> str:
+        return self.ring.node_for(user_id)
+
+    def engine_for_user(self, user_id: int) -> Engine:
+        return self.engines[self.shard_for_user(user_id)]
+
+    def session_for_user(self, user_id: int) -> Session:
+        # Created from SessionLocal so the user-write listeners fire on commit.
+        return SessionLocal(bind=self.engine_for_user(user_id))
+
+    def read_session_for_user(self, user_id: int) -> Session:
+        return ReadSessionLocal(bind=_read_only(self.engine_for_user(user_id)))
+
+    def bulk_insert(self, rows: List[dict]) -> int:
+        """Insert calculation rows (dicts with a `user_id`), one transaction per
+        shard, and set each row's `id`."""
+        by_shard: Dict[str, List[dict]] = {}
+        for row in rows:
+            by_shard.setdefault(self.shard_for_user(row["user_id"]), []).append(row)
+        for name, shard_rows in by_shard.items():
+            with self.engines[name].begin() as conn:
+                ids = _insert_returning_ids(conn, shard_rows)
+            _set_ids(shard_rows, ids)
+        return len(rows)
+
+    def rebalance(self, dry_run: bool = False) -> Dict[str, int]:
+        """Move every user's calculations to the shard the ring assigns them to.
+
+        Rows get new primary keys on the target shard; ids are only unique
+        within a shard.
+        """
+        moved: Dict[str, int] = {}
+        columns = [c for c in Calculation.__table__.columns if c.name != "id"]
+        for source_name, source in self.engines.items():
+            with source.connect() as conn:
+                user_ids = conn.execute(select(Calculation.user_id).distinct()).scalars().all()
+            for user_id in user_ids:
+                if user_id is None:
+                    continue
+                target_name = self.shard_for_user(user_id)
+                if target_name == source_name:
+                    continue
+                with source.begin() as src:
+                    rows = [
+                        dict(r._mapping)
+                        for r in src.execute(select(*columns).where(Calculation.user_id == user_id))
+                    ]
+                    if not dry_run and rows:
+                        with self.engines[target_name].begin() as dst:
+                            dst.execute(insert(Calculation), rows)
+                        src.execute(delete(Calculation).where(Calculation.user_id == user_id))
+                key = f"{source_name}->{target_name}"
+                moved[key] = moved.get(key, 0) + len(rows)
+                logger.info(f"Rebalance user {user_id}: {len(rows)} rows {key}{' (dry run)' if dry_run else ''}")
+        return moved
+
+
+DATABASE_SHARD_URLS = parse_shard_urls(os.getenv("DATABASE_SHARD_URLS", ""))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+shard_router: Optional[ShardRouter] = None
+if DATABASE_SHARD_URLS:
+    shard_router = ShardRouter.from_urls(DATABASE_SHARD_URLS, vnodes=SHARD_VNODES)
+    shard_router.create_tables()
+
+
+@contextmanager
+def calculation_session(db: Session, user_id: int) -> Iterator[Session]:
+    """Session that owns `user_id`'s calculations: `db` itself when sharding is off."""
+    if shard_router is None:
+        yield db
+        return
+    shard_db = shard_router.session_for_user(user_id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+
+@contextmanager
+def calculation_read_session(db: Session, user_id: int) -> Iterator[Session]:
+    """Read-only counterpart of calculation_session."""
+    if shard_router is None:
+        yield db
+        return
+    shard_db = shard_router.read_session_for_user(user_id)
+    try:
+        yield shard_db
+    finally:
+        shard_db.rollback()
+        shard_db.close()
+
+
+def insert_calculations(rows: List[dict]) -> int:
+    """Batch-insert calculation rows, routed to their shards when sharding is
+    on, and set each row's `id`."""
+    if not rows:
+        return 0
+    if shard_router is not None:
+        shard_router.bulk_insert(rows)
+    else:
+        with SessionLocal() as db:
+            ids = _insert_returning_ids(db, rows)
+            db.commit()
+        _set_ids(rows, ids)
+    # Core inserts bypass the ORM flush, so report the writers explicitly.
+    for user_id in {row["user_id"] for row in rows}:
+        notify_user_write(user_id)
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calculation shard administration")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebalance = sub.add_parser("rebalance", help="move rows to the shard each user hashes to")
+    rebalance.add_argument("--dry-run", action="store_true", help="report moves without changing data")
+    args = parser.parse_args(argv)
+
+    if shard_router is None:
+        parser.error("DATABASE_SHARD_URLS is not set")
+    if args.command == "rebalance":
+        moved = shard_router.rebalance(dry_run=args.dry_run)
+        for key, count in sorted(moved.items()):
+            print(f"{key}: {count} rows")
+        print(f"Done. {sum(moved.values())} rows {'would move' if args.dry_run else 'moved'}.")
+
+
+if __name__ == "__main__":
+    main()
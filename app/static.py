@@ -0,0 +1,78 @@
+# app/static.py
+"""Static file serving for the front-end.
+
+STATIC_DIR is `static` (the sources) in development, or the output of
+`python tools/build_static.py` (e.g. `build/static`) in production. For a
+built directory `PrecompressedStaticFiles`:
+
+- serves the `.br` or `.gz` sibling written by the build when the client's
+  Accept-Encoding allows it, instead of compressing on every request;
+- marks content-hashed files (`common.3f2a9c81d0e4.css`) as immutable for a
+  year, since a changed file gets a new name;
+- leaves HTML pages revalidating (`no-cache`) against their ETag, so a page
+  view after a deploy picks up the new asset names.
+
+Files are sent by `FileResponse`, which uses the ASGI `pathsend` extension
+(zero-copy sendfile) when the server supports it.
+"""
+import os
+import re
+from mimetypes import guess_type
+from typing import Dict, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.middleware import accepted_encodings
+
+
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# preferred first
+PRECOMPRESSED_ENCODINGS: Tuple[Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+_FINGERPRINTED = re.compile(r"\.[0-9a-f]{12}\.[A-Za-z0-9]+$")
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def __init__(self, *, directory: str, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.built = os.path.isfile(os.path.join(directory, "manifest.json"))
+        # the build output does not change while serving, so index it once
+        self._variants: Dict[str, Dict[str, Tuple[str, os.stat_result]]] = {}
+        suffixes = {suffix: encoding for encoding, suffix in PRECOMPRESSED_ENCODINGS}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                stem, ext = os.path.splitext(name)
+                if ext in suffixes and stem in files:
+                    original = os.path.realpath(os.path.join(root, stem))
+                    path = os.path.join(root, name)
+                    self._variants.setdefault(original, {})[suffixes[ext]] = (path, os.stat(path))
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        variants = self._variants.get(os.path.realpath(full_path))
+        response = None
+        if variants:
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, _ in PRECOMPRESSED_ENCODINGS:
+                if encoding in variants and encoding in accepted:
+                    path, variant_stat = variants[encoding]
+                    response = FileResponse(
+                        path,
+                        status_code=status_code,
+                        stat_result=variant_stat,
+                        media_type=guess_type(str(full_path))[0] or "text/plain",
+                        headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+                    )
+                    break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+            if variants:
+                response.headers["Vary"] = "Accept-Encoding"
+        if _FINGERPRINTED.search(str(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
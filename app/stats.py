@@ -1,46 +1,70 @@
-from sqlalchemy import func
+from sqlalchemy import Select, func, select
 from sqlalchemy.orm import Session
 from typing import Dict
 
+from app.archive import archived_user_summary
 from app.models import Calculation
+from app.queries import fetch_recent_rows
 
 
-def compute_stats(db: Session, user_id: int, recent: int = 5) -> Dict:
+def _type_value(op) -> str:
+    # OperationType members hash by name, so key the counts by plain value.
+    return getattr(op, "value", op)
+
+
+def aggregate_statement(user_id: int) -> Select:
+    """Total count and averages of `a`/`b` in one pass over the covering index."""
+    return select(
+        func.count(Calculation.id), func.avg(Calculation.a), func.avg(Calculation.b)
+    ).where(Calculation.user_id == user_id)
+
+
+def type_counts_statement(user_id: int) -> Select:
+    return (
+        select(Calculation.type, func.count(Calculation.id))
+        .where(Calculation.user_id == user_id)
+        .group_by(Calculation.type)
+    )
+
+
+def compute_stats(db: Session, user_id: int, recent: int = 5, include_archived: bool = True) -> Dict:
     """Compute basic statistics for a user's calculations.
 
     Returns total count, averages for `a` and `b`, counts per operation type,
-    and a list of the most recent `recent` calculations.
+    and a list of the most recent `recent` calculations. With
+    `include_archived`, rows moved out by the retention job (app.archive) are
+    merged into the total, averages and counts.
     """
-    total = db.query(func.count(Calculation.id)).filter(Calculation.user_id == user_id).scalar() or 0
-    avg_a = db.query(func.avg(Calculation.a)).filter(Calculation.user_id == user_id).scalar() or 0
-    avg_b = db.query(func.avg(Calculation.b)).filter(Calculation.user_id == user_id).scalar() or 0
+    total, avg_a, avg_b = db.execute(aggregate_statement(user_id)).one()
+    avg_a = avg_a or 0
+    avg_b = avg_b or 0
 
     # counts per type
-    rows = (
-        db.query(Calculation.type, func.count(Calculation.id))
-        .filter(Calculation.user_id == user_id)
-        .group_by(Calculation.type)
-        .all()
-    )
-    counts = {r[0]: r[1] for r in rows}
-
-    recent_rows = (
-        db.query(Calculation)
-        .filter(Calculation.user_id == user_id)
-        .order_by(Calculation.id.desc())
-        .limit(recent)
-        .all()
-    )
+    rows = db.execute(type_counts_statement(user_id)).all()
+    counts = {_type_value(r[0]): r[1] for r in rows}
+
+    recent_rows = fetch_recent_rows(db, user_id, recent)
 
     recent_list = [
-        {"id": r.id, "a": r.a, "b": r.b, "type": r.type, "result": r.result, "timestamp": r.timestamp.isoformat()}
+        {"id": r.id, "a": r.a, "b": r.b, "type": _type_value(r.type), "result": r.result, "timestamp": r.timestamp.isoformat()}
         for r in recent_rows
     ]
 
+    total, avg_a, avg_b = int(total), float(avg_a), float(avg_b)
+    if include_archived:
+        archived = archived_user_summary(user_id)
+        if archived["count"]:
+            merged = total + archived["count"]
+            avg_a = (avg_a * total + archived["sum_a"]) / merged
+            avg_b = (avg_b * total + archived["sum_b"]) / merged
+            total = merged
+            for op, n in archived["counts"].items():
+                counts[op] = counts.get(op, 0) + n
+
     return {
-        "total": int(total),
-        "avg_a": float(avg_a) if avg_a is not None else 0.0,
-        "avg_b": float(avg_b) if avg_b is not None else 0.0,
+        "total": total,
+        "avg_a": avg_a,
+        "avg_b": avg_b,
         "counts": counts,
         "recent": recent_list,
     }
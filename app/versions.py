@@ -0,0 +1,65 @@
+# app/versions.py
+"""Per-user data versions for HTTP conditional requests.
+
+Every committed write to a user's data bumps that user's row in
+`user_versions`, through `database.user_write_listeners`, so ORM commits and
+the Core bulk paths that call `notify_user_write` are both covered. The
+counter lives in the primary database so all workers agree on it, and
+reading it is a primary-key lookup instead of building the response.
+
+Handlers read the version *before* their data, and from the same database
+the data comes from (a read replica may be behind the primary): a write that
+lands in between makes the ETag older than the body, which only costs the
+client one extra full response, never a stale 304. Cached bodies are keyed by
+the version they were built for, so they cannot outlive it either.
+"""
+from typing import Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.database import engine, user_write_listeners
+from app.logger_config import logger
+from app.models import UserVersion
+
+
+def get_data_version(user_id: int, db: Optional[Session] = None) -> int:
+    """The user's data version, from the primary or through `db`."""
+    stmt = select(UserVersion.version).where(UserVersion.user_id == user_id)
+    if db is not None:
+        return db.execute(stmt).scalar() or 0
+    with engine.connect() as conn:
+        version = conn.execute(stmt).scalar()
+    return version or 0
+
+
+def bump_data_version(user_id: int) -> None:
+    stmt = update(UserVersion).where(UserVersion.user_id == user_id).values(version=UserVersion.version + 1)
+    try:
+        with engine.begin() as conn:
+            if conn.execute(stmt).rowcount:
+                return
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert(UserVersion).values(user_id=user_id, version=1))
+            except IntegrityError:
+                conn.execute(stmt)  # another writer created the row first
+    except SQLAlchemyError as exc:
+        # the write itself already committed; failing it now would not help
+        logger.error(f"Could not bump data version for user {user_id}: {exc}")
+
+
+def etag_for(resource: str, user_id: int, version: int) -> str:
+    return f'"{resource}-{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+user_write_listeners.append(bump_data_version)
@@ -0,0 +1,169 @@
+# app/workers.py
+"""Run calculations under the limits in app.limits.
+
+`run_calculation` is the single entry point used by the request handlers:
+it estimates the cost, rejects over-budget work, computes cheap operations
+inline and sends expensive ones to a `CalculationWorkerPool`. Each pool
+worker is a separate process fed through a pipe; when a job exceeds
+CALCULATION_TIMEOUT_SECONDS its process is terminated (which a thread
+cannot be) and a fresh one is started for the next job. At most
+CALCULATION_WORKERS expensive calculations run at a time per server process;
+further ones wait for a free worker.
+"""
+import multiprocessing
+import os
+import queue
+from decimal import Context
+from typing import Optional
+
+from app import metrics
+from app.calculation_factory import CalculationFactory
+from app.limits import (
+    CALCULATION_INLINE_COST,
+    CALCULATION_TIMEOUT_SECONDS,
+    CalculationError,
+    check_cost,
+    check_result,
+    estimate_cost,
+)
+from app.logger_config import logger
+from app.numeric import decimal_context
+from app.schemas import OperationType
+
+
+CALCULATION_WORKERS = int(os.getenv("CALCULATION_WORKERS", "2"))
+# "forkserver" forks workers from a clean helper process, which is safe even
+# though the server itself runs threads
+CALCULATION_WORKER_START_METHOD = os.getenv("CALCULATION_WORKER_START_METHOD", "forkserver")
+WORKER_START_TIMEOUT_SECONDS = 30
+
+
+def _worker_main(conn) -> None:
+    # imports are done by now; job timeouts should not include them
+    conn.send(("ready",))
+    while True:
+        try:
+            a, b, operation, precision = conn.recv()
+        except EOFError:
+            return
+        try:
+            context = decimal_context(precision) if precision else None
+            result = CalculationFactory.calculate(a, b, OperationType(operation), context)
+            reply = ("ok", result)
+        except CalculationError as exc:
+            reply = ("calculation", exc.code, exc.message, exc.details)
+        except ZeroDivisionError as exc:
+            reply = ("zero", str(exc))
+        except (ArithmeticError, ValueError) as exc:
+            reply = ("value", str(exc))
+        conn.send(reply)
+
+
+class CalculationWorker:
+    def __init__(self, ctx):
+        self._ctx = ctx
+        self._process = None
+        self._conn = None
+
+    def _start(self) -> None:
+        parent, child = self._ctx.Pipe()
+        self._process = self._ctx.Process(target=_worker_main, args=(child,), daemon=True, name="calculation-worker")
+        self._process.start()
+        child.close()
+        self._conn = parent
+        if not parent.poll(WORKER_START_TIMEOUT_SECONDS):
+            self.stop()
+            raise RuntimeError("Calculation worker did not start")
+        parent.recv()
+
+    def run(self, job: tuple, timeout: float):
+        if self._process is None or not self._process.is_alive():
+            self._start()
+        self._conn.send(job)
+        if not self._conn.poll(timeout):
+            self.stop()
+            metrics.inc("calculation_worker_timeouts_total")
+            raise CalculationError("timeout", f"Calculation took longer than {timeout:g} seconds", timeout=timeout)
+        reply = self._conn.recv()
+        if reply[0] == "ok":
+            return reply[1]
+        if reply[0] == "calculation":
+            raise CalculationError(reply[1], reply[2], **reply[3])
+        if reply[0] == "zero":
+            raise ZeroDivisionError(reply[1])
+        raise ValueError(reply[1])
+
+    def stop(self) -> None:
+        if self._process is None:
+            return
+        self._process.terminate()
+        self._process.join(1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+
+class CalculationWorkerPool:
+    def __init__(self, size: int = CALCULATION_WORKERS, timeout: float = CALCULATION_TIMEOUT_SECONDS,
+                 start_method: str = CALCULATION_WORKER_START_METHOD):
+        self.timeout = timeout
+        self._start_method = start_method
+        self._ctx = None
+        self._workers = []
+        self._idle: "queue.Queue[CalculationWorker]" = queue.Queue()
+        self.size = size
+
+    def _context(self):
+        # created lazily so importing this module never starts a forkserver
+        if self._ctx is None:
+            self._ctx = multiprocessing.get_context(self._start_method)
+            self._workers = [CalculationWorker(self._ctx) for _ in range(self.size)]
+            for worker in self._workers:
+                self._idle.put(worker)
+        return self._ctx
+
+    def run(self, a, b, operation: OperationType, precision: Optional[int] = None, timeout: Optional[float] = None):
+        self._context()
+        worker = self._idle.get()
+        try:
+            metrics.inc("calculation_worker_jobs_total")
+            return worker.run((a, b, operation.value, precision), timeout or self.timeout)
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+
+
+metrics.describe("calculation_worker_jobs_total", "Calculations sent to a worker process")
+metrics.describe("calculation_worker_timeouts_total", "Worker calculations killed at the timeout")
+metrics.describe("calculation_rejected_total", "Calculations rejected by code (overflow, too_expensive, ...)")
+
+calculation_workers = CalculationWorkerPool()
+
+
+def run_calculation(a, b, operation: OperationType, context: Optional[Context] = None):
+    """CalculationFactory.calculate under the configured cost limits.
+
+    Raises CalculationError for over-budget, timed out, overflowing or
+    non-real results, and whatever the operation itself raises otherwise.
+    """
+    try:
+        cost = estimate_cost(a, b, operation, context)
+        check_cost(cost, operation)
+        if context is not None and cost > CALCULATION_INLINE_COST:
+            logger.info(f"Running {operation.value} (estimated cost {cost:.3g}) in a worker")
+            result = calculation_workers.run(a, b, operation, context.prec)
+        else:
+            try:
+                result = CalculationFactory.calculate(a, b, operation, context)
+            except OverflowError:
+                raise CalculationError("overflow", f"{operation.value} of {a} and {b} overflows", operation=operation.value)
+        return check_result(result, operation, a, b)
+    except CalculationError as exc:
+        metrics.inc("calculation_rejected_total", code=exc.code)
+        raise
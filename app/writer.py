@@ -0,0 +1,159 @@
+# app/writer.py
+"""Write-behind batching for calculations produced outside a request session.
+
+`BatchWriter.submit` queues a row and returns immediately; a background task
+collects up to WRITE_BATCH_SIZE rows, or whatever arrived within
+WRITE_BATCH_MAX_DELAY seconds, and persists them with one
+`write_calculations` call in a worker thread, which then publishes a `created`
+event per row. A user with more than WRITE_EVENT_MAX_ROWS rows in one batch
+gets a single `reset` event instead (their open lists reload), so a fast
+client cannot overflow its own event streams. The queue is bounded
+(WRITE_QUEUE_SIZE): when the database falls behind, `submit` waits, which
+pushes back on the producer instead of growing memory.
+
+A batch that fails to write is retried WRITE_RETRY_ATTEMPTS times, waiting
+WRITE_RETRY_BACKOFF seconds and doubling after each failure; rows that were
+already committed (they have an `id`, e.g. on another shard) are not written
+again. Rows that still fail are counted, logged and handed to the
+`on_failure` callback given to `submit`, so the producer can tell its client
+that a result it already received was not saved.
+
+Call `drain()` on shutdown so queued rows are written before the process exits.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app import metrics
+from app.events import publish_calculation_event
+from app.logger_config import logger
+from app.serialization import dump_calculation
+from app.sharding import insert_calculations
+
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_BATCH_MAX_DELAY = float(os.getenv("WRITE_BATCH_MAX_DELAY", "0.05"))
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "10000"))
+WRITE_EVENT_MAX_ROWS = int(os.getenv("WRITE_EVENT_MAX_ROWS", "50"))
+WRITE_RETRY_ATTEMPTS = int(os.getenv("WRITE_RETRY_ATTEMPTS", "5"))
+WRITE_RETRY_BACKOFF = float(os.getenv("WRITE_RETRY_BACKOFF", "0.1"))
+
+# called with the exception when a submitted row could not be written
+FailureCallback = Callable[[Exception], Awaitable[None]]
+
+
+def write_calculations(rows: List[dict]) -> int:
+    count = insert_calculations(rows)
+    by_user: Dict[int, List[dict]] = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(row)
+    for user_id, user_rows in by_user.items():
+        if len(user_rows) > WRITE_EVENT_MAX_ROWS:
+            publish_calculation_event(user_id, "reset", {})
+            continue
+        for row in user_rows:
+            publish_calculation_event(user_id, "created", dump_calculation(row))
+    return count
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        flush: Callable[[List[dict]], int] = write_calculations,
+        batch_size: int = WRITE_BATCH_SIZE,
+        max_delay: float = WRITE_BATCH_MAX_DELAY,
+        queue_size: int = WRITE_QUEUE_SIZE,
+        retry_attempts: int = WRITE_RETRY_ATTEMPTS,
+        retry_backoff: float = WRITE_RETRY_BACKOFF,
+    ):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue_size = queue_size
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self) -> None:
+        # bound lazily to the running loop; drain() resets it
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, row: dict, on_failure: Optional[FailureCallback] = None) -> None:
+        self._ensure_started()
+        await self._queue.put((row, on_failure))
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+            for _ in batch:
+                queue.task_done()
+
+    async def _write(self, batch: List[Tuple[dict, Optional[FailureCallback]]]) -> None:
+        rows = [row for row, _ in batch]
+        delay = self.retry_backoff
+        for attempt in range(self.retry_attempts + 1):
+            pending = [row for row in rows if "id" not in row]
+            try:
+                await asyncio.to_thread(self.flush, pending)
+                metrics.inc("calculation_batch_rows_written_total", len(rows))
+                return
+            except Exception as exc:
+                error = exc
+            if attempt < self.retry_attempts:
+                metrics.inc("calculation_batch_retries_total")
+                logger.warning(f"Failed to write {len(pending)} queued calculations, retrying in {delay:g}s: {error}")
+                await asyncio.sleep(delay)
+                delay *= 2
+
+        lost = [(row, on_failure) for row, on_failure in batch if "id" not in row]
+        metrics.inc("calculation_batch_rows_written_total", len(batch) - len(lost))
+        metrics.inc("calculation_batch_rows_failed_total", len(lost))
+        logger.error(f"Failed to write {len(lost)} queued calculations after {self.retry_attempts} retries: {error}")
+        for _, on_failure in lost:
+            if on_failure is None:
+                continue
+            try:
+                await on_failure(error)
+            except Exception as exc:
+                logger.error(f"Could not report a lost calculation: {exc}")
+
+    async def drain(self) -> None:
+        """Write everything queued so far and stop the background task."""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._queue = None
+
+
+metrics.describe("calculation_batch_rows_written_total", "Calculations persisted by the batch writer")
+metrics.describe("calculation_batch_rows_failed_total", "Queued calculations the batch writer failed to persist")
+metrics.describe("calculation_batch_retries_total", "Batch writes retried after a failure")
+
+calculation_writer = BatchWriter()
+metrics.register_gauge("calculation_batch_queue_depth", calculation_writer.pending, "Calculations waiting in the batch writer")
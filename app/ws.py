@@ -0,0 +1,112 @@
+# app/ws.py
+"""Message handling for the `/ws/calculate` WebSocket channel.
+
+After connecting, the server sends `{"event": "ready", "max_batch": N}`. A
+client message is either one calculation, `{"id": <correlation id>, "a": 2,
+"b": 3, "type": "add"}`, or a JSON array of up to N of them. The reply has the
+same shape: one object per calculation, carrying the client's `id` back with
+either `result` or `error`, in request order. Clients may pipeline messages
+without waiting for replies.
+
+Calculations may set `mode` and `precision` as on `POST /calculations`;
+without them the user's saved numeric mode applies, as read when the
+connection opened. Decimal-mode replies also carry `precision` and the exact
+`a_exact`, `b_exact` and `result_exact` (as strings), which are stored too.
+
+Results are returned as soon as they are computed; rows are persisted by the
+batch writer (app.writer) shortly after. If a row still cannot be written
+after the writer's retries, the server sends `{"id": <correlation id>,
+"error": ..., "code": "not_saved"}` for it later on the same connection. When the writer's queue is full the
+server stops reading from the socket until it drains, so a fast client is
+slowed down rather than buffered.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.limits import CalculationError
+from app.numeric import numeric_context, to_decimal
+from app.schemas import CalculationCreate
+from app.workers import run_calculation
+from app.writer import BatchWriter
+
+
+WS_MAX_BATCH = int(os.getenv("WS_MAX_BATCH", "1000"))
+
+# (numeric_mode, decimal_precision) saved on the user's profile
+SavedMode = Tuple[Optional[str], Optional[int]]
+# sends an unsolicited message to the client
+Notify = Callable[[dict], Awaitable[None]]
+
+
+def _validation_message(exc: ValidationError) -> str:
+    error = exc.errors()[0]
+    location = ".".join(str(p) for p in error.get("loc", ()))
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+
+async def evaluate_item(
+    item: Any, user_id: int, writer: BatchWriter, saved_mode: SavedMode = (None, None), notify: Optional[Notify] = None
+) -> dict:
+    correlation_id = item.get("id") if isinstance(item, dict) else None
+    try:
+        payload = CalculationCreate.model_validate(item)
+        context = numeric_context(payload.mode, payload.precision, lambda: saved_mode)
+        if context is not None:
+            a, b = (to_decimal(value, context) for value in payload.decimal_operands())
+            # decimal work may be slow or wait for a calculation worker; keep
+            # it off the event loop the other connections share
+            result = await run_in_threadpool(run_calculation, a, b, payload.type, context)
+            fields = {
+                "a": float(a), "b": float(b), "result": float(result),
+                "precision": context.prec, "a_exact": a, "b_exact": b, "result_exact": result,
+            }
+        else:
+            result = run_calculation(payload.a, payload.b, payload.type)
+            # every row of a batch insert needs the same columns
+            fields = {
+                "a": payload.a, "b": payload.b, "result": result,
+                "precision": None, "a_exact": None, "b_exact": None, "result_exact": None,
+            }
+    except ValidationError as exc:
+        return {"id": correlation_id, "error": _validation_message(exc)}
+    except CalculationError as exc:
+        return {"id": correlation_id, "error": exc.message, "code": exc.code}
+    except ZeroDivisionError:
+        return {"id": correlation_id, "error": "Cannot divide by zero"}
+    except ValueError as exc:
+        return {"id": correlation_id, "error": str(exc)}
+
+    on_failure = None
+    if notify is not None:
+        async def on_failure(exc: Exception) -> None:
+            await notify({"id": correlation_id, "error": "Calculation could not be saved", "code": "not_saved"})
+
+    row = {**fields, "type": payload.type, "timestamp": datetime.utcnow(), "user_id": user_id}
+    await writer.submit(row, on_failure)
+    reply = {"id": correlation_id, "a": fields["a"], "b": fields["b"], "type": payload.type.value, "result": fields["result"]}
+    if context is not None:
+        reply.update(precision=context.prec, a_exact=a, b_exact=b, result_exact=result)
+    return reply
+
+
+async def handle_message(
+    text: str, user_id: int, writer: BatchWriter, saved_mode: SavedMode = (None, None), notify: Optional[Notify] = None
+) -> Any:
+    """Evaluate one client message; returns the reply object (or list)."""
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return {"id": None, "error": "Message is not valid JSON"}
+    if isinstance(message, list):
+        if len(message) > WS_MAX_BATCH:
+            return {"id": None, "error": f"At most {WS_MAX_BATCH} calculations per message"}
+        replies: List[dict] = []
+        for item in message:
+            replies.append(await evaluate_item(item, user_id, writer, saved_mode, notify))
+        return replies
+    return await evaluate_item(message, user_id, writer, saved_mode, notify)
@@ -0,0 +1,58 @@
+# benchmarks/conftest.py
+"""Shared fixtures for the micro-benchmark suite.
+
+The suite is not collected by the default ``pytest`` run (``testpaths`` only
+points at ``tests``). Run it explicitly, e.g.::
+
+    pytest benchmarks --benchmark-json=.benchmarks/latest.json
+"""
+import logging
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.logger_config import logger
+
+
+# Fixed round/iteration counts keep results comparable between runs; the
+# numbers can be raised locally without touching the benchmark modules.
+BENCH_ROUNDS = int(os.getenv("BENCH_ROUNDS", "200"))
+BENCH_ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "50"))
+BENCH_WARMUP_ROUNDS = int(os.getenv("BENCH_WARMUP_ROUNDS", "20"))
+
+
+@pytest.fixture(autouse=True)
+def quiet_app_logger():
+    """Silence INFO logging from app.operations unless BENCH_KEEP_LOGGING is set.
+
+    Every operation logs at INFO level; with pytest capturing output the cost
+    of that logging depends on the capture backend, which makes timings noisy.
+    """
+    if os.getenv("BENCH_KEEP_LOGGING"):
+        yield
+        return
+    previous = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)
+
+
+@pytest.fixture
+def bench(benchmark):
+    """Run ``fn(*args, **kwargs)`` with fixed rounds, iterations and warmup."""
+
+    def run(fn, *args, **kwargs):
+        return benchmark.pedantic(
+            fn,
+            args=args,
+            kwargs=kwargs,
+            rounds=BENCH_ROUNDS,
+            iterations=BENCH_ITERATIONS,
+            warmup_rounds=BENCH_WARMUP_ROUNDS,
+        )
+
+    return run
@@ -0,0 +1,14 @@
+# benchmarks/test_bench_auth.py
+import pytest
+
+from app import security
+from app.security import TokenCache, create_access_token, decode_access_token
+
+
+@pytest.mark.benchmark(group="decode-token")
+@pytest.mark.parametrize("cache_size", [0, 1000], ids=["uncached", "cached"])
+def test_bench_decode_access_token(bench, monkeypatch, cache_size):
+    monkeypatch.setattr(security, "token_cache", TokenCache(maxsize=cache_size))
+    token = create_access_token({"user_id": 1})
+    payload = bench(decode_access_token, token)
+    assert payload["user_id"] == 1
@@ -0,0 +1,33 @@
+# benchmarks/test_bench_formulas.py
+"""Evaluating a formula template over N bindings: one compiled expression per
+row (what N separate calculations amount to) versus one column-wise pass."""
+import os
+import random
+
+import pytest
+
+from app.expressions import compile_expression
+
+
+N = int(os.getenv("BENCH_FORMULA_ROWS", "100000"))
+ROUNDS = int(os.getenv("BENCH_FORMULA_ROUNDS", "5"))
+rng = random.Random(42)
+COLUMNS = {name: [rng.uniform(-100, 100) for _ in range(N)] for name in ("x", "y", "z")}
+FORMULA = compile_expression("(x * y) + z ** 2")
+
+
+@pytest.mark.benchmark(group="formula-evaluate")
+def test_bench_formula_row_by_row(benchmark):
+    def run():
+        x, y, z = COLUMNS["x"], COLUMNS["y"], COLUMNS["z"]
+        return [FORMULA.evaluate({"x": x[i], "y": y[i], "z": z[i]}) for i in range(N)]
+
+    benchmark.pedantic(run, rounds=ROUNDS, iterations=1, warmup_rounds=1)
+    benchmark.extra_info["rows"] = N
+
+
+@pytest.mark.benchmark(group="formula-evaluate")
+def test_bench_formula_columns(benchmark):
+    results, errors = benchmark.pedantic(FORMULA.evaluate_columns, args=(COLUMNS,), rounds=ROUNDS, iterations=1, warmup_rounds=1)
+    assert len(results) == N and not errors
+    benchmark.extra_info["rows"] = N
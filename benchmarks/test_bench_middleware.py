@@ -0,0 +1,105 @@
+"""Per-request overhead of the middleware stack.
+
+Each variant serves the same small JSON route, called directly through ASGI
+on one event loop so HTTP client overhead does not hide the difference:
+no middleware, the previous `@app.middleware("http")` cache-header function
+(BaseHTTPMiddleware), and the pure ASGI stack from app.middleware.
+"""
+import asyncio
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.middleware import CacheControlMiddleware, CompressionMiddleware, MetricsMiddleware, TimingMiddleware
+
+
+async def _calculate(request):
+    return JSONResponse({"a": 2, "b": 3, "type": "add", "result": 5})
+
+
+def _bare():
+    return Starlette(routes=[Route("/calculate", _calculate)])
+
+
+def _base_http():
+    app = _bare()
+
+    @app.middleware("http")
+    async def no_cache_static_html(request, call_next):
+        response = await call_next(request)
+        if request.url.path.startswith("/static/") and request.url.path.endswith(".html"):
+            response.headers["Cache-Control"] = "no-store"
+        return response
+
+    return app
+
+
+def _pure_asgi():
+    app = _bare()
+    app.add_middleware(CompressionMiddleware, prefixes=("/static/",))
+    app.add_middleware(CacheControlMiddleware, prefixes=("/static/",), rules=[(".html", "no-store")])
+    return app
+
+
+def _pure_asgi_instrumented():
+    app = _pure_asgi()
+    app.add_middleware(TimingMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/calculate",
+    "raw_path": b"/calculate",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [(b"host", b"testserver"), (b"accept-encoding", b"gzip")],
+    "client": ("127.0.0.1", 1234),
+    "server": ("testserver", 80),
+}
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _requester(app, loop, n=100):
+    disconnected = asyncio.Event()
+
+    def make_receive():
+        # like a server: the request body once, then wait for a disconnect
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        return receive
+
+    async def send(message):
+        pass
+
+    async def run():
+        for _ in range(n):
+            await app(dict(SCOPE), make_receive(), send)
+
+    return lambda: loop.run_until_complete(run())
+
+
+@pytest.mark.benchmark(group="middleware-overhead")
+@pytest.mark.parametrize("variant", [_bare, _base_http, _pure_asgi, _pure_asgi_instrumented])
+def test_bench_middleware(benchmark, loop, variant):
+    benchmark.extra_info["requests_per_round"] = 100
+    benchmark.pedantic(_requester(variant(), loop), rounds=50, iterations=1, warmup_rounds=5)
@@ -0,0 +1,40 @@
+# benchmarks/test_bench_numeric.py
+"""Float versus decimal numeric mode: CalculationFactory.calculate per
+operation, and request validation of float versus decimal-string operands.
+
+The float rows should match test_bench_operations.py's factory group; the
+decimal rows show the cost of exact arithmetic at the default precision.
+"""
+from decimal import Decimal
+
+import pytest
+
+from app.calculation_factory import CalculationFactory
+from app.numeric import DECIMAL_PRECISION, decimal_context
+from app.schemas import CalculationCreate, OperationType
+
+
+CONTEXT = decimal_context(DECIMAL_PRECISION)
+A, B = Decimal("12.5"), Decimal("3")
+
+
+@pytest.mark.benchmark(group="numeric-float")
+@pytest.mark.parametrize("operation", list(OperationType), ids=[op.value for op in OperationType])
+def test_bench_float_mode(bench, operation):
+    assert bench(CalculationFactory.calculate, 12.5, 3.0, operation) == CalculationFactory.calculate(12.5, 3.0, operation)
+
+
+@pytest.mark.benchmark(group="numeric-decimal")
+@pytest.mark.parametrize("operation", list(OperationType), ids=[op.value for op in OperationType])
+def test_bench_decimal_mode(bench, operation):
+    result = bench(CalculationFactory.calculate, A, B, operation, CONTEXT)
+    assert result == CalculationFactory.calculate(A, B, operation, CONTEXT)
+
+
+@pytest.mark.benchmark(group="numeric-validate")
+@pytest.mark.parametrize("payload", [
+    {"a": 12.5, "b": 3.0, "type": "multiply"},
+    {"a": "12.5", "b": "3", "type": "multiply", "mode": "decimal"},
+], ids=["float", "decimal-strings"])
+def test_bench_validate_operands(bench, payload):
+    bench(CalculationCreate.model_validate, payload)
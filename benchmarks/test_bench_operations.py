@@ -0,0 +1,30 @@
+# benchmarks/test_bench_operations.py
+import pytest
+
+from app import operations
+from app.calculation_factory import CalculationFactory
+from app.schemas import OperationType
+
+
+OPERATIONS = [
+    ("add", operations.add),
+    ("subtract", operations.subtract),
+    ("multiply", operations.multiply),
+    ("divide", operations.divide),
+    ("modulus", operations.modulus),
+    ("exponent", operations.exponent),
+]
+
+
+@pytest.mark.benchmark(group="operations")
+@pytest.mark.parametrize("name,fn", OPERATIONS, ids=[name for name, _ in OPERATIONS])
+def test_bench_operation(bench, name, fn):
+    result = bench(fn, 12.5, 3.0)
+    assert result == fn(12.5, 3.0)
+
+
+@pytest.mark.benchmark(group="factory")
+@pytest.mark.parametrize("operation", list(OperationType), ids=[op.value for op in OperationType])
+def test_bench_factory_calculate(bench, operation):
+    result = bench(CalculationFactory.calculate, 12.5, 3.0, operation)
+    assert result == CalculationFactory.calculate(12.5, 3.0, operation)
@@ -0,0 +1,67 @@
+# benchmarks/test_bench_queries.py
+import tracemalloc
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, ReadOnlySession
+from app.models import Calculation, User
+from app.queries import fetch_calculation_rows
+from app.serialization import dump_calculations
+
+
+HISTORY = 20_000
+
+
+@pytest.fixture(scope="module")
+def history(tmp_path_factory):
+    path = tmp_path_factory.mktemp("bench") / "history.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    ts = datetime(2024, 1, 1, 12, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "username": "bench", "email": "bench@example.com", "password_hash": "x", "created_at": ts}])
+        conn.execute(
+            insert(Calculation),
+            [{"a": float(i), "b": 2.0, "type": "add", "result": i + 2.0, "timestamp": ts, "user_id": 1} for i in range(HISTORY)],
+        )
+    yield engine
+    engine.dispose()
+
+
+def _orm_load(Session):
+    with Session() as db:
+        rows = db.query(Calculation).filter(Calculation.user_id == 1).order_by(Calculation.id.asc()).all()
+        return dump_calculations(rows)
+
+
+def _projected_load(Session):
+    with Session() as db:
+        return dump_calculations(fetch_calculation_rows(db, 1))
+
+
+def _peak_bytes(fn, *args):
+    tracemalloc.start()
+    try:
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.benchmark(group="list-query-20k")
+def test_bench_orm_entity_load(benchmark, history):
+    Session = sessionmaker(bind=history, autoflush=False)
+    benchmark.extra_info["peak_bytes"] = _peak_bytes(_orm_load, Session)
+    body = benchmark.pedantic(_orm_load, args=(Session,), rounds=5, warmup_rounds=1)
+    assert body.startswith(b"[")
+
+
+@pytest.mark.benchmark(group="list-query-20k")
+def test_bench_column_projected_load(benchmark, history):
+    Session = sessionmaker(bind=history, class_=ReadOnlySession, autoflush=False, expire_on_commit=False)
+    benchmark.extra_info["peak_bytes"] = _peak_bytes(_projected_load, Session)
+    body = benchmark.pedantic(_projected_load, args=(Session,), rounds=5, warmup_rounds=1)
+    assert body.startswith(b"[")
@@ -0,0 +1,58 @@
+# benchmarks/test_bench_schemas.py
+from datetime import datetime
+
+import pytest
+from pydantic import ValidationError
+
+from app.models import Calculation
+from app.schemas import CalculationCreate, CalculationRead, OperationType
+
+
+@pytest.mark.benchmark(group="schemas")
+def test_bench_calculation_create_validate(bench):
+    payload = {"a": 10, "b": 5, "type": "add"}
+    model = bench(CalculationCreate.model_validate, payload)
+    assert model.type == OperationType.ADD
+
+
+@pytest.mark.benchmark(group="schemas")
+def test_bench_calculation_create_divide_checked(bench):
+    # exercises the check_division_by_zero model validator on its non-raising branch
+    payload = {"a": 10, "b": 5, "type": "divide"}
+    model = bench(CalculationCreate.model_validate, payload)
+    assert model.type == OperationType.DIVIDE
+
+
+@pytest.mark.benchmark(group="schemas")
+def test_bench_calculation_create_divide_by_zero_rejected(bench):
+    payload = {"a": 10, "b": 0, "type": "divide"}
+
+    def validate():
+        try:
+            CalculationCreate.model_validate(payload)
+        except ValidationError:
+            return True
+        return False
+
+    assert bench(validate) is True
+
+
+@pytest.mark.benchmark(group="schemas")
+def test_bench_validate_type_field_validator(bench):
+    # the field validator is a no-op; calling it directly isolates its cost
+    result = bench(CalculationCreate.validate_type, OperationType.ADD)
+    assert result == OperationType.ADD
+
+
+@pytest.mark.benchmark(group="schemas")
+def test_bench_calculation_read_from_attributes(bench):
+    row = Calculation(
+        id=1, a=10.0, b=5.0, type=OperationType.ADD, result=15.0,
+        timestamp=datetime(2024, 1, 1, 12, 0, 0), user_id=1,
+    )
+
+    def serialize():
+        return CalculationRead.model_validate(row).model_dump(mode="json")
+
+    data = bench(serialize)
+    assert data["result"] == 15.0
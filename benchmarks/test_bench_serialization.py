@@ -0,0 +1,45 @@
+# benchmarks/test_bench_serialization.py
+import asyncio
+from datetime import datetime
+from typing import List
+
+import pytest
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models import Calculation
+from app.schemas import CalculationRead, OperationType
+from app.serialization import calculations_response
+
+
+ROWS = 10_000
+
+
+@pytest.fixture(scope="module")
+def rows():
+    ts = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        Calculation(id=i, a=float(i), b=3.0, type=OperationType.ADD, result=i + 3.0, timestamp=ts, user_id=1)
+        for i in range(ROWS)
+    ]
+
+
+@pytest.mark.benchmark(group="list-serialization-10k")
+def test_bench_response_model_path(benchmark, rows):
+    """FastAPI's generic response_model=List[CalculationRead] path."""
+    field = create_response_field(name="Response_list_calculations", type_=List[CalculationRead])
+
+    def render():
+        content = asyncio.run(serialize_response(field=field, response_content=rows))
+        return JSONResponse(content).body
+
+    body = benchmark.pedantic(render, rounds=10, warmup_rounds=1)
+    assert body.startswith(b"[")
+
+
+@pytest.mark.benchmark(group="list-serialization-10k")
+def test_bench_type_adapter_path(benchmark, rows):
+    """Cached TypeAdapter validate + dump_json straight to bytes."""
+    body = benchmark.pedantic(lambda: calculations_response(rows).body, rounds=10, warmup_rounds=1)
+    assert body.startswith(b"[")
@@ -0,0 +1,84 @@
+# benchmarks/test_bench_storage.py
+"""Table + index size and group-by cost of string vs SMALLINT operation types."""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, Index, MetaData, String, Table, create_engine, insert, text
+
+from app.models import Calculation
+from app.schemas import OperationType
+
+
+ROWS = 100_000
+OPS = list(OperationType)
+
+
+def _vacuum(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+
+
+def _table(type_column_type) -> Table:
+    """A copy of the calculations table with all its columns and indexes, and
+    `type` stored as `type_column_type`, so both layouts carry the same
+    indexes and differ only in how the operation is stored."""
+    source = Calculation.__table__
+    table = Table(
+        source.name,
+        MetaData(),
+        *[Column(c.name, type_column_type if c.name == "type" else c.type, primary_key=c.primary_key, nullable=c.nullable)
+          for c in source.columns],
+    )
+    for index in source.indexes:
+        Index(index.name, *[table.c[c.name] for c in index.columns], unique=index.unique)
+    return table
+
+
+def _engine(path, table, type_value):
+    engine = create_engine(f"sqlite:///{path}")
+    table.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(table),
+            [{"a": 1.0, "b": 2.0, "type": type_value(OPS[i % len(OPS)]), "result": 3.0,
+              "timestamp": datetime(2024, 1, 1), "user_id": i % 49} for i in range(ROWS)],
+        )
+    _vacuum(engine)
+    return engine
+
+
+def _string_engine(path):
+    return _engine(path, _table(String), lambda op: f"OperationType.{op.name}")
+
+
+def _code_engine(path):
+    return _engine(path, _table(Calculation.__table__.c.type.type), lambda op: op)
+
+
+@pytest.fixture(scope="module")
+def engines(tmp_path_factory):
+    base = tmp_path_factory.mktemp("storage")
+    string_path, code_path = base / "string.db", base / "code.db"
+    yield {
+        "string": (_string_engine(string_path), string_path),
+        "code": (_code_engine(code_path), code_path),
+    }
+
+
+def _group_by(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT type, count(id) FROM calculations WHERE user_id = 7 GROUP BY type")).all()
+
+
+@pytest.mark.benchmark(group="type-storage-100k")
+@pytest.mark.parametrize("layout", ["string", "code"])
+def test_bench_type_group_by(benchmark, engines, layout):
+    engine, path = engines[layout]
+    benchmark.extra_info["file_bytes"] = os.path.getsize(path)
+    rows = benchmark.pedantic(_group_by, args=(engine,), rounds=20, warmup_rounds=2)
+    assert len(rows) == len(OPS)
+
+
+def test_code_layout_is_smaller(engines):
+    assert os.path.getsize(engines["code"][1]) < os.path.getsize(engines["string"][1])
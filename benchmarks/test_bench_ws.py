@@ -0,0 +1,75 @@
+# benchmarks/test_bench_ws.py
+"""Throughput of N calculations through REST `POST /calculate` versus the
+`/ws/calculate` channel (pipelined single messages and one batched message).
+
+Each round sends N calculations; compare the `ops` extra_info (calculations
+per second) across the three variants.
+"""
+import os
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import Base, engine
+from app.main import app
+
+
+N = int(os.getenv("BENCH_WS_CALCULATIONS", "200"))
+ROUNDS = int(os.getenv("BENCH_WS_ROUNDS", "5"))
+PAYLOADS = [{"id": i, "a": i, "b": 3, "type": "multiply"} for i in range(N)]
+
+
+@pytest.fixture(scope="module")
+def client():
+    Base.metadata.create_all(bind=engine)
+    with TestClient(app) as client:
+        name = f"bench_{uuid.uuid4().hex[:8]}"
+        r = client.post("/users/register", json={"username": name, "email": f"{name}@example.com", "password": "strongpassword"})
+        client.headers["Authorization"] = f"Bearer {r.json()['access_token']}"
+        yield client
+
+
+def _record_throughput(benchmark):
+    benchmark.extra_info["calculations"] = N
+    # no timings are collected under --benchmark-disable
+    if benchmark.enabled and benchmark.stats:
+        benchmark.extra_info["ops"] = round(N / benchmark.stats.stats.mean)
+
+
+@pytest.mark.benchmark(group="calculate-throughput")
+def test_bench_rest_calculate(benchmark, client):
+    def run():
+        for payload in PAYLOADS:
+            assert client.post("/calculate", json=payload).status_code == 200
+
+    benchmark.pedantic(run, rounds=ROUNDS, iterations=1, warmup_rounds=1)
+    _record_throughput(benchmark)
+
+
+@pytest.mark.benchmark(group="calculate-throughput")
+def test_bench_ws_pipelined(benchmark, client):
+    with client.websocket_connect("/ws/calculate") as ws:
+        ws.receive_json()
+
+        def run():
+            for payload in PAYLOADS:
+                ws.send_json(payload)
+            for _ in PAYLOADS:
+                assert "result" in ws.receive_json()
+
+        benchmark.pedantic(run, rounds=ROUNDS, iterations=1, warmup_rounds=1)
+    _record_throughput(benchmark)
+
+
+@pytest.mark.benchmark(group="calculate-throughput")
+def test_bench_ws_batched(benchmark, client):
+    with client.websocket_connect("/ws/calculate") as ws:
+        ws.receive_json()
+
+        def run():
+            ws.send_json(PAYLOADS)
+            assert len(ws.receive_json()) == N
+
+        benchmark.pedantic(run, rounds=ROUNDS, iterations=1, warmup_rounds=1)
+    _record_throughput(benchmark)
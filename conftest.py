@@ -18,6 +18,10 @@ DATABASE_URL = os.getenv("DATABASE_URL", DEFAULT_TEST_DB)
 if "DATABASE_URL" not in os.environ:
     os.environ["DATABASE_URL"] = DATABASE_URL
 
+# Rate limits are exercised by their own tests; keep them out of the way of
+# suites that register and log in many users from the same client address.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
 # If using the default file-backed SQLite DB, remove the file to ensure a clean
 # schema for each test run. This avoids leftover tables/constraints from
 # previous runs (useful during local iterative development).
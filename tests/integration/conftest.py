@@ -0,0 +1,37 @@
+# tests/integration/conftest.py
+import uuid
+from typing import NamedTuple
+
+import pytest
+
+from app.database import Base, engine, get_db
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create a fresh database for each test"""
+    Base.metadata.create_all(bind=engine)
+    db = next(get_db())
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+class RegisteredUser(NamedTuple):
+    id: int
+    token: str
+    headers: dict
+
+
+@pytest.fixture
+def register(test_db):
+    """Factory that registers a fresh user through the given client."""
+
+    def register(client) -> RegisteredUser:
+        name = f"user_{uuid.uuid4().hex[:8]}"
+        r = client.post("/users/register", json={"username": name, "email": f"{name}@example.com", "password": "strongpassword"})
+        assert r.status_code == 201
+        data = r.json()
+        return RegisteredUser(data["id"], data["access_token"], {"Authorization": f"Bearer {data['access_token']}"})
+
+    return register
@@ -55,3 +55,16 @@ def test_divide_by_zero_endpoint(client):
     response = client.post("/divide", json={"x": 10, "y": 0})
     assert response.status_code == 400
     assert response.json()["detail"] == "Cannot divide by zero"
+
+
+def test_metrics_endpoint_reports_token_cache(client):
+    r = client.post("/users/register", json={"username": "metrics_user", "email": "metrics@example.com", "password": "strongpassword"})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    client.get("/users/me", headers=headers)
+    client.get("/users/me", headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'token_cache_requests_total{result="hit"}' in response.text
+    assert "token_cache_size" in response.text
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.archive as archive
+from app.archive import archive_old_calculations
+from app.database import engine
+from app.main import app
+
+
+@pytest.fixture
+def client(test_db):
+    return TestClient(app)
+
+
+def test_export_and_stats_include_archived_rows(client, tmp_path, monkeypatch, register):
+    monkeypatch.setattr(archive, "CALCULATION_ARCHIVE_DIR", str(tmp_path))
+    headers = register(client).headers
+    for a in (1, 2, 3):
+        assert client.post("/calculations", json={"a": a, "b": 1, "type": "add"}, headers=headers).status_code == 201
+
+    # archive everything older than "next month", i.e. all rows, then add one live row
+    now = datetime.utcnow()
+    archived = archive_old_calculations(engine, tmp_path, retention_months=0, now=datetime(now.year + 1, 1, 1))
+    assert sum(archived.values()) >= 3
+    assert client.get("/calculations", headers=headers).json() == []
+    assert client.post("/calculations", json={"a": 4, "b": 1, "type": "add"}, headers=headers).status_code == 201
+
+    r = client.get("/calculations/export", headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["a"] for row in rows] == [1, 2, 3, 4]
+
+    stats = client.get("/calculations/stats", headers=headers).json()
+    assert stats["total"] == 4
+    assert stats["avg_a"] == 2.5
+
+
+def test_export_requires_auth(client):
+    assert client.get("/calculations/export").status_code == 401
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models import Calculation
+
+
+def _seed(client, headers):
+    ids = []
+    for a, b, t in [(1, 2, "add"), (6, 3, "divide"), (5, 0, "add"), (2, 3, "multiply")]:
+        ids.append(client.post("/calculations", json={"a": a, "b": b, "type": t}, headers=headers).json()["id"])
+    return ids
+
+
+def _remaining(client, headers):
+    return [c["id"] for c in client.get("/calculations", headers=headers).json()]
+
+
+def test_delete_by_ids_and_type_only_touches_own_rows(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    other = register(client).headers
+    ids = _seed(client, headers)
+    other_ids = _seed(client, other)
+
+    r = client.delete("/calculations", params={"ids": [ids[0], ids[1], other_ids[0]]}, headers=headers)
+    assert r.json() == {"deleted": 2}
+    r = client.delete("/calculations", params={"type": "add"}, headers=headers)
+    assert r.json() == {"deleted": 1}
+    assert _remaining(client, headers) == [ids[3]]
+    assert _remaining(client, other) == other_ids
+
+
+def test_delete_before_and_all(test_db, register):
+    client = TestClient(app)
+    user_id, _, headers = register(client)
+    ids = _seed(client, headers)
+    test_db.query(Calculation).filter(Calculation.id == ids[0]).update({"timestamp": datetime.utcnow() - timedelta(days=30)})
+    test_db.commit()
+
+    before = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    assert client.delete("/calculations", params={"before": before}, headers=headers).json() == {"deleted": 1}
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 3
+    assert client.delete("/calculations", params={"all": "true"}, headers=headers).json() == {"deleted": 3}
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 0
+
+
+def test_delete_without_filter_is_rejected(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    _seed(client, headers)
+    assert client.delete("/calculations", headers=headers).status_code == 422
+    assert len(_remaining(client, headers)) == 4
+
+
+def test_patch_recomputes_matching_rows(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    ids = _seed(client, headers)
+
+    r = client.patch("/calculations", json={"ids": [ids[0], ids[3]], "new_type": "subtract"}, headers=headers)
+    assert r.json() == {"updated": 2}
+    rows = {c["id"]: c for c in client.get("/calculations", headers=headers).json()}
+    assert (rows[ids[0]]["type"], rows[ids[0]]["result"]) == ("subtract", -1)
+    assert (rows[ids[3]]["type"], rows[ids[3]]["result"]) == ("subtract", -1)
+    assert rows[ids[1]]["result"] == 2
+
+
+def test_patch_is_all_or_nothing(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    ids = _seed(client, headers)
+
+    r = client.patch("/calculations", json={"all": True, "new_type": "divide"}, headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"]["ids"] == [ids[2]]
+    assert [c["type"] for c in client.get("/calculations", headers=headers).json()] == ["add", "divide", "add", "multiply"]
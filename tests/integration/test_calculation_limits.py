@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import limits, numeric
+from app.main import app
+
+
+@pytest.mark.parametrize("endpoint", ["/calculate", "/calculations"])
+@pytest.mark.parametrize("payload, code", [
+    ({"a": 1e308, "b": 10, "type": "multiply"}, "overflow"),
+    ({"a": 10, "b": 400, "type": "exponent"}, "overflow"),
+    ({"a": -8, "b": 0.5, "type": "exponent"}, "not_a_number"),
+])
+def test_overflow_and_nan_are_structured_errors(register, endpoint, payload, code):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post(endpoint, json=payload, headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"]["code"] == code
+    assert client.get("/calculations", headers=headers).json() == []
+
+
+def test_legacy_endpoint_overflow(test_db):
+    client = TestClient(app)
+    r = client.post("/multiply", json={"x": 1e308, "y": 10})
+    assert r.status_code == 400
+    assert r.json()["detail"]["code"] == "overflow"
+
+
+def test_over_budget_decimal_work_is_rejected(register, monkeypatch):
+    client = TestClient(app)
+    headers = register(client).headers
+    monkeypatch.setattr(numeric, "DECIMAL_MAX_PRECISION", 100000)
+    monkeypatch.setattr(limits, "CALCULATION_MAX_COST", 1e9)
+    r = client.post("/calculations", json={"a": 2, "b": 0.5, "type": "exponent", "mode": "decimal", "precision": 50000}, headers=headers)
+    assert r.status_code == 400
+    assert r.json()["detail"]["code"] == "too_expensive"
+
+
+def test_websocket_reports_error_codes(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    with client.websocket_connect("/ws/calculate", headers=headers) as ws:
+        ws.receive_json()
+        ws.send_json({"id": 1, "a": 1e308, "b": 10, "type": "multiply"})
+        assert ws.receive_json() == {"id": 1, "error": "multiply of 1e+308 and 10.0 overflows", "code": "overflow"}
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.versions import get_data_version
+
+
+@pytest.mark.parametrize("path", ["/calculations", "/calculations/stats"])
+def test_unchanged_data_is_answered_with_304(register, monkeypatch, path):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    first = client.get(path, headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    def no_queries(*args, **kwargs):
+        raise AssertionError("rows queried for a 304")
+
+    monkeypatch.setattr(main, "fetch_calculation_rows", no_queries)
+    monkeypatch.setattr(main, "compute_stats", no_queries)
+    r = client.get(path, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.headers["ETag"] == etag
+    assert r.content == b""
+
+
+@pytest.mark.parametrize("path", ["/calculations", "/calculations/stats"])
+def test_every_write_changes_the_etag(register, path):
+    client = TestClient(main.app)
+    user_id, _, headers = register(client)
+    etags = [client.get(path, headers=headers).headers["ETag"]]
+
+    calc = client.post("/calculations", json={"a": 1, "b": 2, "type": "add"}, headers=headers).json()
+    etags.append(client.get(path, headers={**headers, "If-None-Match": etags[-1]}).headers["ETag"])
+    client.put(f"/calculations/{calc['id']}", json={"a": 5, "b": 2, "type": "add"}, headers=headers)
+    etags.append(client.get(path, headers={**headers, "If-None-Match": etags[-1]}).headers["ETag"])
+    client.delete(f"/calculations/{calc['id']}", headers=headers)
+    r = client.get(path, headers={**headers, "If-None-Match": etags[-1]})
+    etags.append(r.headers["ETag"])
+
+    assert r.status_code == 200
+    assert len(set(etags)) == 4
+    assert etags[-1].endswith(f'-{get_data_version(user_id)}"')
@@ -0,0 +1,78 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_float_mode_response_is_unchanged(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    body = client.post("/calculations", json={"a": 0.1, "b": 0.2, "type": "add"}, headers=headers).json()
+    assert body["result"] == 0.1 + 0.2
+    assert set(body) == {"id", "a", "b", "type", "result", "timestamp", "user_id"}
+
+
+def test_per_request_decimal_mode(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post("/calculations", json={"a": "0.1", "b": "0.2", "type": "add", "mode": "decimal"}, headers=headers)
+    assert r.status_code == 201
+    body = r.json()
+    assert body["result_exact"] == "0.3"
+    assert body["result"] == 0.3
+    assert body["precision"] == 28
+
+    r = client.post("/calculate", json={"a": 1, "b": 3, "type": "divide", "mode": "decimal", "precision": 50}, headers=headers)
+    assert r.json()["result_exact"] == "0." + "3" * 50
+
+    r = client.post("/calculate", json={"a": "0.10000000000000000001", "b": "0", "type": "add", "mode": "decimal"}, headers=headers)
+    assert r.json()["a_exact"] == "0.10000000000000000001"
+
+    listed = client.get("/calculations", headers=headers).json()
+    assert [c["result_exact"] for c in listed] == ["0.3", "0." + "3" * 50, "0.10000000000000000001"]
+    assert client.get(f"/calculations/{body['id']}", headers=headers).json()["result_exact"] == "0.3"
+
+
+def test_saved_user_mode_applies_until_request_overrides(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.put("/users/me", json={"numeric_mode": "decimal", "decimal_precision": 10}, headers=headers)
+    assert r.json()["numeric_mode"] == "decimal"
+    assert r.json()["decimal_precision"] == 10
+
+    body = client.post("/calculations", json={"a": 2, "b": 3, "type": "divide"}, headers=headers).json()
+    assert body["result_exact"] == "0.6666666667"
+    body = client.post("/calculations", json={"a": 2, "b": 3, "type": "divide", "mode": "float"}, headers=headers).json()
+    assert "result_exact" not in body
+
+    client.put("/users/me", json={"numeric_mode": None}, headers=headers)
+    body = client.post("/calculations", json={"a": 2, "b": 3, "type": "divide"}, headers=headers).json()
+    assert "result_exact" not in body
+
+
+@pytest.mark.parametrize("payload", [
+    {"a": 10, "b": 400, "type": "exponent"},
+    {"a": 2, "b": 1000000, "type": "exponent"},
+    {"a": -8, "b": 0.5, "type": "exponent"},
+    {"a": "1.0000000000000000000000000000001", "b": 1, "type": "add"},
+])
+def test_decimal_guards(register, payload):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post("/calculations", json={**payload, "mode": "decimal"}, headers=headers)
+    assert r.status_code == 400
+    assert client.post("/calculations", json={"a": 1, "b": 1, "type": "add", "mode": "decimal", "precision": 1000}, headers=headers).status_code == 400
+
+
+def test_update_and_recompute_keep_modes(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    calc = client.post("/calculations", json={"a": "0.1", "b": "0.2", "type": "add", "mode": "decimal"}, headers=headers).json()
+
+    r = client.patch("/calculations", json={"ids": [calc["id"]], "new_type": "multiply"}, headers=headers)
+    assert r.json() == {"updated": 1}
+    assert client.get(f"/calculations/{calc['id']}", headers=headers).json()["result_exact"] == "0.02"
+
+    r = client.put(f"/calculations/{calc['id']}", json={"a": 1, "b": 2, "type": "add"}, headers=headers)
+    assert r.json()["result"] == 3.0
+    assert "result_exact" not in r.json() and "precision" not in r.json()
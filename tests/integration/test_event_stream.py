@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.events as events
+import app.main as main
+
+
+@pytest.fixture(autouse=True)
+def broker(monkeypatch):
+    monkeypatch.setattr(events, "event_broker", events.InProcessBroker())
+
+
+def _limit_stream(monkeypatch, count):
+    """The test client buffers whole responses, so end the stream after
+    `count` events."""
+    real = main.sse_stream
+
+    def limited(user_id, last_event_id=None):
+        async def gen():
+            seen = 0
+            stream = real(user_id, last_event_id)
+            async for chunk in stream:
+                yield chunk
+                seen += chunk.startswith(b"id:")
+                if seen == count:
+                    await stream.aclose()
+                    return
+        return gen()
+
+    monkeypatch.setattr(main, "sse_stream", limited)
+
+
+def _parse(body: str):
+    frames = []
+    for frame in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in frame.split("\n") if ": " in line and not line.startswith(":"))
+        if "event" in fields:
+            frames.append(fields)
+    return frames
+
+
+def test_stream_replays_changes_after_last_event_id(register, monkeypatch):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    created = client.post("/calculations", json={"a": 2, "b": 3, "type": "add"}, headers=headers).json()
+    client.put(f"/calculations/{created['id']}", json={"a": 4, "b": 3, "type": "add"}, headers=headers)
+    client.delete(f"/calculations/{created['id']}", headers=headers)
+
+    _limit_stream(monkeypatch, 3)
+    epoch = events.event_broker.epoch
+    r = client.get("/calculations/stream", headers={**headers, "Last-Event-ID": f"{epoch}-0"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    frames = _parse(r.text)
+    assert [f["event"] for f in frames] == ["created", "updated", "deleted"]
+    assert json.loads(frames[0]["data"]) == created
+    assert json.loads(frames[1]["data"])["result"] == 7
+    assert json.loads(frames[2]["data"]) == {"id": created["id"]}
+
+
+def test_stream_only_carries_own_events(register, monkeypatch):
+    client = TestClient(main.app)
+    mine, theirs = register(client).headers, register(client).headers
+    client.post("/calculations", json={"a": 1, "b": 1, "type": "add"}, headers=theirs)
+    client.post("/calculations", json={"a": 2, "b": 2, "type": "add"}, headers=mine)
+
+    _limit_stream(monkeypatch, 1)
+    r = client.get("/calculations/stream", headers={**mine, "Last-Event-ID": f"{events.event_broker.epoch}-0"})
+    assert [json.loads(f["data"])["a"] for f in _parse(r.text)] == [2]
+
+
+def test_operation_endpoints_publish_created(register, monkeypatch):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    ids = [
+        client.post(f"/{op}", json={"x": 6, "y": 3}, headers=headers).json()["calculation_id"]
+        for op in ("add", "subtract", "multiply", "divide")
+    ]
+
+    _limit_stream(monkeypatch, 4)
+    r = client.get("/calculations/stream", headers={**headers, "Last-Event-ID": f"{events.event_broker.epoch}-0"})
+    frames = _parse(r.text)
+    assert {f["event"] for f in frames} == {"created"}
+    assert [(json.loads(f["data"])["id"], json.loads(f["data"])["result"]) for f in frames] == list(zip(ids, [9, 3, 18, 2]))
+
+
+def test_unknown_last_event_id_gets_reset(register):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    r = client.get("/calculations/stream", headers={**headers, "Last-Event-ID": "stale-12"})
+    assert [f["event"] for f in _parse(r.text)] == ["reset"]
+
+
+def test_stream_requires_auth(test_db):
+    assert TestClient(main.app).get("/calculations/stream").status_code == 401
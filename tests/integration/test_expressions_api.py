@@ -0,0 +1,52 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def test_create_expression_persists_steps(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post("/expressions", json={"expression": "(2 + 3) * 4 ** 2"}, headers=headers)
+    assert r.status_code == 201
+    body = r.json()
+    assert body["expression"] == "((2.0 + 3.0) * (4.0 ** 2.0))"
+    assert body["result"] == 80.0
+    assert [s["op"] for s in body["steps"]] == ["add", "exponent", "multiply"]
+    assert body["steps"][-1] == {"op": "multiply", "a": 5.0, "b": 16.0, "result": 80.0}
+
+    r = client.get(f"/expressions/{body['id']}", headers=headers)
+    assert r.json() == body
+    assert client.get("/expressions", headers=headers).json() == [body]
+    assert client.get(f"/expressions/{body['id']}", headers=register(client).headers).status_code == 404
+
+
+def test_create_expression_from_ast(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    ast = {"op": "subtract", "left": 10, "right": {"op": "divide", "left": 9, "right": 3}}
+    r = client.post("/expressions", json={"ast": ast}, headers=headers)
+    assert r.status_code == 201
+    assert r.json()["result"] == 7.0
+
+
+@pytest.mark.parametrize("payload, status", [
+    ({"expression": "1 / (1 - 1)"}, 400),
+    ({"expression": "1 +"}, 400),
+    ({"expression": "x * 2"}, 400),
+    ({"expression": "10.0 ** 400"}, 400),
+    ({"ast": {"op": "nope", "left": 1, "right": 2}}, 400),
+    ({}, 422),
+    ({"expression": "1", "ast": 1}, 422),
+])
+def test_invalid_expressions(register, payload, status):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post("/expressions", json=payload, headers=headers)
+    assert r.status_code == status
+    assert client.get("/expressions", headers=headers).json() == []
+
+
+def test_expressions_require_auth(test_db):
+    client = TestClient(app)
+    assert client.post("/expressions", json={"expression": "1 + 1"}).status_code == 401
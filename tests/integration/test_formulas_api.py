@@ -0,0 +1,65 @@
+from fastapi.testclient import TestClient
+
+from app import formulas
+from app.main import app
+from app.models import FormulaRun
+
+
+def test_register_and_evaluate_formula(test_db, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    r = client.post("/formulas", json={"name": "sweep", "expression": "(x * y) + z ** 2"}, headers=headers)
+    assert r.status_code == 201
+    assert r.json()["expression"] == "((x * y) + (z ** 2.0))"
+    assert r.json()["variables"] == ["x", "y", "z"]
+    assert client.get("/formulas/sweep", headers=headers).json() == r.json()
+    assert [f["name"] for f in client.get("/formulas", headers=headers).json()] == ["sweep"]
+
+    bindings = {"x": [1, 2, 3], "y": [4, 5, 6], "z": [0, 1, 2]}
+    r = client.post("/formulas/sweep/evaluate", json={"bindings": bindings}, headers=headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["rows"] == 3
+    assert body["results"] == [4.0, 11.0, 22.0]
+    assert body["errors"] == []
+    assert body["run_id"] is None
+    assert test_db.query(FormulaRun).count() == 0
+
+
+def test_evaluate_reports_row_errors_and_persists(test_db, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    client.post("/formulas", json={"name": "ratio", "expression": "a / b"}, headers=headers)
+    r = client.post("/formulas/ratio/evaluate", json={"bindings": {"a": [1, 2], "b": [0, 4]}, "persist": True}, headers=headers)
+    body = r.json()
+    assert body["results"] == [None, 0.5]
+    assert body["errors"] == [{"index": 0, "error": "Cannot divide by zero"}]
+
+    run = test_db.query(FormulaRun).filter(FormulaRun.id == body["run_id"]).one()
+    assert run.rows == 2
+    assert run.results == [None, 0.5]
+    assert run.bindings == {"a": [1.0, 2.0], "b": [0.0, 4.0]}
+
+
+def test_formula_validation(register, monkeypatch):
+    client = TestClient(app)
+    headers = register(client).headers
+    assert client.post("/formulas", json={"name": "f", "expression": "x +"}, headers=headers).status_code == 400
+    assert client.post("/formulas", json={"name": "f", "expression": "1 + 2"}, headers=headers).status_code == 400
+    assert client.post("/formulas", json={"name": "bad name", "expression": "x"}, headers=headers).status_code == 422
+    assert client.post("/formulas", json={"name": "f", "expression": "x * 2"}, headers=headers).status_code == 201
+    assert client.post("/formulas", json={"name": "f", "expression": "x * 3"}, headers=headers).status_code == 409
+
+    evaluate = lambda bindings: client.post("/formulas/f/evaluate", json={"bindings": bindings}, headers=headers)
+    assert evaluate({"y": [1]}).status_code == 400
+    monkeypatch.setattr(formulas, "FORMULA_MAX_ROWS", 2)
+    assert evaluate({"x": [1, 2, 3]}).status_code == 400
+    assert evaluate({"x": [1, 2]}).json()["results"] == [2.0, 4.0]
+    monkeypatch.setattr(formulas, "FORMULA_MAX_CELLS", 3)
+    assert client.post("/formulas", json={"name": "g", "expression": "x + y"}, headers=headers).status_code == 201
+    assert client.post("/formulas/g/evaluate", json={"bindings": {"x": [1, 2], "y": [3, 4]}}, headers=headers).status_code == 400
+    assert client.post("/formulas/g/evaluate", json={"bindings": {"x": [1], "y": [3]}}, headers=headers).json()["results"] == [4.0]
+
+    other = register(client).headers
+    assert client.post("/formulas/f/evaluate", json={"bindings": {"x": [1]}}, headers=other).status_code == 404
+    assert client.get("/formulas/f", headers=other).status_code == 404
@@ -0,0 +1,53 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.calculation_factory import CalculationFactory
+from app.database import engine
+from app.idempotency import IdempotencyStore
+from app.main import app
+from app.models import Calculation
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    monkeypatch.setattr("app.main.idempotency_store", IdempotencyStore(engine))
+
+
+@pytest.mark.parametrize("path", ["/calculations", "/calculate"])
+def test_retry_with_same_key_replays_without_recomputing(test_db, monkeypatch, path, register):
+    client = TestClient(app)
+    headers = {**register(client).headers, "Idempotency-Key": "retry-1"}
+    calls = []
+    real = CalculationFactory.calculate
+    monkeypatch.setattr(CalculationFactory, "calculate", lambda *a: calls.append(a) or real(*a))
+
+    first = client.post(path, json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    second = client.post(path, json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    assert first.status_code == second.status_code
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+    assert test_db.query(Calculation).count() == 1
+
+    reused = client.post(path, json={"a": 5, "b": 3, "type": "add"}, headers=headers)
+    assert reused.status_code == 422
+
+
+def test_requests_without_key_are_not_deduplicated(test_db, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    client.post("/calculations", json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    client.post("/calculations", json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    assert test_db.query(Calculation).count() == 2
+
+
+@pytest.mark.parametrize("path", ["/calculations", "/calculate"])
+def test_overlong_key_is_rejected_before_calculating(test_db, path, register):
+    client = TestClient(app)
+    headers = {**register(client).headers, "Idempotency-Key": "k" * 256}
+    r = client.post(path, json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    assert r.status_code == 400
+    assert test_db.query(Calculation).count() == 0
+
+    headers["Idempotency-Key"] = "k" * 255
+    assert client.post(path, json={"a": 2, "b": 3, "type": "add"}, headers=headers).status_code in (200, 201)
@@ -0,0 +1,71 @@
+"""Assert the read queries in app/queries.py and app/stats.py use the indexes
+declared on Calculation instead of scanning the table."""
+import pytest
+from sqlalchemy import select, text
+
+from app.database import Base, engine
+from app.models import Calculation
+from app.queries import CALCULATION_COLUMNS
+from app.stats import aggregate_statement, type_counts_statement
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+def _plan(stmt) -> str:
+    compiled = stmt.compile(dialect=engine.dialect)
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+            return "\n".join(r[-1] for r in rows)
+        if engine.dialect.name == "postgresql":
+            # tiny test tables would otherwise always be sequentially scanned
+            conn.execute(text("SET enable_seqscan = off"))
+            rows = conn.execute(text("EXPLAIN " + str(compiled)), compiled.params).all()
+            return "\n".join(r[0] for r in rows)
+    pytest.skip(f"no plan assertions for {engine.dialect.name}")
+
+
+def _list_stmt():
+    return select(*CALCULATION_COLUMNS).where(Calculation.user_id == 1).order_by(Calculation.id.asc())
+
+
+def _recent_stmt():
+    return select(*CALCULATION_COLUMNS).where(Calculation.user_id == 1).order_by(Calculation.id.desc()).limit(5)
+
+
+def test_list_uses_user_id_id_index():
+    plan = _plan(_list_stmt())
+    assert "ix_calculations_user_id_id" in plan
+    assert "TEMP B-TREE" not in plan  # ORDER BY id satisfied by the index
+
+
+def test_recent_rows_use_user_id_id_index():
+    plan = _plan(_recent_stmt())
+    assert "ix_calculations_user_id_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_get_by_id_and_user_does_not_scan():
+    stmt = select(*CALCULATION_COLUMNS).where(Calculation.id == 3, Calculation.user_id == 1)
+    plan = _plan(stmt)
+    assert "SCAN calculations" not in plan and "Seq Scan" not in plan
+
+
+def test_stats_aggregates_are_index_only():
+    plan = _plan(aggregate_statement(1))
+    assert "ix_calculations_user_id_type_cover" in plan
+    if engine.dialect.name == "sqlite":
+        assert "COVERING INDEX" in plan
+
+
+def test_type_counts_are_index_only():
+    plan = _plan(type_counts_statement(1))
+    assert "ix_calculations_user_id_type_cover" in plan
+    if engine.dialect.name == "sqlite":
+        assert "COVERING INDEX" in plan
+        assert "TEMP B-TREE" not in plan  # GROUP BY type follows index order
@@ -0,0 +1,50 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import metrics
+from app.main import app
+from app.ratelimit import InMemoryBackend, RateLimiter, RateLimitMiddleware, Rate, parse_route_rates
+
+
+def _limited_client(**limits):
+    return TestClient(RateLimitMiddleware(app, RateLimiter(InMemoryBackend(), **limits)))
+
+
+def test_login_is_limited_per_ip(test_db):
+    client = _limited_client(routes=parse_route_rates("POST /users/login=3/60"))
+    before = metrics.counter_value("rate_limit_rejected_total", limit="route")
+    for _ in range(3):
+        r = client.post("/users/login", json={"username_or_email": "nobody", "password": "wrong"})
+        assert r.status_code == 401
+
+    r = client.post("/users/login", json={"username_or_email": "nobody", "password": "wrong"})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) == 20
+    assert metrics.counter_value("rate_limit_rejected_total", limit="route") == before + 1
+    # other routes are unaffected
+    assert client.get("/metrics").status_code == 200
+
+
+def test_user_bucket_follows_the_token(register):
+    client = _limited_client(per_user=Rate.parse("2/60"))
+    headers = register(client).headers
+
+    assert client.get("/calculations", headers=headers).status_code == 200
+    assert client.get("/calculations", headers=headers).status_code == 200
+    assert client.get("/calculations", headers=headers).status_code == 429
+    # anonymous requests from the same address are not charged to the user
+    assert client.get("/").status_code in (200, 307)
+
+
+def test_concurrency_cap_rejects_extra_in_flight_requests(register):
+    backend = InMemoryBackend()
+    limiter = RateLimiter(backend, max_concurrent_per_user=1)
+    client = TestClient(RateLimitMiddleware(app, limiter))
+    user = register(client)
+
+    asyncio.run(backend.acquire(f"user:{user.id}", 1))  # simulate a request in flight
+    r = client.get("/calculations", headers=user.headers)
+    assert r.status_code == 429
+    asyncio.run(backend.release(f"user:{user.id}"))
+    assert client.get("/calculations", headers=user.headers).status_code == 200
@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.cache import UserReadCache
+from app.database import engine, user_write_listeners
+from app.models import Calculation
+from app.versions import bump_data_version
+
+
+@pytest.fixture(autouse=True)
+def read_cache(monkeypatch):
+    cache = UserReadCache(ttl_seconds=60)
+    monkeypatch.setattr(main, "read_cache", cache)
+    user_write_listeners.append(cache.invalidate_user)
+    yield cache
+    user_write_listeners.remove(cache.invalidate_user)
+
+
+def test_concurrent_stats_requests_share_one_computation(register, monkeypatch):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    calls = []
+    real = main.compute_stats
+
+    def slow_stats(*args, **kwargs):
+        calls.append(1)
+        time.sleep(0.2)
+        return real(*args, **kwargs)
+
+    monkeypatch.setattr(main, "compute_stats", slow_stats)
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(client.get("/calculations/stats", headers=headers).status_code)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 4
+    assert len(calls) == 1
+
+
+def test_writes_invalidate_cached_reads(register):
+    client = TestClient(main.app)
+    headers = register(client).headers
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 0
+    assert client.get("/calculations", headers=headers).json() == []
+
+    created = client.post("/calculations", json={"a": 1, "b": 2, "type": "add"}, headers=headers).json()
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 1
+    assert [c["id"] for c in client.get("/calculations", headers=headers).json()] == [created["id"]]
+
+    client.delete(f"/calculations/{created['id']}", headers=headers)
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 0
+
+
+@pytest.mark.parametrize("path", ["/calculations", "/calculations/stats"])
+def test_write_from_another_worker_is_not_served_from_cache(register, path):
+    client = TestClient(main.app)
+    user_id, _, headers = register(client)
+    first = client.get(path, headers=headers)
+
+    # another process writes: the version moves, this worker's cache is not told
+    with engine.begin() as conn:
+        conn.execute(Calculation.__table__.insert().values(user_id=user_id, a=1, b=2, type="add", result=3))
+    bump_data_version(user_id)
+
+    r = client.get(path, headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != first.headers["ETag"]
+    assert len(r.json()) == 1 if path == "/calculations" else r.json()["total"] == 1
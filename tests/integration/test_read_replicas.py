@@ -0,0 +1,69 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+import app.database as database
+from app.database import Base, engine, notify_user_write, user_write_listeners
+from app.main import app
+from app.replicas import ReplicaRouter
+from app.versions import bump_data_version, etag_for, get_data_version
+
+
+@pytest.fixture
+def replica_router(test_db, tmp_path, monkeypatch):
+    """Route reads to an empty SQLite replica so we can tell where they went."""
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=replica)
+    router = ReplicaRouter(engine, [replica], sticky_seconds=60)
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.setattr(database, "user_write_listeners", [router.mark_written])
+    yield router
+    replica.dispose()
+
+
+def test_reads_after_write_stay_on_primary(replica_router, register):
+    client = TestClient(app)
+    user = register(client)
+    headers = user.headers
+
+    # registration wrote the user and session on the primary -> pinned
+    assert replica_router.is_pinned(user.id)
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    # once the pin expires the read goes to the (empty) replica; the missing
+    # session is found on the primary instead of failing with 401
+    replica_router._pinned.clear()
+    assert replica_router.engine_for_read(user.id) is not engine
+    assert client.get("/users/me", headers=headers).status_code == 200
+    assert client.get("/calculations", headers=headers).status_code == 200
+
+    # a session revoked on the primary is still rejected
+    assert client.post("/users/logout", headers=headers).status_code == 200
+    replica_router._pinned.clear()
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_etag_follows_the_replica_the_body_came_from(replica_router, register):
+    client = TestClient(app)
+    user = register(client)
+    headers = user.headers
+    bump_data_version(user.id)  # a write the (empty) replica has not seen
+    replica_router._pinned.clear()
+
+    r = client.get("/calculations", headers=headers)
+    assert r.json() == []
+    assert r.headers["ETag"] == etag_for("calculations", user.id, 0)
+    assert r.headers["ETag"] != etag_for("calculations", user.id, get_data_version(user.id))
+
+
+def test_commit_notifies_user_write_listeners(register):
+    seen = []
+    user_write_listeners.append(seen.append)
+    try:
+        client = TestClient(app)
+        user = register(client)
+        notify_user_write(-1)
+    finally:
+        user_write_listeners.remove(seen.append)
+    assert user.id in seen
+    assert seen[-1] == -1
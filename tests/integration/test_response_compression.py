@@ -0,0 +1,46 @@
+import gzip
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+def _client_with_calculations(register, n):
+    client = TestClient(app)
+    client.headers.update(register(client).headers)
+    for i in range(n):
+        client.post("/calculations", json={"a": i, "b": 3, "type": "multiply"})
+    return client
+
+
+def test_large_lists_are_compressed_and_revalidate(register):
+    client = _client_with_calculations(register, 30)
+    r = client.get("/calculations", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["Vary"] == "Accept-Encoding"
+    assert r.headers["ETag"].startswith("W/")
+    assert len(r.json()) == 30
+
+    # the weak ETag still matches
+    again = client.get("/calculations", headers={"Accept-Encoding": "gzip", "If-None-Match": r.headers["ETag"]})
+    assert again.status_code == 304
+
+    plain = client.get("/calculations", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert plain.json() == r.json()
+
+
+def test_small_responses_are_not_compressed(register):
+    client = _client_with_calculations(register, 1)
+    r = client.get("/calculations", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in r.headers
+
+
+def test_export_stream_is_compressed(register):
+    client = _client_with_calculations(register, 3)
+    with client.stream("GET", "/calculations/export", headers={"Accept-Encoding": "gzip"}) as r:
+        assert r.headers["Content-Encoding"] == "gzip"
+        raw = b"".join(r.iter_raw())
+    rows = [json.loads(line) for line in gzip.decompress(raw).splitlines()]
+    assert [row["a"] for row in rows] == [0, 1, 2]
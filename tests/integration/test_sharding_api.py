@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+
+import app.sharding as sharding
+from app.database import engine
+from app.main import app
+from app.models import Calculation
+from app.sharding import ShardRouter, insert_calculations
+
+
+@pytest.fixture
+def router(test_db, tmp_path, monkeypatch):
+    engines = {
+        name: create_engine(f"sqlite:///{tmp_path / (name + '.db')}", connect_args={"check_same_thread": False})
+        for name in ("s0", "s1")
+    }
+    router = ShardRouter(engines)
+    router.create_tables()
+    monkeypatch.setattr(sharding, "shard_router", router)
+    yield router
+    for e in engines.values():
+        e.dispose()
+
+
+def _count(eng, user_id):
+    with eng.connect() as conn:
+        return conn.execute(select(func.count(Calculation.id)).where(Calculation.user_id == user_id)).scalar()
+
+
+def test_bread_routes_through_user_shard(router, register):
+    client = TestClient(app)
+    user_id, _, headers = register(client)
+    home = router.engine_for_user(user_id)
+
+    r = client.post("/calculations", json={"a": 2, "b": 3, "type": "multiply"}, headers=headers)
+    assert r.status_code == 201
+    calc_id = r.json()["id"]
+    assert client.post("/calculate", json={"a": 1, "b": 1, "type": "add"}, headers=headers).status_code == 200
+    assert _count(home, user_id) == 2
+    assert _count(engine, user_id) == 0
+
+    assert len(client.get("/calculations", headers=headers).json()) == 2
+    assert client.get(f"/calculations/{calc_id}", headers=headers).json()["result"] == 6
+    assert client.get("/calculations/stats", headers=headers).json()["total"] == 2
+
+    r = client.put(f"/calculations/{calc_id}", json={"a": 2, "b": 5, "type": "multiply"}, headers=headers)
+    assert r.json()["result"] == 10
+    assert client.delete(f"/calculations/{calc_id}", headers=headers).status_code == 200
+    assert _count(home, user_id) == 1
+
+
+def test_insert_calculations_batches_to_shards(router):
+    rows = [{"a": 1.0, "b": 1.0, "type": "add", "result": 2.0, "user_id": uid} for uid in (101, 102, 103, 104)]
+    assert insert_calculations(rows) == 4
+    for uid in (101, 102, 103, 104):
+        assert _count(router.engine_for_user(uid), uid) == 1
+    assert all(isinstance(row["id"], int) for row in rows)
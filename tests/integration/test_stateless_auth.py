@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.revocation as revocation
+from app.main import app
+from app.models import SessionToken
+
+
+@pytest.fixture
+def stateless(test_db, monkeypatch):
+    monkeypatch.setattr(revocation, "STATELESS_AUTH", True)
+    monkeypatch.setattr(revocation, "revocation_filter", revocation.RevocationFilter(revocation._default_session_factory))
+
+
+def test_stateless_mode_does_not_need_the_session_row(stateless, test_db, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    test_db.query(SessionToken).delete()
+    test_db.commit()
+
+    r = client.post("/calculations", json={"a": 2, "b": 3, "type": "add"}, headers=headers)
+    assert r.status_code == 201
+    assert client.get("/calculations", headers=headers).status_code == 200
+
+
+def test_logout_revokes_token(stateless, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    assert client.get("/calculations", headers=headers).status_code == 200
+
+    assert client.post("/users/logout", headers=headers).status_code == 200
+    assert client.get("/calculations", headers=headers).status_code == 401
+
+
+def test_filter_false_positive_is_confirmed_against_database(stateless, monkeypatch, register):
+    client = TestClient(app)
+    headers = register(client).headers
+    monkeypatch.setattr(revocation.revocation_filter, "might_be_revoked", lambda jti: True)
+    assert client.get("/calculations", headers=headers).status_code == 200
+
+
+def test_logout_in_session_mode_ends_session(register):
+    client = TestClient(app)
+    headers = register(client).headers
+    assert client.post("/users/logout", headers=headers).status_code == 200
+    assert client.get("/calculations", headers=headers).status_code == 401
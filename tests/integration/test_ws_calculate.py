@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import app.ws as ws
+from app.events import event_broker
+from app.main import app
+from app.writer import calculation_writer
+from app.models import Calculation
+
+
+def test_pipelined_calculations_are_answered_and_persisted(test_db, register):
+    with TestClient(app) as client:
+        user = register(client)
+        headers = user.headers
+        with client.websocket_connect("/ws/calculate", headers=headers) as ws:
+            assert ws.receive_json()["event"] == "ready"
+            ws.send_json({"id": "one", "a": 2, "b": 3, "type": "add"})
+            ws.send_json([
+                {"id": 1, "a": 6, "b": 3, "type": "divide"},
+                {"id": 2, "a": 1, "b": 0, "type": "divide"},
+                {"id": 3, "a": 1, "b": 2, "type": "nope"},
+            ])
+            assert ws.receive_json() == {"id": "one", "a": 2.0, "b": 3.0, "type": "add", "result": 5.0}
+            batch = ws.receive_json()
+            assert [r["id"] for r in batch] == [1, 2, 3]
+            assert batch[0]["result"] == 2.0
+            assert "divide by zero" in batch[1]["error"]
+            assert batch[2]["error"].startswith("type:")
+            ws.send_text("not json")
+            assert ws.receive_json() == {"id": None, "error": "Message is not valid JSON"}
+    # leaving the client runs shutdown, which drains the batch writer
+
+    rows = test_db.query(Calculation).filter(Calculation.user_id == user.id).order_by(Calculation.result).all()
+    assert [r.result for r in rows] == [2.0, 5.0]
+    # and announced on the user's event stream
+    # (the broker outlives the test database, so only look at the newest events)
+    events = [event for _, event in event_broker._buffers[user.id]][-len(rows):]
+    assert {event.type for event in events} == {"created"}
+    assert sorted((json.loads(e.data)["id"], json.loads(e.data)["result"]) for e in events) == sorted((r.id, r.result) for r in rows)
+
+
+def test_token_query_parameter_is_accepted(register):
+    with TestClient(app) as client:
+        user = register(client)
+        with client.websocket_connect(f"/ws/calculate?token={user.token}") as ws:
+            assert ws.receive_json()["event"] == "ready"
+
+
+def test_unauthenticated_connection_is_refused(test_db):
+    client = TestClient(app)
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/ws/calculate") as ws:
+            ws.receive_json()
+    assert exc.value.code == 1008
+
+
+def test_decimal_mode_and_saved_preference(test_db, register):
+    with TestClient(app) as client:
+        user = register(client)
+        headers = user.headers
+        client.put("/users/me", json={"numeric_mode": "decimal", "decimal_precision": 10}, headers=headers)
+        with client.websocket_connect("/ws/calculate", headers=headers) as ws:
+            assert ws.receive_json()["event"] == "ready"
+            ws.send_json([
+                {"id": 1, "a": "0.1", "b": "0.2", "type": "add"},
+                {"id": 2, "a": 1, "b": 3, "type": "divide", "precision": 5},
+                {"id": 3, "a": 0.1, "b": 0.2, "type": "add", "mode": "float"},
+            ])
+            batch = ws.receive_json()
+            assert batch[0]["result_exact"] == "0.3" and batch[0]["precision"] == 10
+            assert batch[1]["result_exact"] == "0.33333"
+            assert batch[2]["result"] == 0.1 + 0.2 and "result_exact" not in batch[2]
+
+    rows = test_db.query(Calculation).filter(Calculation.user_id == user.id).order_by(Calculation.id).all()
+    assert [(r.precision, r.result_exact and str(r.result_exact)) for r in rows] == [(10, "0.3"), (5, "0.33333"), (None, None)]
+
+
+def test_decimal_calculations_do_not_block_the_event_loop(monkeypatch):
+    def slow_calculation(a, b, operation, context=None):
+        time.sleep(0.2)
+        return a + b
+
+    class Writer:
+        async def submit(self, row, on_failure=None):
+            pass
+
+    monkeypatch.setattr(ws, "run_calculation", slow_calculation)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        reply = await ws.evaluate_item({"id": 1, "a": "1", "b": "2", "type": "add", "mode": "decimal"}, 1, Writer())
+        task.cancel()
+        assert reply["result_exact"] == 3
+        return ticks
+
+    assert asyncio.run(scenario()) >= 5
+
+
+def test_unsaved_calculations_are_reported(register, monkeypatch):
+    def failing_flush(rows):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(calculation_writer, "flush", failing_flush)
+    monkeypatch.setattr(calculation_writer, "retry_attempts", 1)
+    monkeypatch.setattr(calculation_writer, "retry_backoff", 0)
+    with TestClient(app) as client:
+        user = register(client)
+        with client.websocket_connect("/ws/calculate", headers=user.headers) as ws:
+            assert ws.receive_json()["event"] == "ready"
+            ws.send_json({"id": 7, "a": 2, "b": 3, "type": "add"})
+            assert ws.receive_json()["result"] == 5.0
+            assert ws.receive_json() == {"id": 7, "error": "Calculation could not be saved", "code": "not_saved"}
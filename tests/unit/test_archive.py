@@ -0,0 +1,124 @@
+import json
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import app.archive as archive
+from app.archive import (
+    add_months,
+    archive_old_calculations,
+    archived_user_summary,
+    create_month_partition_sql,
+    iter_archived_rows,
+    partitioned_table_sql,
+    retention_cutoff,
+)
+from app.database import Base
+from app.models import Calculation, User
+from app.stats import compute_stats
+
+
+@pytest.fixture
+def history_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(bind=engine)
+    rows = []
+    for month, count in ((1, 3), (2, 2), (6, 4)):
+        for i in range(count):
+            rows.append({"a": 2.0, "b": float(i), "type": "add", "result": 2.0 + i,
+                         "timestamp": datetime(2024, month, 10, 12, i), "user_id": 1})
+    rows.append({"a": 9.0, "b": 1.0, "type": "divide", "result": 9.0,
+                 "timestamp": datetime(2024, 1, 20), "user_id": 2})
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "username": "u1", "email": "u1@example.com", "password_hash": "x", "created_at": datetime(2024, 1, 1)},
+                                    {"id": 2, "username": "u2", "email": "u2@example.com", "password_hash": "x", "created_at": datetime(2024, 1, 1)}])
+        conn.execute(insert(Calculation), rows)
+    yield engine
+    engine.dispose()
+
+
+def test_month_helpers():
+    assert add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert retention_cutoff(datetime(2024, 7, 15), 3) == datetime(2024, 4, 1)
+
+
+def test_partition_sql():
+    sql = create_month_partition_sql(date(2024, 12, 1))
+    assert "calculations_y2024m12 PARTITION OF calculations" in sql
+    assert "FROM ('2024-12-01') TO ('2025-01-01')" in sql
+
+
+def test_partitioned_table_sql_skips_user_fk_on_shards():
+    assert any("REFERENCES users" in sql for sql in partitioned_table_sql())
+    assert not any("REFERENCES users" in sql for sql in partitioned_table_sql(with_user_fk=False))
+
+
+def test_archive_moves_old_months_to_files(history_engine, tmp_path):
+    out = tmp_path / "archive"
+    archived = archive_old_calculations(history_engine, out, retention_months=3, now=datetime(2024, 7, 1))
+    assert archived == {"2024-01": 4, "2024-02": 2}
+    with history_engine.connect() as conn:
+        assert conn.execute(select(func.count(Calculation.id))).scalar() == 4
+
+    summaries = sorted(out.glob("*.summary.json"))
+    assert len(summaries) == 2
+    assert json.loads(summaries[0].read_text())["users"]["2"]["counts"] == {"divide": 1}
+
+    rows = list(iter_archived_rows(1, out))
+    assert len(rows) == 5
+    assert rows[0]["timestamp"] == "2024-01-10T12:00:00"
+    summary = archived_user_summary(1, out)
+    assert summary["count"] == 5 and summary["sum_a"] == 10.0
+
+    # nothing left to archive on a second run
+    assert archive_old_calculations(history_engine, out, retention_months=3, now=datetime(2024, 7, 1)) == {}
+
+
+def test_stats_merge_archived_rows(history_engine, tmp_path, monkeypatch):
+    out = tmp_path / "archive"
+    db = sessionmaker(bind=history_engine)()
+    before = compute_stats(db, 1)
+    archive_old_calculations(history_engine, out, retention_months=3, now=datetime(2024, 7, 1))
+    monkeypatch.setattr(archive, "CALCULATION_ARCHIVE_DIR", str(out))
+    after = compute_stats(db, 1)
+    db.close()
+    assert after["total"] == before["total"] == 9
+    assert after["avg_b"] == pytest.approx(before["avg_b"])
+    assert after["counts"] == before["counts"]
+    assert compute_stats(sessionmaker(bind=history_engine)(), 1, include_archived=False)["total"] == 4
+
+
+def test_failed_delete_leaves_no_archive_files(history_engine, tmp_path, monkeypatch):
+    out = tmp_path / "archive"
+
+    def failing_delete(table):
+        raise RuntimeError("delete failed")
+
+    monkeypatch.setattr(archive, "delete", failing_delete)
+    with pytest.raises(RuntimeError):
+        archive_old_calculations(history_engine, out, retention_months=3, now=datetime(2024, 7, 1))
+    assert list(out.iterdir()) == []
+    with history_engine.connect() as conn:
+        assert conn.execute(select(func.count(Calculation.id))).scalar() == 10
+
+
+def test_interrupted_runs_are_recovered(history_engine, tmp_path, monkeypatch):
+    out = tmp_path / "archive"
+    # stopped after the commit, before the month files were published
+    monkeypatch.setattr(archive, "_promote", lambda path: None)
+    archive_old_calculations(history_engine, out, retention_months=3, now=datetime(2024, 7, 1))
+    assert archived_user_summary(1, out)["count"] == 0
+    monkeypatch.undo()
+
+    # files of a run whose delete never committed, for rows still live
+    with history_engine.connect() as conn:
+        rows = [archive._archive_row(r) for r in conn.execute(select(*Calculation.__table__.c).where(Calculation.timestamp >= datetime(2024, 6, 1)))]
+    archive._write_month(out, date(2024, 6, 1), "stale", rows, "ndjson")
+
+    assert archive_old_calculations(history_engine, out, retention_months=0, now=datetime(2024, 7, 1)) == {"2024-06": 4}
+    assert not list(out.glob("*.pending"))
+    assert archived_user_summary(1, out)["count"] == 9
+    assert len(list(iter_archived_rows(1, out))) == 9
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from app.cache import SingleFlight, UserReadCache
+
+
+def _run_concurrently(fn, n=5):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_single_flight_shares_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return len(calls)
+
+    assert _run_concurrently(lambda: flight.do("k", slow)) == [1] * 5
+    assert len(calls) == 1
+    # once finished, the next call runs again
+    assert flight.do("k", slow) == 2
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.do("k", lambda: 1) == 1
+
+
+def test_results_expire_after_ttl():
+    now = [0.0]
+    cache = UserReadCache(ttl_seconds=2, clock=lambda: now[0])
+    calls = []
+    compute = lambda: calls.append(1) or len(calls)
+    assert cache.get_or_compute(1, "stats", (), compute) == 1
+    assert cache.get_or_compute(1, "stats", (), compute) == 1
+    assert cache.get_or_compute(1, "stats", (5,), compute) == 2
+    now[0] = 2.0
+    assert cache.get_or_compute(1, "stats", (), compute) == 3
+
+
+def test_write_invalidates_only_that_user():
+    cache = UserReadCache(ttl_seconds=60)
+    cache.get_or_compute(1, "stats", (), lambda: "old-1")
+    cache.get_or_compute(2, "stats", (), lambda: "old-2")
+    cache.invalidate_user(1)
+    assert cache.get_or_compute(1, "stats", (), lambda: "new-1") == "new-1"
+    assert cache.get_or_compute(2, "stats", (), lambda: "new-2") == "old-2"
+
+
+def test_result_computed_across_a_write_is_not_cached():
+    cache = UserReadCache(ttl_seconds=60)
+
+    def compute_while_user_writes():
+        cache.invalidate_user(1)
+        return "stale"
+
+    assert cache.get_or_compute(1, "stats", (), compute_while_user_writes) == "stale"
+    assert cache.get_or_compute(1, "stats", (), lambda: "fresh") == "fresh"
@@ -0,0 +1,71 @@
+import asyncio
+
+from app.events import InProcessBroker
+
+
+async def _take(stream, n):
+    return [await stream.__anext__() for _ in range(n)]
+
+
+def test_events_fan_out_to_that_users_subscribers():
+    async def scenario():
+        broker = InProcessBroker()
+        first, second, other = broker.listen(1), broker.listen(1), broker.listen(2, heartbeat=0.01)
+        # start the generators so they subscribe
+        pending = [asyncio.ensure_future(s.__anext__()) for s in (first, second)]
+        await asyncio.sleep(0)
+        broker.publish(1, "created", '{"id":1}')
+        events = await asyncio.gather(*pending)
+        assert [e.type for e in events] == ["created", "created"]
+        assert await other.__anext__() is None  # heartbeat, nothing for user 2
+        assert broker.subscriber_count() == 3
+        for s in (first, second, other):
+            await s.aclose()
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_resume_replays_missed_events():
+    async def scenario():
+        broker = InProcessBroker()
+        broker.publish(1, "created", '{"id":1}')
+        broker.publish(2, "created", '{"id":9}')
+        broker.publish(1, "updated", '{"id":1}')
+        broker.publish(1, "deleted", '{"id":1}')
+        first_id = broker._buffers[1][0][1].id
+
+        stream = broker.listen(1, last_event_id=first_id)
+        events = await _take(stream, 2)
+        assert [e.type for e in events] == ["updated", "deleted"]
+        await stream.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_resume_that_cannot_be_filled_gets_reset():
+    async def scenario():
+        broker = InProcessBroker(replay_size=2)
+        for i in range(4):
+            broker.publish(1, "created", f'{{"id":{i}}}')
+        oldest = f"{broker.epoch}-1"
+        assert [e.type async for e in broker.listen(1, last_event_id=oldest)] == ["reset"]
+        assert [e.type async for e in broker.listen(1, last_event_id="otherepoch-3")] == ["reset"]
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_is_reset_instead_of_buffering():
+    async def scenario():
+        broker = InProcessBroker(queue_size=2)
+        stream = broker.listen(1)
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        for i in range(5):
+            broker.publish(1, "created", f'{{"id":{i}}}')
+        await asyncio.sleep(0)
+        events = [await pending] + [e async for e in stream]
+        assert [e.type for e in events] == ["created", "created", "reset"]
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(scenario())
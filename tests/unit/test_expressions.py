@@ -0,0 +1,118 @@
+import pytest
+
+from app import expressions
+from app.expressions import ExpressionError, compile_expression, normalize, parse_infix, parse_json_ast
+from app.limits import CalculationError
+from app.schemas import OperationType
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 + 2 * 3", 7.0),
+    ("(1 + 2) * 3", 9.0),
+    ("2 ** 3 ** 2", 512.0),
+    ("-2 ** 2", -4.0),
+    ("10 - 4 - 3", 3.0),
+    ("7 % 4 * 2", 6.0),
+    ("-(1 + 2)", -3.0),
+    ("1.5e1 / .5", 30.0),
+])
+def test_precedence_matches_python(text, expected):
+    assert compile_expression(text).evaluate() == expected
+
+
+def test_json_ast_and_text_share_normalized_form():
+    ast = {"op": "multiply", "left": {"op": "add", "left": 2, "right": 3}, "right": {"var": "x"}}
+    compiled = compile_expression(ast)
+    assert compiled.text == "((2.0 + 3.0) * x)"
+    assert compiled is compile_expression("(2+3)*x")
+    assert compiled.variables == ("x",)
+    assert compiled.evaluate({"x": 4}) == 20.0
+
+
+def test_steps_record_every_operation_in_order():
+    steps = []
+    assert compile_expression("(2 + 3) * 4").evaluate(steps=steps) == 20.0
+    assert steps == [(OperationType.ADD, 2.0, 3.0, 5.0), (OperationType.MULTIPLY, 5.0, 4.0, 20.0)]
+
+
+def test_unary_minus_on_expression_subtracts_from_zero():
+    assert normalize(parse_infix("-x")) == "(0.0 - x)"
+    assert normalize(parse_infix("- 3")) == "-3.0"
+
+
+@pytest.mark.parametrize("text", ["", "1 +", "(1 + 2", "1 2", "2 $ 3", "* 3", "()"])
+def test_syntax_errors(text):
+    with pytest.raises(ExpressionError):
+        parse_infix(text)
+
+
+def test_error_reports_position():
+    with pytest.raises(ExpressionError) as exc:
+        parse_infix("1 + 2 )")
+    assert exc.value.position == 6
+
+
+@pytest.mark.parametrize("node", [True, "1", {"op": "pow", "left": 1, "right": 2}, {"var": "1x"}, {"op": "add", "left": 1}])
+def test_invalid_json_nodes(node):
+    with pytest.raises(ExpressionError):
+        parse_json_ast(node)
+
+
+def test_limits(monkeypatch):
+    monkeypatch.setattr(expressions, "EXPRESSION_MAX_OPERATIONS", 3)
+    monkeypatch.setattr(expressions, "EXPRESSION_MAX_DEPTH", 2)
+    with pytest.raises(ExpressionError, match="operations"):
+        expressions._Parser("1 + 1 + 1 + 1 + 1").parse()
+    with pytest.raises(ExpressionError, match="deeper"):
+        expressions._Parser("(((1)))").parse()
+    with pytest.raises(ExpressionError, match="deeper"):
+        parse_json_ast({"op": "add", "left": 1, "right": {"op": "add", "left": 1, "right": {"op": "add", "left": 1, "right": 1}}})
+
+
+def test_long_sign_runs_do_not_recurse():
+    assert compile_expression("-" * 2000 + "1").evaluate() == 1.0
+    assert compile_expression("-" * 2001 + "x").evaluate({"x": 2}) == -2.0
+    assert parse_infix("- + - 2") == ("num", 2.0)
+
+
+def test_evaluation_errors():
+    with pytest.raises(ZeroDivisionError):
+        compile_expression("1 / (2 - 2)").evaluate()
+    with pytest.raises(ExpressionError, match="Missing value for y"):
+        compile_expression("y + 1").evaluate({})
+    with pytest.raises(CalculationError) as exc:
+        compile_expression("(0 - 8) ** 0.5").evaluate()
+    assert exc.value.code == "not_a_number"
+    with pytest.raises(CalculationError) as exc:
+        compile_expression("1e308 * 10").evaluate()
+    assert exc.value.code == "overflow"
+
+
+def test_evaluate_columns_matches_row_by_row():
+    compiled = compile_expression("(x * y) + z ** 2")
+    columns = {"x": [1.0, 2.0, -3.0], "y": [4.0, 0.5, 2.0], "z": [0.0, 1.0, 3.0]}
+    results, errors = compiled.evaluate_columns(columns)
+    expected = [compiled.evaluate({name: values[i] for name, values in columns.items()}) for i in range(3)]
+    assert results == expected
+    assert errors == {}
+
+
+def test_evaluate_columns_isolates_failing_rows():
+    results, errors = compile_expression("1 / x + (x - 2) ** 0.5").evaluate_columns({"x": [0.0, 1.0, 6.0]})
+    assert results == [None, None, 2.1666666666666665]
+    assert errors == {0: "Cannot divide by zero", 1: "-1.0 ** 0.5 is not a real number"}
+
+    results, errors = compile_expression("x * 1e308 * 10").evaluate_columns({"x": [0.0, 1.0]})
+    assert results == [0.0, None]
+    assert errors == {1: "Result is too large"}
+
+
+def test_evaluate_columns_validates_bindings():
+    compiled = compile_expression("x + y")
+    with pytest.raises(ExpressionError, match="Missing values for y"):
+        compiled.evaluate_columns({"x": [1.0]})
+    with pytest.raises(ExpressionError, match="Unknown variables w"):
+        compiled.evaluate_columns({"x": [1.0], "y": [1.0], "w": [1.0]})
+    with pytest.raises(ExpressionError, match="same length"):
+        compiled.evaluate_columns({"x": [1.0, 2.0], "y": [1.0]})
+    assert compile_expression("2 * x + 3 * 4").evaluate_columns({"x": []}) == ([], {})
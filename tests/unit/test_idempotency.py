@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+
+from app.database import Base
+from app.idempotency import IdempotencyStore
+from app.serialization import FastJSONResponse
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idem.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def _handler(calls, status_code=201, delay=0.0):
+    def handler():
+        calls.append(1)
+        time.sleep(delay)
+        return FastJSONResponse({"n": len(calls)}, status_code=status_code)
+    return handler
+
+
+def test_second_call_replays_first_response(engine):
+    store = IdempotencyStore(engine)
+    calls = []
+    first = store.run(1, "k", "h", _handler(calls))
+    second = store.run(1, "k", "h", _handler(calls))
+    assert len(calls) == 1
+    assert second.body == first.body and second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+
+
+def test_database_serves_other_workers(engine):
+    calls = []
+    IdempotencyStore(engine).run(1, "k", "h", _handler(calls))
+    replay = IdempotencyStore(engine).run(1, "k", "h", _handler(calls))
+    assert len(calls) == 1
+    assert replay.body == b'{"n":1}'
+
+
+def test_key_reused_with_different_request_is_rejected(engine):
+    store = IdempotencyStore(engine)
+    store.run(1, "k", "h", _handler([]))
+    with pytest.raises(HTTPException) as exc:
+        store.run(1, "k", "other", _handler([]))
+    assert exc.value.status_code == 422
+    # keys are scoped per user
+    assert store.run(2, "k", "other", _handler([])).status_code == 201
+
+
+def test_errors_are_not_stored(engine):
+    store = IdempotencyStore(engine)
+    calls = []
+    store.run(1, "k", "h", _handler(calls, status_code=400))
+    store.run(1, "k", "h", _handler(calls))
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_recomputed(engine):
+    now = [1_000_000.0]
+    store = IdempotencyStore(engine, ttl_seconds=60, clock=lambda: now[0])
+    calls = []
+    store.run(1, "k", "h", _handler(calls))
+    now[0] += 61
+    store.run(1, "k", "h", _handler(calls))
+    assert len(calls) == 2
+    assert store.purge_expired() == 0
+
+
+def test_concurrent_duplicates_run_once(engine):
+    store = IdempotencyStore(engine)
+    calls = []
+    responses = []
+    threads = [
+        threading.Thread(target=lambda: responses.append(store.run(1, "k", "h", _handler(calls, delay=0.1))))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert {r.body for r in responses} == {b'{"n":1}'}
+
+
+def test_concurrent_duplicates_on_different_workers_run_once(engine):
+    workers = [IdempotencyStore(engine, poll_seconds=0.01) for _ in range(3)]
+    calls = []
+    responses = []
+    threads = [
+        threading.Thread(target=lambda s=store: responses.append(s.run(1, "k", "h", _handler(calls, delay=0.1))))
+        for store in workers
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert {r.body for r in responses} == {b'{"n":1}'}
+
+
+def test_abandoned_claim_is_taken_over(engine):
+    now = [1_000_000.0]
+    crashed = IdempotencyStore(engine, wait_seconds=30, clock=lambda: now[0])
+    assert crashed._claim(1, "k", "h")  # then the worker dies
+
+    other = IdempotencyStore(engine, wait_seconds=30, clock=lambda: now[0])
+    assert not other._claim(1, "k", "h")
+    now[0] += 31
+    calls = []
+    assert other.run(1, "k", "h", _handler(calls)).status_code == 201
+    assert len(calls) == 1
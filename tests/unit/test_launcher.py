@@ -0,0 +1,75 @@
+import pytest
+
+from app import launcher
+from app.database import engine
+
+
+def test_cgroup_v2_quota(tmp_path):
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert launcher.cgroup_cpu_limit(str(tmp_path)) == 1.5
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert launcher.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_cgroup_v1_quota(tmp_path):
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert launcher.cgroup_cpu_limit(str(tmp_path)) == 2
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert launcher.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+def test_no_cgroup(tmp_path):
+    assert launcher.cgroup_cpu_limit(str(tmp_path)) is None
+
+
+@pytest.mark.parametrize("quota, cpus, expected", [("50000 100000", 8, 1), ("250000 100000", 8, 3), ("max 100000", 4, 4), ("800000 100000", 2, 2)])
+def test_available_cpus_is_capped_by_quota(tmp_path, monkeypatch, quota, cpus, expected):
+    (tmp_path / "cpu.max").write_text(quota)
+    monkeypatch.setattr(launcher.os, "sched_getaffinity", lambda pid: set(range(cpus)))
+    assert launcher.available_cpus(str(tmp_path)) == expected
+
+
+@pytest.fixture
+def shared_backends(monkeypatch):
+    monkeypatch.setenv("EVENT_BROKER_URL", "redis://broker")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND_URL", "redis://limits")
+    monkeypatch.delenv("DATABASE_REPLICA_URLS", raising=False)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setattr(launcher, "available_cpus", lambda: 4)
+
+
+def test_web_concurrency_overrides(shared_backends, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "5")
+    assert launcher.default_workers() == 5
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert launcher.default_workers() == 4
+
+
+@pytest.mark.parametrize("unset", launcher.SHARED_BACKEND_SETTINGS)
+def test_single_worker_without_shared_backends(shared_backends, monkeypatch, unset):
+    monkeypatch.delenv(unset)
+    assert launcher.default_workers() == 1
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+    assert launcher.default_workers() == 3
+
+
+def test_single_worker_with_read_replicas(shared_backends, monkeypatch):
+    monkeypatch.setenv("DATABASE_REPLICA_URLS", "postgresql://replica/db")
+    assert launcher.default_workers() == 1
+
+
+def test_after_fork_replaces_pools():
+    pool = engine.pool
+    launcher.after_fork()
+    assert engine.pool is not pool
+
+
+def test_gunicorn_options():
+    options = launcher.gunicorn_options(3)
+    assert options["workers"] == 3
+    assert options["preload_app"] is True
+    assert options["worker_class"] == "app.launcher.UvicornWorker"
+    assert options["max_requests"] == launcher.MAX_REQUESTS
+    assert callable(options["post_fork"])
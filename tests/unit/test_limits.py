@@ -0,0 +1,102 @@
+import time
+from decimal import Decimal
+
+import pytest
+
+from app import workers
+from app.limits import (
+    CALCULATION_INLINE_COST,
+    CALCULATION_MAX_COST,
+    CalculationError,
+    check_cost,
+    check_result,
+    estimate_cost,
+)
+from app.numeric import decimal_context
+from app.schemas import OperationType
+from app.workers import CalculationWorkerPool, run_calculation
+
+
+def test_float_operations_cost_one():
+    for op in OperationType:
+        assert estimate_cost(1e300, 1e300, op) == 1.0
+
+
+def test_decimal_cost_grows_with_precision():
+    low, high = decimal_context(10), decimal_context(1000)
+    assert estimate_cost(Decimal(1), Decimal(2), OperationType.ADD, high) == 1000
+    assert estimate_cost(Decimal(2), Decimal("0.5"), OperationType.EXPONENT, high) > estimate_cost(
+        Decimal(2), Decimal(8), OperationType.EXPONENT, high
+    ) > estimate_cost(Decimal(2), Decimal(8), OperationType.EXPONENT, low)
+
+
+def test_cost_limits_only_apply_above_default_precision():
+    half = Decimal("0.5")
+    assert estimate_cost(Decimal(2), half, OperationType.EXPONENT, decimal_context(100)) < CALCULATION_INLINE_COST
+    assert estimate_cost(Decimal(2), half, OperationType.EXPONENT, decimal_context(1000)) > CALCULATION_INLINE_COST
+    assert estimate_cost(Decimal(2), half, OperationType.EXPONENT, decimal_context(20000)) > CALCULATION_MAX_COST
+
+
+def test_check_cost_rejects_over_budget(monkeypatch):
+    monkeypatch.setattr("app.limits.CALCULATION_MAX_COST", 100.0)
+    with pytest.raises(CalculationError) as exc:
+        check_cost(101.0, OperationType.EXPONENT)
+    assert exc.value.as_detail() == {
+        "code": "too_expensive",
+        "message": "exponent at this precision is too expensive",
+        "estimated_cost": 101.0,
+        "max_cost": 100.0,
+    }
+
+
+@pytest.mark.parametrize("result, code", [
+    (float("inf"), "overflow"),
+    (float("-inf"), "overflow"),
+    (float("nan"), "not_a_number"),
+    (complex(0, 1), "not_a_number"),
+])
+def test_check_result_codes(result, code):
+    with pytest.raises(CalculationError) as exc:
+        check_result(result, OperationType.MULTIPLY, 1.0, 2.0)
+    assert exc.value.code == code
+    assert check_result(2.5, OperationType.MULTIPLY, 1.0, 2.5) == 2.5
+
+
+def test_run_calculation_reports_float_overflow():
+    with pytest.raises(CalculationError) as exc:
+        run_calculation(10.0, 400.0, OperationType.EXPONENT)
+    assert exc.value.code == "overflow"
+    with pytest.raises(CalculationError) as exc:
+        run_calculation(1e308, 10.0, OperationType.MULTIPLY)
+    assert exc.value.code == "overflow"
+    with pytest.raises(CalculationError) as exc:
+        run_calculation(-8.0, 0.5, OperationType.EXPONENT)
+    assert exc.value.code == "not_a_number"
+    assert run_calculation(2.0, 10.0, OperationType.EXPONENT) == 1024.0
+
+
+def test_worker_runs_expensive_decimal_work(monkeypatch):
+    pool = CalculationWorkerPool(size=1, timeout=30)
+    monkeypatch.setattr(workers, "calculation_workers", pool)
+    monkeypatch.setattr(workers, "CALCULATION_INLINE_COST", 0.0)
+    try:
+        context = decimal_context(20)
+        assert run_calculation(Decimal(1), Decimal(3), OperationType.DIVIDE, context) == Decimal("0." + "3" * 20)
+        with pytest.raises(ZeroDivisionError):
+            run_calculation(Decimal(1), Decimal(0), OperationType.DIVIDE, context)
+    finally:
+        pool.shutdown()
+
+
+def test_worker_is_killed_at_timeout_and_replaced():
+    pool = CalculationWorkerPool(size=1, timeout=0.3)
+    try:
+        started = time.monotonic()
+        with pytest.raises(CalculationError) as exc:
+            # seconds of work: a non-integral power at 20000 digits
+            pool.run(Decimal(2), Decimal("0.5"), OperationType.EXPONENT, precision=20000)
+        assert exc.value.code == "timeout"
+        assert time.monotonic() - started < 10
+        assert pool.run(Decimal(2), Decimal(3), OperationType.MULTIPLY, precision=10) == 6
+    finally:
+        pool.shutdown()
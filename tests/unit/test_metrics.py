@@ -0,0 +1,14 @@
+from app import metrics
+
+
+def test_render_counters_and_gauges():
+    metrics.describe("test_things_total", "Things seen")
+    metrics.inc("test_things_total", kind="a")
+    metrics.inc("test_things_total", 2, kind="a")
+    metrics.register_gauge("test_level", lambda: 0.5)
+
+    assert metrics.counter_value("test_things_total", kind="a") == 3
+    text = metrics.render()
+    assert "# HELP test_things_total Things seen" in text
+    assert 'test_things_total{kind="a"} 3' in text
+    assert "# TYPE test_level gauge\ntest_level 0.5" in text
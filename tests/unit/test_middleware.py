@@ -0,0 +1,186 @@
+import asyncio
+import gzip
+import zlib
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app import metrics
+from app.middleware import (
+    COMPRESSORS,
+    CacheControlMiddleware,
+    CompressionMiddleware,
+    MetricsMiddleware,
+    PathPrefixMiddleware,
+    TimingMiddleware,
+)
+
+
+def _app():
+    async def page(request):
+        return PlainTextResponse("x" * 1000)
+
+    return Starlette(routes=[Route("/static/{name}", page), Route("/api", page)])
+
+
+def test_prefix_short_circuits_other_paths():
+    calls = []
+
+    class Recording(PathPrefixMiddleware):
+        async def handle(self, scope, receive, send):
+            calls.append(scope["path"])
+            await self.app(scope, receive, send)
+
+    client = TestClient(Recording(_app(), prefixes=("/static/",)))
+    client.get("/api")
+    client.get("/static/a.html")
+    assert calls == ["/static/a.html"]
+
+
+def test_cache_control_by_suffix():
+    client = TestClient(CacheControlMiddleware(_app(), prefixes=("/static/",), rules=[(".html", "no-store")]))
+    assert client.get("/static/a.html").headers["cache-control"] == "no-store"
+    assert "cache-control" not in client.get("/static/a.css").headers
+    assert "cache-control" not in client.get("/api").headers
+
+
+def test_timing_header():
+    client = TestClient(TimingMiddleware(_app()))
+    name, duration = client.get("/api").headers["server-timing"].split(";dur=")
+    assert name == "app" and float(duration) >= 0
+
+
+def test_metrics_count_by_status():
+    client = TestClient(MetricsMiddleware(_app()))
+    before = metrics.counter_value("http_requests_total", method="GET", status="404")
+    client.get("/missing")
+    assert metrics.counter_value("http_requests_total", method="GET", status="404") == before + 1
+    assert metrics.counter_value("http_request_duration_seconds_total") > 0
+
+
+def test_compression_only_under_prefix():
+    client = TestClient(CompressionMiddleware(_app(), prefixes=("/static/",), minimum_size=500))
+    compressed = client.get("/static/a.css", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == "x" * 1000
+    assert "content-encoding" not in client.get("/api", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/static/a.css", headers={"Accept-Encoding": "identity"}).headers
+
+
+def _json_app():
+    async def items(request):
+        n = int(request.query_params["n"])
+        return JSONResponse([{"id": i, "result": i * 2} for i in range(n)], headers={"ETag": '"v1"'})
+
+    async def export(request):
+        async def rows():
+            for i in range(50):
+                yield f'{{"id": {i}}}\n'
+
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    async def events(request):
+        async def stream():
+            yield "data: 1\n\n" * 500
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async def encoded(request):
+        return Response(gzip.compress(b"x" * 5000), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+    return Starlette(routes=[Route("/items", items), Route("/export", export), Route("/events", events), Route("/encoded", encoded)])
+
+
+def test_compression_threshold_and_negotiation():
+    client = TestClient(CompressionMiddleware(_json_app(), minimum_size=1024, encodings=("zstd", "br", "gzip")))
+    small = client.get("/items?n=2", headers={"Accept-Encoding": "zstd, br, gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+    assert small.headers["etag"] == '"v1"'
+
+    before = metrics.counter_value("http_compressed_responses_total", encoding="gzip")
+    large = client.get("/items?n=500", headers={"Accept-Encoding": "zstd, br, gzip"})
+    assert large.headers["content-encoding"] in COMPRESSORS
+    assert int(large.headers["content-length"]) < len(large.content)
+    assert large.headers["etag"] == 'W/"v1"'
+    assert large.json()[499] == {"id": 499, "result": 998}
+    if large.headers["content-encoding"] == "gzip":
+        assert metrics.counter_value("http_compressed_responses_total", encoding="gzip") == before + 1
+    assert 0 < metrics.render().count("http_compression_ratio")
+
+    assert "content-encoding" not in client.get("/items?n=500", headers={"Accept-Encoding": "gzip;q=0"}).headers
+    assert "content-encoding" not in client.get("/items?n=500", headers={"Accept-Encoding": "gzip;q=0, *"}).headers
+    gzip_only = TestClient(CompressionMiddleware(_json_app(), minimum_size=1024, encodings=("gzip",)))
+    assert gzip_only.get("/items?n=500", headers={"Accept-Encoding": "*"}).headers["content-encoding"] == "gzip"
+    assert "content-encoding" not in client.get("/items?n=500", headers={"Accept-Encoding": "identity"}).headers
+
+
+def _stream(app, path="/export"):
+    sent = []
+
+    async def record(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [(b"accept-encoding", b"gzip")]}
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    asyncio.run(app(scope, receive, record))
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    return [m["body"] for m in sent[1:]]
+
+
+def test_fast_streams_are_compressed_in_large_blocks():
+    bodies = _stream(CompressionMiddleware(_json_app(), minimum_size=1024))
+    # the first chunk goes out at once, the rest together
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(bodies[0]) == b'{"id": 0}\n'
+    assert len(bodies) == 2
+    assert b"".join(decompressor.decompress(b) for b in bodies[1:]).count(b"\n") == 49
+
+
+def test_streams_are_flushed_by_size_and_time():
+    bodies = _stream(CompressionMiddleware(_json_app(), minimum_size=1024, flush_size=100))
+    assert 4 < len(bodies) < 50
+
+    def slow_app():
+        async def export(request):
+            async def rows():
+                for i in range(3):
+                    await asyncio.sleep(0.05)
+                    yield f'{{"id": {i}}}\n'
+
+            return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+        return Starlette(routes=[Route("/export", export)])
+
+    bodies = _stream(CompressionMiddleware(slow_app(), minimum_size=1024, flush_interval=0.01))
+    # every chunk decompresses on its own, without waiting for the end
+    decompressor = zlib.decompressobj(31)
+    assert [decompressor.decompress(b) for b in bodies[:3]] == [b'{"id": 0}\n', b'{"id": 1}\n', b'{"id": 2}\n']
+
+
+def test_event_streams_and_encoded_responses_pass_through():
+    client = TestClient(CompressionMiddleware(_json_app(), minimum_size=10))
+    assert "content-encoding" not in client.get("/events", headers={"Accept-Encoding": "gzip"}).headers
+    encoded = client.get("/encoded", headers={"Accept-Encoding": "gzip"})
+    assert encoded.content == b"x" * 5000
+
+
+def test_application_stack():
+    from app.main import app
+
+    client = TestClient(app)
+    page = client.get("/static/login.html")
+    assert page.headers["cache-control"] == "no-store"
+    assert "server-timing" in page.headers
+    assert "cache-control" not in client.get("/static/css/common.css").headers
@@ -0,0 +1,61 @@
+from sqlalchemy import create_engine, inspect, select, text
+
+from app.calculation_factory import OPERATION_CODES, parse_operation
+from app.migrations import add_missing_columns, migrate_operation_type_codes
+from app.models import Calculation
+from app.schemas import OperationType
+
+
+LEGACY_DDL = """
+CREATE TABLE calculations (
+    id INTEGER NOT NULL, a FLOAT NOT NULL, b FLOAT NOT NULL, type VARCHAR NOT NULL,
+    result FLOAT NOT NULL, timestamp DATETIME NOT NULL, user_id INTEGER, PRIMARY KEY (id)
+)
+"""
+
+
+def test_parse_operation_accepts_every_spelling():
+    for op, code in OPERATION_CODES.items():
+        assert parse_operation(op) is op
+        assert parse_operation(code) is op
+        assert parse_operation(str(code)) is op
+        assert parse_operation(op.value) is op
+        assert parse_operation(f"OperationType.{op.name}") is op
+
+
+def test_migrate_string_type_column_to_codes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_DDL))
+        conn.execute(text(
+            "INSERT INTO calculations (id, a, b, type, result, timestamp, user_id) VALUES "
+            "(1, 1, 2, 'add', 3, '2024-01-01 00:00:00', 1), "
+            "(2, 4, 2, 'OperationType.DIVIDE', 2, '2024-01-01 00:00:00', 1)"
+        ))
+
+    assert migrate_operation_type_codes(engine) is True
+    column = next(c for c in inspect(engine).get_columns("calculations") if c["name"] == "type")
+    assert "INT" in str(column["type"]).upper()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT type FROM calculations ORDER BY id")).scalars().all() == [1, 4]
+        types = conn.execute(select(Calculation.type).order_by(Calculation.id)).scalars().all()
+    assert types == [OperationType.ADD, OperationType.DIVIDE]
+    assert "ix_calculations_id" in {i["name"] for i in inspect(engine).get_indexes("calculations")}
+
+    # second run is a no-op
+    assert migrate_operation_type_codes(engine) is False
+
+
+def test_add_missing_columns_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_DDL))
+        conn.execute(text("INSERT INTO calculations (id, a, b, type, result, timestamp, user_id) VALUES (1, 1, 2, 'add', 3, '2024-01-01 00:00:00', 1)"))
+
+    added = add_missing_columns(engine)
+    assert set(added) == {"calculations.precision", "calculations.a_exact", "calculations.b_exact", "calculations.result_exact"}
+    assert add_missing_columns(engine) == []
+    assert migrate_operation_type_codes(engine) is True
+    with engine.connect() as conn:
+        row = conn.execute(select(Calculation.result, Calculation.result_exact)).one()
+    assert row == (3.0, None)
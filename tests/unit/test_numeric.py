@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+import pytest
+
+from app import numeric
+from app.calculation_factory import CalculationFactory
+from app.limits import CalculationError
+from app.numeric import UserNumericModes, check_decimal_exponent, decimal_context, numeric_context, to_decimal
+from app.schemas import CalculationCreate, OperationType
+
+
+def test_float_path_needs_no_user_lookup():
+    def lookup():
+        raise AssertionError("user mode should not be loaded")
+
+    assert numeric_context("float", None, lookup) is None
+    assert numeric_context(None, None, lambda: (None, None)) is None
+
+
+def test_request_mode_overrides_saved_mode():
+    assert numeric_context("decimal", 50, lambda: (None, None)).prec == 50
+    assert numeric_context(None, None, lambda: ("decimal", 12)).prec == 12
+    assert numeric_context(None, 40, lambda: ("decimal", 12)).prec == 40
+    assert numeric_context(None, None, lambda: ("decimal", None)).prec == numeric.DECIMAL_PRECISION
+    with pytest.raises(ValueError):
+        numeric_context("decimal", numeric.DECIMAL_MAX_PRECISION + 1, lambda: (None, None))
+
+
+def test_to_decimal_uses_shortest_float_repr():
+    context = decimal_context(28)
+    assert to_decimal(0.1, context) == Decimal("0.1")
+    assert to_decimal(Decimal("0.10000000000000000001"), context) == Decimal("0.10000000000000000001")
+    with pytest.raises(ValueError, match="significant digits"):
+        to_decimal(Decimal("1." + "1" * 30), context)
+    with pytest.raises(ValueError):
+        to_decimal(Decimal("NaN"), context)
+    with pytest.raises(ValueError, match="out of range"):
+        to_decimal(Decimal("1e400"), context)
+
+
+def test_decimal_arithmetic_is_exact_and_rounded():
+    context = decimal_context(28)
+    add = CalculationFactory.calculate(Decimal("0.1"), Decimal("0.2"), OperationType.ADD, context)
+    assert add == Decimal("0.3")
+    third = CalculationFactory.calculate(Decimal(1), Decimal(3), OperationType.DIVIDE, decimal_context(40))
+    assert third == Decimal("0." + "3" * 40)
+    # same sign convention as float modulus
+    assert CalculationFactory.calculate(Decimal(-7), Decimal(3), OperationType.MODULUS, context) == Decimal(2)
+    assert CalculationFactory.calculate(Decimal(7), Decimal(-3), OperationType.MODULUS, context) == Decimal(-2)
+    with pytest.raises(ZeroDivisionError):
+        CalculationFactory.calculate(Decimal(1), Decimal(0), OperationType.DIVIDE, context)
+
+
+@pytest.mark.parametrize("x, y", [("10", "400"), ("2", "100000"), ("0.5", "-2000")])
+def test_exponent_guard_rejects_before_computing(x, y):
+    with pytest.raises(CalculationError):
+        check_decimal_exponent(Decimal(x), Decimal(y), decimal_context(28))
+
+
+def test_exponent_guard_allows_bounded_results():
+    context = decimal_context(28)
+    check_decimal_exponent(Decimal(1), Decimal(10000), context)
+    check_decimal_exponent(Decimal(0), Decimal(10000), context)
+    assert CalculationFactory.calculate(Decimal(2), Decimal(10), OperationType.EXPONENT, context) == 1024
+    with pytest.raises(CalculationError, match="undefined"):
+        CalculationFactory.calculate(Decimal(-8), Decimal("0.5"), OperationType.EXPONENT, context)
+
+
+def test_calculation_create_keeps_decimal_strings():
+    payload = CalculationCreate.model_validate_json('{"a": "0.10000000000000000001", "b": 2, "type": "add"}')
+    assert payload.a == 0.1 and isinstance(payload.a, float)
+    assert payload.decimal_operands() == (Decimal("0.10000000000000000001"), 2.0)
+    assert CalculationCreate(a=1.5, b=2, type="add").decimal_operands() == (1.5, 2.0)
+
+
+def test_user_numeric_modes_cache_and_invalidate():
+    now = [0.0]
+    cache = UserNumericModes(ttl=10, clock=lambda: now[0])
+    loads = []
+
+    def load():
+        loads.append(1)
+        return "decimal", 30
+
+    assert cache.get(1, load) == ("decimal", 30)
+    assert cache.get(1, load) == ("decimal", 30)
+    assert len(loads) == 1
+    cache.invalidate(1)
+    cache.get(1, load)
+    now[0] = 11
+    cache.get(1, load)
+    assert len(loads) == 3
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from app.database import Base, ReadSessionLocal, engine, get_db
+from app.models import Calculation, User
+from app.queries import fetch_calculation_row, fetch_calculation_rows, fetch_recent_rows
+from app.schemas import CalculationRead
+from app.security import hash_password
+
+
+@pytest.fixture(scope="function")
+def test_db():
+    """Create a fresh database for each test"""
+    Base.metadata.create_all(bind=engine)
+    db = next(get_db())
+    yield db
+    db.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def user_with_calcs(test_db: Session):
+    u = User(username='query_user', email='query@example.com', password_hash=hash_password('x'))
+    test_db.add(u)
+    test_db.commit()
+    test_db.refresh(u)
+    for i in range(4):
+        test_db.add(Calculation(a=i, b=1, type='add', result=i + 1, user_id=u.id))
+    test_db.commit()
+    return u
+
+
+def test_fetch_calculation_rows_are_projected(user_with_calcs):
+    db = ReadSessionLocal()
+    try:
+        rows = fetch_calculation_rows(db, user_with_calcs.id)
+        assert [r.a for r in rows] == [0, 1, 2, 3]
+        # plain rows, nothing tracked by the session's identity map
+        assert len(db.identity_map) == 0
+        model = CalculationRead.model_validate(rows[0], from_attributes=True)
+        assert model.result == 1
+    finally:
+        db.close()
+
+
+def test_fetch_calculation_row_and_recent(user_with_calcs):
+    db = ReadSessionLocal()
+    try:
+        rows = fetch_calculation_rows(db, user_with_calcs.id)
+        one = fetch_calculation_row(db, user_with_calcs.id, rows[1].id)
+        assert one.id == rows[1].id
+        assert fetch_calculation_row(db, user_with_calcs.id + 1, rows[1].id) is None
+        recent = fetch_recent_rows(db, user_with_calcs.id, 2)
+        assert [r.id for r in recent] == [rows[3].id, rows[2].id]
+    finally:
+        db.close()
+
+
+def test_read_only_session_refuses_writes(user_with_calcs):
+    db = ReadSessionLocal()
+    try:
+        db.add(Calculation(a=1, b=1, type='add', result=2, user_id=user_with_calcs.id))
+        with pytest.raises(RuntimeError):
+            db.commit()
+    finally:
+        db.rollback()
+        db.close()
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+from app.ratelimit import InMemoryBackend, Rate, RateLimiter, parse_route_rates
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_parse_rates():
+    assert Rate.parse("10/60") == Rate(10, 10 / 60)
+    assert parse_route_rates("post /users/login=5/60, GET /calculations*=100/1") == [
+        ("POST", "/users/login", Rate(5, 5 / 60)),
+        ("GET", "/calculations*", Rate(100, 100.0)),
+    ]
+
+
+@pytest.mark.parametrize("value", ["0/60", "10/0", "-1/60"])
+def test_parse_rejects_non_positive_rates(value):
+    with pytest.raises(ValueError):
+        Rate.parse(value)
+
+
+def test_token_bucket_allows_burst_then_refills():
+    now = [0.0]
+    backend = InMemoryBackend(clock=lambda: now[0])
+    rate = Rate.parse("2/10")
+    assert run(backend.take("k", rate)) == 0
+    assert run(backend.take("k", rate)) == 0
+    assert run(backend.take("k", rate)) == 5.0  # one token every 5s
+
+    now[0] = 5.0
+    assert run(backend.take("k", rate)) == 0
+    assert run(backend.take("other", rate)) == 0
+
+
+def test_prune_drops_only_refilled_buckets():
+    now = [0.0]
+    backend = InMemoryBackend(clock=lambda: now[0], max_keys=1)
+    rate = Rate.parse("1/10")
+    run(backend.take("a", rate))
+    now[0] = 20.0
+    run(backend.take("b", rate))
+    assert set(backend._buckets) == {"b"}
+
+
+def test_concurrency_slots():
+    backend = InMemoryBackend()
+    assert run(backend.acquire("u", 2))
+    assert run(backend.acquire("u", 2))
+    assert not run(backend.acquire("u", 2))
+    run(backend.release("u"))
+    assert run(backend.acquire("u", 2))
+
+
+def test_route_rules_are_keyed_by_user_or_ip():
+    limiter = RateLimiter(InMemoryBackend(), routes=parse_route_rates("POST /users/login=1/60"))
+    assert run(limiter.check("POST", "/users/login", "1.1.1.1", None)) == (0.0, "")
+    wait, name = run(limiter.check("POST", "/users/login", "1.1.1.1", None))
+    assert wait > 0 and name == "route"
+    assert run(limiter.check("POST", "/users/login", "2.2.2.2", None)) == (0.0, "")
+    assert run(limiter.check("GET", "/users/login", "1.1.1.1", None)) == (0.0, "")
+
+
+def test_rejected_requests_do_not_drain_other_buckets():
+    limiter = RateLimiter(InMemoryBackend(clock=lambda: 0.0), per_ip=Rate.parse("2/60"), per_user=Rate.parse("1/60"))
+    assert run(limiter.check("GET", "/calculations", "1.1.1.1", 1)) == (0.0, "")
+    for _ in range(5):
+        wait, name = run(limiter.check("GET", "/calculations", "1.1.1.1", 1))
+        assert wait == 60.0 and name == "user"
+    assert run(limiter.check("GET", "/calculations", "1.1.1.1", 2)) == (0.0, "")
+    wait, name = run(limiter.check("GET", "/calculations", "1.1.1.1", 3))
+    assert wait == 30.0 and name == "ip"
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.replicas import ReplicaRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def engines(tmp_path):
+    """Two local SQLite files standing in for the primary and a replica."""
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for eng, name in ((primary, "primary"), (replica, "replica")):
+        with eng.begin() as conn:
+            conn.execute(text("CREATE TABLE whoami (name TEXT)"))
+            conn.execute(text("INSERT INTO whoami VALUES (:n)"), {"n": name})
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+def _whoami(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT name FROM whoami")).scalar()
+
+
+def test_reads_go_to_replica(engines):
+    primary, replica = engines
+    router = ReplicaRouter(primary, [replica])
+    assert _whoami(router.engine_for_read()) == "replica"
+    assert _whoami(router.engine_for_read(user_id=1)) == "replica"
+
+
+def test_no_replicas_uses_primary(engines):
+    primary, _ = engines
+    router = ReplicaRouter(primary, [])
+    router.mark_written(1)
+    assert router.engine_for_read(1) is primary
+
+
+def test_round_robin_between_replicas(engines, tmp_path):
+    primary, replica = engines
+    second = create_engine(f"sqlite:///{tmp_path / 'replica2.db'}")
+    router = ReplicaRouter(primary, [replica, second])
+    picks = [router.engine_for_read() for _ in range(4)]
+    assert picks == [replica, second, replica, second]
+    second.dispose()
+
+
+def test_read_your_writes_pins_user_to_primary(engines):
+    primary, replica = engines
+    clock = FakeClock()
+    router = ReplicaRouter(primary, [replica], sticky_seconds=5, clock=clock)
+    router.mark_written(7)
+    assert _whoami(router.engine_for_read(7)) == "primary"
+    # other users are unaffected
+    assert _whoami(router.engine_for_read(8)) == "replica"
+    clock.now += 6
+    assert _whoami(router.engine_for_read(7)) == "replica"
+
+
+def test_unhealthy_replica_falls_back_to_primary(engines, tmp_path):
+    primary, _ = engines
+    broken = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    clock = FakeClock()
+    router = ReplicaRouter(primary, [broken], health_check_interval=30, clock=clock)
+    assert router.engine_for_read() is primary
+    # the failed check is cached until the interval elapses
+    assert router._health[0][0] is False
+    clock.now += 31
+    assert router.engine_for_read() is primary
@@ -0,0 +1,116 @@
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import RevokedToken, User
+from app.revocation import BloomFilter, RevocationFilter, purge_expired
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate_is_bounded():
+    bloom = BloomFilter(1000, 0.01)
+    for _ in range(1000):
+        bloom.add(uuid.uuid4().hex)
+    probes = 20000
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(probes))
+    assert false_positives / probes < 0.03
+
+
+def _session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'revoked.db'}")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+def test_filter_rebuilds_from_database_after_refresh_interval(tmp_path):
+    factory = _session_factory(tmp_path)
+    now = [0.0]
+    revoked = RevocationFilter(factory, refresh_seconds=30, capacity=100, clock=lambda: now[0])
+    assert not revoked.might_be_revoked("abc")
+
+    with factory() as db:
+        db.add(User(username="u", email="u@example.com", password_hash="x"))
+        db.flush()
+        db.add(RevokedToken(jti="abc", user_id=1, expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.add(RevokedToken(jti="old", user_id=1, expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.commit()
+
+    # another worker's revocation is not visible until the next refresh
+    assert not revoked.might_be_revoked("abc")
+    now[0] = 31
+    assert revoked.might_be_revoked("abc")
+    # expired revocations are dropped on rebuild
+    assert not revoked.might_be_revoked("old")
+
+
+def test_purge_deletes_only_expired_revocations(tmp_path):
+    factory = _session_factory(tmp_path)
+    with factory() as db:
+        db.add(User(username="u", email="u@example.com", password_hash="x"))
+        db.flush()
+        db.add(RevokedToken(jti="live", user_id=1, expires_at=datetime.utcnow() + timedelta(hours=1)))
+        db.add(RevokedToken(jti="old", user_id=1, expires_at=datetime.utcnow() - timedelta(hours=1)))
+        db.commit()
+        assert purge_expired(db) == 1
+        assert db.query(RevokedToken.jti).all() == [("live",)]
+
+
+def test_local_add_is_visible_immediately(tmp_path):
+    revoked = RevocationFilter(_session_factory(tmp_path), refresh_seconds=30, capacity=100)
+    assert not revoked.might_be_revoked("xyz")
+    revoked.add("xyz")
+    assert revoked.might_be_revoked("xyz")
+
+
+def test_add_during_rebuild_is_kept(tmp_path):
+    factory = _session_factory(tmp_path)
+    revoked = None
+
+    def factory_with_logout():
+        # a logout lands between the rebuild's start and its SELECT
+        revoked.add("late")
+        return factory()
+
+    revoked = RevocationFilter(factory_with_logout, refresh_seconds=30, capacity=100)
+    revoked.rebuild()
+    assert revoked.might_be_revoked("late")
+
+
+def test_concurrent_stale_checks_rebuild_once(tmp_path):
+    factory = _session_factory(tmp_path)
+    now = [0.0]
+    calls = []
+    release = threading.Event()
+
+    def slow_factory():
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(5)
+        return factory()
+
+    revoked = RevocationFilter(slow_factory, refresh_seconds=30, capacity=100, clock=lambda: now[0])
+    assert not revoked.might_be_revoked("gone")
+    revoked.add("gone")
+    now[0] = 31
+    rebuilding = threading.Thread(target=revoked.might_be_revoked, args=("x",))
+    rebuilding.start()
+    while len(calls) < 2:
+        time.sleep(0.001)
+    # the rebuild is in progress: other requests use the current filter
+    results = [revoked.might_be_revoked("gone") for _ in range(5)]
+    release.set()
+    rebuilding.join()
+    assert results == [True] * 5
+    assert len(calls) == 2
@@ -15,3 +15,39 @@ def test_long_password_truncated_for_bcrypt():
 
     # bcrypt only sees first 72 'a's, so verifying 72 should still work
     assert verify_password("a" * 72, hashed)
+
+
+def test_decode_access_token_caches_claims(monkeypatch):
+    import jwt
+    from app import security
+    from app.security import TokenCache, create_access_token, decode_access_token
+
+    cache = TokenCache(maxsize=10)
+    monkeypatch.setattr(security, "token_cache", cache)
+    calls = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(security.jwt, "decode", lambda *a, **kw: calls.append(1) or real_decode(*a, **kw))
+
+    token = create_access_token({"user_id": 1})
+    first = decode_access_token(token)
+    first["user_id"] = 99  # callers get a copy
+    assert decode_access_token(token)["user_id"] == 1
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_token_cache_evicts_expired_and_least_recent():
+    from app.security import TokenCache
+
+    now = [1000.0]
+    cache = TokenCache(maxsize=2, clock=lambda: now[0])
+    cache.put("a", {"exp": 1010})
+    cache.put("b", {"exp": 2000})
+    assert cache.get("a") == {"exp": 1010}
+    cache.put("c", {"exp": 2000})  # "b" is least recently used
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+    now[0] = 1010
+    assert cache.get("a") is None
+    assert len(cache) == 1
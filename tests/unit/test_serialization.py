@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+from typing import List
+
+from app.models import Calculation
+from app.schemas import CalculationRead, OperationType
+from app.serialization import (
+    FastJSONResponse,
+    calculation_list_adapter,
+    calculations_response,
+    dump_calculation,
+    get_adapter,
+)
+
+
+def _row(i: int) -> Calculation:
+    return Calculation(
+        id=i, a=float(i), b=2.0, type=OperationType.MULTIPLY, result=i * 2.0,
+        timestamp=datetime(2024, 1, 1, 12, 0, i % 60), user_id=7,
+    )
+
+
+def test_get_adapter_is_cached():
+    assert get_adapter(List[CalculationRead]) is calculation_list_adapter
+
+
+def test_dump_calculation_matches_response_model():
+    row = _row(1)
+    expected = CalculationRead.model_validate(row).model_dump(mode="json", exclude_none=True)
+    assert json.loads(dump_calculation(row)) == expected
+
+
+def test_calculations_response_body():
+    rows = [_row(i) for i in range(3)]
+    resp = calculations_response(rows)
+    assert resp.media_type == "application/json"
+    data = json.loads(resp.body)
+    assert [d["id"] for d in data] == [0, 1, 2]
+    assert data[1]["type"] == "multiply"
+    assert data[1]["timestamp"] == "2024-01-01T12:00:01"
+
+
+def test_fast_json_response_renders_python_content():
+    resp = FastJSONResponse({"counts": {OperationType.ADD: 1}, "when": datetime(2024, 1, 1)})
+    assert json.loads(resp.body) == {"counts": {"add": 1}, "when": "2024-01-01T00:00:00"}
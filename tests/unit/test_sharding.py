@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models import Calculation
+from app.sharding import HashRing, ShardRouter, parse_shard_urls
+
+
+def _engines(tmp_path, names):
+    return {name: create_engine(f"sqlite:///{tmp_path / (name + '.db')}") for name in names}
+
+
+def _row(user_id, a=1.0):
+    return {"a": a, "b": 2.0, "type": "add", "result": a + 2.0, "timestamp": datetime(2024, 1, 1), "user_id": user_id}
+
+
+def _count(engine, user_id=None):
+    stmt = select(func.count(Calculation.id))
+    if user_id is not None:
+        stmt = stmt.where(Calculation.user_id == user_id)
+    with engine.connect() as conn:
+        return conn.execute(stmt).scalar()
+
+
+def test_parse_shard_urls():
+    assert parse_shard_urls("") == {}
+    assert parse_shard_urls("sqlite:///a.db, sqlite:///b.db") == {"shard0": "sqlite:///a.db", "shard1": "sqlite:///b.db"}
+    assert parse_shard_urls("east=postgresql://h/db") == {"east": "postgresql://h/db"}
+
+
+def test_hash_ring_is_deterministic_and_balanced():
+    ring = HashRing(["s0", "s1", "s2"])
+    owners = [ring.node_for(uid) for uid in range(3000)]
+    assert owners == [HashRing(["s0", "s1", "s2"]).node_for(uid) for uid in range(3000)]
+    for node in ("s0", "s1", "s2"):
+        assert 600 < owners.count(node) < 1400
+
+
+def test_adding_a_node_moves_only_its_share():
+    before = HashRing(["s0", "s1", "s2"])
+    after = HashRing(["s0", "s1", "s2", "s3"])
+    moved = [uid for uid in range(4000) if before.node_for(uid) != after.node_for(uid)]
+    # every moved key moved to the new node, and roughly a quarter moved
+    assert all(after.node_for(uid) == "s3" for uid in moved)
+    assert len(moved) < 2000
+
+
+def test_bulk_insert_routes_rows_by_user(tmp_path):
+    router = ShardRouter(_engines(tmp_path, ["s0", "s1", "s2"]))
+    router.create_tables()
+    rows = [_row(uid) for uid in range(1, 31)]
+    assert router.bulk_insert(rows) == 30
+    for uid in range(1, 31):
+        assert _count(router.engine_for_user(uid), uid) == 1
+    assert sum(_count(e) for e in router.engines.values()) == 30
+
+
+def test_rebalance_after_adding_shard(tmp_path):
+    engines = _engines(tmp_path, ["s0", "s1", "s2"])
+    old = ShardRouter({k: engines[k] for k in ("s0", "s1")})
+    old.create_tables()
+    old.bulk_insert([_row(uid) for uid in range(1, 41)])
+
+    new = ShardRouter(engines)
+    new.create_tables()
+    assert new.rebalance(dry_run=True)
+    assert _count(engines["s2"]) == 0
+
+    moved = new.rebalance()
+    assert sum(moved.values()) == _count(engines["s2"]) > 0
+    for uid in range(1, 41):
+        assert _count(new.engine_for_user(uid), uid) == 1
+    assert new.rebalance() == {}
+
+
+def test_empty_router_rejected():
+    with pytest.raises(ValueError):
+        ShardRouter({})
@@ -0,0 +1,126 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+from app.static import IMMUTABLE_CACHE_CONTROL, PrecompressedStaticFiles, accepted_encodings
+from tools.build_static import build, minify_css, minify_js
+
+
+PAGE = """<!doctype html>
+<html>
+  <head>
+    <link rel="stylesheet" href="/static/css/site.css">
+    <style>
+      body { color: red; }
+    </style>
+    <script src="/static/js/app.js" defer></script>
+  </head>
+  <body>
+    <!-- comment -->
+    <script>
+      // say hello
+      console.log("hello");
+    </script>
+  </body>
+</html>
+"""
+
+
+@pytest.fixture
+def built(tmp_path):
+    source = tmp_path / "src"
+    (source / "css").mkdir(parents=True)
+    (source / "js").mkdir()
+    (source / "index.html").write_text(PAGE)
+    (source / "css" / "site.css").write_text("/* site */\nh1 {\n  margin : 0 ;\n}\n" * 40)
+    (source / "js" / "app.js").write_text("function f() {\n    return 1;\n}\n" * 40)
+    output = tmp_path / "out"
+    manifest = build(source, output)
+    return output, manifest
+
+
+def test_minifiers():
+    assert minify_css("/* c */\na , b {\n  color : red ;\n}\n") == "a,b{color:red}"
+    assert minify_js("  // c\n  let a = 1\n\n  let b = 2\n") == "let a = 1\nlet b = 2"
+
+
+def test_build_extracts_fingerprints_and_compresses(built):
+    output, manifest = built
+    assert set(manifest) == {"css/site.css", "js/app.js", "css/index-inline-1.css", "js/index-inline-1.js"}
+    assert json.loads((output / "manifest.json").read_text()) == manifest
+    page = (output / "index.html").read_text()
+    assert "<style>" not in page and "console.log" not in page and "<!--" not in page
+    for rel, hashed in manifest.items():
+        assert f"/static/{hashed}" in page
+        assert (output / hashed).exists()
+    assert (output / manifest["js/index-inline-1.js"]).read_text() == 'console.log("hello");'
+    css = output / manifest["css/site.css"]
+    assert gzip.decompress((output / (manifest["css/site.css"] + ".gz")).read_bytes()) == css.read_bytes()
+
+
+def test_references_are_rewritten_before_hashing(tmp_path):
+    source = tmp_path / "src"
+    (source / "css").mkdir(parents=True)
+    (source / "img").mkdir()
+    (source / "js").mkdir()
+    (source / "css" / "site.css").write_text("body { background: url(/static/img/bg.png); }")
+    (source / "js" / "theme.js").write_text('const sheet = "/static/css/site.css";')
+
+    def hashed(image: bytes):
+        (source / "img" / "bg.png").write_bytes(image)
+        manifest = build(source, tmp_path / "out")
+        assert f"url(/static/{manifest['img/bg.png']})" in (tmp_path / "out" / manifest["css/site.css"]).read_text()
+        assert f"/static/{manifest['css/site.css']}" in (tmp_path / "out" / manifest["js/theme.js"]).read_text()
+        return manifest
+
+    before, after = hashed(b"one"), hashed(b"two")
+    assert all(before[rel] != after[rel] for rel in ("img/bg.png", "css/site.css", "js/theme.js"))
+
+
+def test_circular_references_are_rejected(tmp_path):
+    source = tmp_path / "src"
+    (source / "css").mkdir(parents=True)
+    (source / "css" / "a.css").write_text("@import url(/static/css/b.css);")
+    (source / "css" / "b.css").write_text("@import url(/static/css/a.css);")
+    with pytest.raises(ValueError, match="css/a.css -> css/b.css -> css/a.css"):
+        build(source, tmp_path / "out")
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=0.5") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+
+def test_serves_precompressed_immutable_assets(built):
+    output, manifest = built
+    files = PrecompressedStaticFiles(directory=str(output))
+    assert files.built
+    client = TestClient(Starlette(routes=[Mount("/static", files)]))
+    url = "/static/" + manifest["css/site.css"]
+
+    compressed = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["content-type"].startswith("text/css")
+    assert compressed.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.content == (output / manifest["css/site.css"]).read_bytes()
+
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["vary"] == "Accept-Encoding"
+    assert plain.headers["etag"] != compressed.headers["etag"]
+
+    revalidated = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    page = client.get("/static/index.html")
+    assert "cache-control" not in page.headers
+
+
+def test_source_directory_is_not_built():
+    assert not PrecompressedStaticFiles(directory="static").built
@@ -0,0 +1,14 @@
+from app.versions import etag_for, etag_matches
+
+
+def test_etag_format():
+    assert etag_for("stats", 3, 7) == '"stats-3-7"'
+
+
+def test_etag_matches_if_none_match_lists():
+    etag = '"stats-3-7"'
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"stats-3-6"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+from datetime import datetime
+
+from app import writer as writer_module
+from app.writer import BatchWriter
+
+
+def test_rows_are_written_in_batches():
+    batches = []
+
+    async def scenario():
+        writer = BatchWriter(flush=batches.append, batch_size=3, max_delay=0.5)
+        for i in range(7):
+            await writer.submit({"n": i})
+        await writer.drain()
+
+    asyncio.run(scenario())
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert [row["n"] for b in batches for row in b] == list(range(7))
+
+
+def test_partial_batch_is_flushed_after_max_delay():
+    batches = []
+
+    async def scenario():
+        writer = BatchWriter(flush=batches.append, batch_size=100, max_delay=0.01)
+        await writer.submit({"n": 1})
+        await asyncio.sleep(0.1)
+        assert batches == [[{"n": 1}]]
+        await writer.drain()
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_is_retried():
+    batches = []
+
+    def flush(batch):
+        if not batches:
+            batches.append(None)
+            raise RuntimeError("database down")
+        batches.append(batch)
+
+    async def scenario():
+        writer = BatchWriter(flush=flush, batch_size=1, max_delay=0, retry_backoff=0)
+        await writer.submit({"n": 1})
+        await writer.submit({"n": 2})
+        await writer.drain()
+
+    asyncio.run(scenario())
+    assert batches == [None, [{"n": 1}], [{"n": 2}]]
+
+
+def test_retries_skip_committed_rows_and_report_lost_ones():
+    attempts = []
+    lost = []
+
+    def flush(batch):
+        attempts.append([row["n"] for row in batch])
+        if len(attempts) == 1:
+            batch[0]["id"] = 1  # e.g. committed on one shard before another failed
+        raise RuntimeError("database down")
+
+    async def scenario():
+        writer = BatchWriter(flush=flush, batch_size=3, max_delay=0.05, retry_attempts=2, retry_backoff=0)
+        for n in (1, 2, 3):
+            async def on_failure(exc, n=n):
+                lost.append((n, str(exc)))
+            await writer.submit({"n": n}, on_failure)
+        await writer.drain()
+
+    asyncio.run(scenario())
+    assert attempts == [[1, 2, 3], [2, 3], [2, 3]]
+    assert lost == [(2, "database down"), (3, "database down")]
+
+
+def test_full_queue_makes_submit_wait():
+    unblock = threading.Event()
+    written = []
+
+    def slow_flush(batch):
+        unblock.wait(1)
+        written.extend(batch)
+
+    async def scenario():
+        writer = BatchWriter(flush=slow_flush, batch_size=1, max_delay=0, queue_size=1)
+        await writer.submit({"n": 1})
+        await asyncio.sleep(0.01)  # row 1 is being flushed
+        await writer.submit({"n": 2})  # fills the queue
+        third = asyncio.ensure_future(writer.submit({"n": 3}))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        unblock.set()
+        await asyncio.wait_for(third, 1)
+        await writer.drain()
+
+    asyncio.run(scenario())
+    assert [row["n"] for row in written] == [1, 2, 3]
+
+
+def test_written_rows_are_published(monkeypatch):
+    published = []
+
+    def insert(rows):
+        for i, row in enumerate(rows, 1):
+            row["id"] = i
+        return len(rows)
+
+    monkeypatch.setattr(writer_module, "insert_calculations", insert)
+    monkeypatch.setattr(writer_module, "publish_calculation_event", lambda *args: published.append(args))
+    monkeypatch.setattr(writer_module, "WRITE_EVENT_MAX_ROWS", 2)
+
+    def row(user_id):
+        return {"user_id": user_id, "a": 1.0, "b": 2.0, "type": "add", "result": 3.0, "timestamp": datetime(2024, 1, 1)}
+
+    rows = [row(1), row(2), row(1), row(2), row(2)]
+    assert writer_module.write_calculations(rows) == 5
+    # user 1 gets one event per row, user 2 (over the limit) one reset
+    assert [(user_id, kind) for user_id, kind, _ in published] == [(1, "created"), (1, "created"), (2, "reset")]
+    assert [json.loads(data)["id"] for user_id, kind, data in published[:2]] == [1, 3]
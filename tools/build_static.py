@@ -0,0 +1,191 @@
+# tools/build_static.py
+"""Build the front-end in static/ for production serving.
+
+    python tools/build_static.py [--source static] [--output build/static]
+
+1. Inline `<style>` and `<script>` blocks in each HTML page are moved to
+   their own files (css/<page>-inline-<n>.css, js/<page>-inline-<n>.js), so
+   browsers can cache them separately from the page.
+2. CSS, JS and HTML are minified conservatively: comments, indentation and
+   blank lines go, line breaks stay (so JS semicolon insertion is unaffected).
+3. Every asset except the HTML pages is renamed to include a content hash,
+   e.g. css/common.3f2a9c81d0e4.css, and literal /static/... references in
+   pages, CSS and JS are rewritten. Assets are hashed after their own
+   references, so a changed image also renames the CSS pointing at it. URLs
+   that JS assembles at runtime are not seen; they should point at pages,
+   which keep their names. The mapping is written to manifest.json.
+4. Text files get precompressed .gz (and .br when the `brotli` package is
+   installed) siblings.
+
+Serve the output with STATIC_DIR=build/static; app.static picks the
+precompressed variant per request and marks hashed files immutable.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+
+URL_PREFIX = "/static/"
+COMPRESSIBLE = {".html", ".css", ".js", ".json", ".svg", ".txt", ".map"}
+# assets whose literal /static/... references are rewritten to hashed names
+REWRITTEN = {".css", ".js"}
+# smaller files are not worth a second request for the compressed variant
+COMPRESS_MIN_SIZE = 256
+
+_STYLE = re.compile(r"<style>(.*?)</style>", re.S)
+_INLINE_SCRIPT = re.compile(r"<script((?:(?!\bsrc=)[^>])*)>(.*?)</script>", re.S)
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s*([{};:,>])\s*")
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+
+
+def minify_css(text: str) -> str:
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(r"\1", text)
+    return re.sub(r"\s+", " ", text).replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    lines = (line.strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def minify_html(text: str) -> str:
+    if "<pre" in text or "<textarea" in text:
+        return text
+    text = _HTML_COMMENT.sub("", text)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js, ".html": minify_html}
+
+
+def extract_inline(name: str, html: str, assets: Dict[str, str]) -> str:
+    """Move inline styles and scripts of page `name` into `assets` (relative
+    path -> text) and return the page referencing them instead."""
+    counter = {"css": 0, "js": 0}
+
+    def style(match):
+        counter["css"] += 1
+        path = f"css/{name}-inline-{counter['css']}.css"
+        assets[path] = match.group(1)
+        return f'<link rel="stylesheet" href="{URL_PREFIX}{path}">'
+
+    def script(match):
+        if not match.group(2).strip():
+            return match.group(0)
+        counter["js"] += 1
+        path = f"js/{name}-inline-{counter['js']}.js"
+        assets[path] = match.group(2)
+        return f'<script{match.group(1)} src="{URL_PREFIX}{path}"></script>'
+
+    return _INLINE_SCRIPT.sub(script, _STYLE.sub(style, html))
+
+
+def fingerprint(path: str, data: bytes) -> str:
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, dot, suffix = path.rpartition(".")
+    return f"{stem}.{digest}.{suffix}" if dot else f"{path}.{digest}"
+
+
+def compress(path: Path) -> None:
+    data = path.read_bytes()
+    if path.suffix not in COMPRESSIBLE or len(data) < COMPRESS_MIN_SIZE:
+        return
+    variants = {".gz": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    for suffix, body in variants.items():
+        if len(body) < len(data):
+            path.with_name(path.name + suffix).write_bytes(body)
+
+
+def build(source: Path, output: Path) -> Dict[str, str]:
+    """Build `source` into `output` (replaced); returns the manifest."""
+    pages: Dict[str, str] = {}
+    assets: Dict[str, bytes] = {}
+    for file in sorted(p for p in source.rglob("*") if p.is_file()):
+        rel = file.relative_to(source).as_posix()
+        if file.suffix == ".html":
+            pages[rel] = file.read_text(encoding="utf-8")
+        else:
+            assets[rel] = file.read_bytes()
+
+    extracted: Dict[str, str] = {}
+    for rel in pages:
+        pages[rel] = extract_inline(Path(rel).stem, pages[rel], extracted)
+    assets.update({rel: text.encode("utf-8") for rel, text in extracted.items()})
+
+    for rel, data in assets.items():
+        minify = MINIFIERS.get(Path(rel).suffix)
+        if minify is not None:
+            assets[rel] = minify(data.decode("utf-8")).encode("utf-8")
+
+    # longest first, so css/a.css.map is not rewritten as css/a.css + ".map"
+    references = sorted(assets, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(URL_PREFIX + rel) for rel in references)) if references else None
+    manifest: Dict[str, str] = {}
+
+    def rewrite(text: str) -> str:
+        if pattern is None:
+            return text
+        return pattern.sub(lambda m: URL_PREFIX + manifest[m.group(0)[len(URL_PREFIX):]], text)
+
+    def resolve(rel: str, chain: Tuple[str, ...] = ()) -> None:
+        # an asset is hashed after its references are rewritten, and those
+        # must be hashed first, so a changed image renames the CSS using it
+        if rel in manifest:
+            return
+        if rel in chain:
+            raise ValueError("Circular static references: " + " -> ".join(chain + (rel,)))
+        data = assets[rel]
+        if Path(rel).suffix in REWRITTEN and pattern is not None:
+            text = data.decode("utf-8")
+            for match in pattern.finditer(text):
+                resolve(match.group(0)[len(URL_PREFIX):], chain + (rel,))
+            data = assets[rel] = rewrite(text).encode("utf-8")
+        manifest[rel] = fingerprint(rel, data)
+
+    for rel in assets:
+        resolve(rel)
+
+    if output.exists():
+        shutil.rmtree(output)
+    written = []
+    for rel, data in assets.items():
+        target = output / manifest[rel]
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        written.append(target)
+    for rel, html in pages.items():
+        target = output / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(rewrite(minify_html(html)), encoding="utf-8")
+        written.append(target)
+    (output / "manifest.json").write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    for target in written:
+        compress(target)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Minify, fingerprint and precompress static assets")
+    parser.add_argument("--source", default="static")
+    parser.add_argument("--output", default="build/static")
+    args = parser.parse_args(argv)
+    manifest = build(Path(args.source), Path(args.output))
+    print(f"Built {len(manifest)} assets into {args.output}")
+
+
+if __name__ == "__main__":
+    main()